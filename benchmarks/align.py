@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+As-of alignment benchmark: pandas (read_sql_query + merge_asof / resample) vs pipeline.align.
+
+Fills a throw-away database with --days of sources at their own rates:
+sopr and altme daily, stablecoins and mempool every 10 minutes (one collector run),
+coingecko every minute for two coins, --liquidations Bybit events. Then aligns
+them on an hourly grid (last value with a staleness limit per source, liquidations
+summed per hour):
+- "pandas": each series read whole, merge_asof(tolerance=) / resample("1h").sum()
+- "align" : pipeline.align.align → numpy / arrow
+reporting wall time (best of --runs) and tracemalloc peak (separate pass).
+Exit 1 when the frames differ.
+
+Usage (from the repo root):
+    python benchmarks/align.py
+    python benchmarks/align.py --days 1000 --liquidations 5000000 --step 900
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from pipeline import align, db, schema  # noqa: E402
+
+T0 = 1_700_000_000
+DAY = 86_400
+# label → (spec, SQL of the source series for the pandas version, max_age)
+SERIES = {
+    "sopr": ("sopr.value", "SELECT ts, value AS v FROM sopr", 2 * DAY),
+    "fng": ("altme.fng", "SELECT ts, fng AS v FROM altme", 2 * DAY),
+    "stables": ("stablecoins.total", "SELECT ts, total AS v FROM stablecoins", 3600),
+    "mempool": ("mempool.tx_count", "SELECT ts, tx_count AS v FROM mempool", 3600),
+    "btc": ("coingecko.price_usd@bitcoin", "SELECT ts, price_usd AS v FROM coingecko WHERE symbol = 'bitcoin'", 600),
+    "eth": ("coingecko.price_usd@ethereum", "SELECT ts, price_usd AS v FROM coingecko WHERE symbol = 'ethereum'",
+            600),
+}
+
+
+def fill(path: Path, days: int, liquidations: int):
+    rng = random.Random(1)
+    conn = db.get_conn(path)
+    schema.migrate(conn)
+    conn.executemany("INSERT INTO sopr VALUES (?,?)", ((T0 + d * DAY, rng.uniform(0.9, 1.1)) for d in range(days)))
+    conn.executemany("INSERT INTO altme VALUES (?,?)", ((T0 + d * DAY + 60, rng.randint(0, 100)) for d in range(days)))
+    # collector runs, with the odd missed run
+    runs = [T0 + i * 600 + rng.randint(0, 30) for i in range(days * 144) if rng.random() > 0.02]
+    conn.executemany("INSERT INTO stablecoins (ts, total) VALUES (?,?)", ((t, rng.uniform(1e11, 2e11)) for t in runs))
+    conn.executemany("INSERT INTO mempool (ts, tx_count) VALUES (?,?)", ((t + 5, rng.randint(0, 200_000)) for t in runs))
+    conn.executemany("INSERT INTO coingecko (ts, symbol, price_usd) VALUES (?,?,?)",
+                     ((T0 + i * 60, s, rng.uniform(1e3, 1e5)) for i in range(days * 1440)
+                      for s in ("bitcoin", "ethereum")))
+    conn.executemany("INSERT INTO bybit_liquidations (ts, ts_ms, symbol, side, price, qty, qty_usd) "
+                     "VALUES (?,?,?,?,?,?,?)",
+                     ((T0 + ms // 1000, T0 * 1000 + ms, "BTCUSDT", "BUY", 1.0, 1.0, rng.uniform(10, 1e5))
+                      for ms in sorted(rng.sample(range(days * DAY * 1000), liquidations))))
+    conn.commit()
+    conn.close()
+
+
+def with_pandas(path: Path, start: int, end: int, step: int) -> dict:
+    import pandas as pd
+
+    conn = db.get_readonly_conn(path)
+    grid = pd.DataFrame({"ts": np.arange(start, end, step, dtype=np.int64)})
+    out = {"ts": grid["ts"].to_numpy()}
+    for label, (_, sql, max_age) in SERIES.items():
+        src = pd.read_sql_query(sql + " ORDER BY ts", conn)
+        out[label] = pd.merge_asof(grid, src, on="ts", tolerance=max_age)["v"].to_numpy(dtype=np.float64)
+    liq = pd.read_sql_query("SELECT ts, qty_usd FROM bybit_liquidations WHERE ts > ? AND ts <= ? ORDER BY ts",
+                            conn, params=(start - step, end))
+    conn.close()
+    # interval (ts_i - step, ts_i] → ts_i
+    liq["ts"] = pd.to_datetime(-((start - liq["ts"]) // step) * step + start, unit="s")
+    sums = liq.groupby("ts")["qty_usd"].sum().reindex(pd.to_datetime(out["ts"], unit="s"), fill_value=0.0)
+    out["liq"] = sums.to_numpy()
+    return out
+
+
+def with_align(path: Path, start: int, end: int, step: int, output: str):
+    specs = [replace(align.parse(spec), max_age=age, name=label) for label, (spec, _, age) in SERIES.items()]
+    specs.append(align.parse("liq=bybit_liquidations.qty_usd@BTCUSDT:sum"))
+    return align.align(specs, start, end, step, output=output, db_path=path)
+
+
+def measure(fn, runs: int):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pandas vs pipeline.align as-of alignment")
+    parser.add_argument("--days", type=int, default=365, help="Jours d'historique")
+    parser.add_argument("--liquidations", type=int, default=1_000_000, help="Liquidations générées")
+    parser.add_argument("--step", type=int, default=3600, help="Pas de la grille (secondes)")
+    parser.add_argument("--runs", type=int, default=3, help="Runs par méthode (meilleur run)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        t0 = time.perf_counter()
+        fill(path, args.days, args.liquidations)
+        print(f"filled in {time.perf_counter() - t0:.1f}s")
+        start, end = T0 + args.step, T0 + args.days * DAY
+
+        runs = {
+            "pandas": lambda: with_pandas(path, start, end, args.step),
+            "align/numpy": lambda: with_align(path, start, end, args.step, "numpy"),
+            "align/arrow": lambda: with_align(path, start, end, args.step, "arrow"),
+        }
+        results = {}
+        print(f"{'method':<12} {'points':>8} {'time':>10} {'peak':>10}")
+        for name, fn in runs.items():
+            best, peak, out = measure(fn, args.runs)
+            results[name] = out
+            print(f"{name:<12} {len(out['ts']):>8} {best * 1e3:>8.1f}ms {peak / 1e6:>8.1f}MB")
+
+    ref, got = results["pandas"], results["align/numpy"]
+    bad = [k for k in ref if not np.allclose(ref[k], got[k], equal_nan=True)]
+    if bad:
+        print(f"FAIL: {', '.join(bad)} differ from the pandas result")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Load test for the local query API (pipeline/api.py).
+
+Starts the API in-process on a free port (or targets --url), hammers a mix of
+endpoints with N concurrent clients for D seconds, and checks throughput and
+latency targets. Exits 1 if a target is missed.
+
+Usage (from the repo root):
+    python benchmarks/api_load.py --db data/crypto.db
+    python benchmarks/api_load.py --url http://127.0.0.1:8088 --concurrency 64 --duration 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.api import QueryAPI  # noqa: E402
+
+PATHS = [
+    "/latest/coingecko",
+    "/latest/bybit?symbol=BTCUSDT",
+    "/latest/mempool",
+    "/range/coingecko?start=0&limit=500",
+    "/range/bybit?symbol=BTCUSDT&start=0&limit=500",
+    "/liquidations/hourly?start=0",
+]
+
+
+async def worker(session, base, deadline, latencies, errors, revalidate):
+    etags = {}
+    i = 0
+    while time.perf_counter() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        headers = {"If-None-Match": etags[path]} if revalidate and path in etags else {}
+        t0 = time.perf_counter()
+        try:
+            async with session.get(base + path, headers=headers) as resp:
+                await resp.read()
+                if resp.status not in (200, 304):
+                    errors.append(resp.status)
+                    continue
+                if "ETag" in resp.headers:
+                    etags[path] = resp.headers["ETag"]
+        except aiohttp.ClientError as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run(args):
+    runner = None
+    base = args.url
+    if base is None:
+        runner = web.AppRunner(QueryAPI(args.db, args.pool_size).app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        base = f"http://127.0.0.1:{port}"
+
+    latencies, errors = [], []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.perf_counter() + args.duration
+        t0 = time.perf_counter()
+        await asyncio.gather(*(
+            worker(session, base, deadline, latencies, errors, args.revalidate)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - t0
+
+    if runner is not None:
+        await runner.cleanup()
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query API load test")
+    parser.add_argument("--db", default="data/crypto.db", help="Fichier SQLite (serveur in-process)")
+    parser.add_argument("--url", help="API déjà démarrée (sinon in-process)")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--revalidate", action="store_true", help="Envoie If-None-Match (304)")
+    parser.add_argument("--min-rps", type=float, default=500.0, help="Débit minimum attendu")
+    parser.add_argument("--max-p99-ms", type=float, default=100.0, help="Latence p99 maximale")
+    args = parser.parse_args()
+
+    latencies, errors, elapsed = asyncio.run(run(args))
+    if not latencies:
+        print("FAIL no successful request", errors[:5])
+        return 1
+
+    lat_ms = sorted(x * 1000 for x in latencies)
+    p = lambda q: lat_ms[min(len(lat_ms) - 1, int(q * len(lat_ms)))]  # noqa: E731
+    rps = len(latencies) / elapsed
+    print(f"requests={len(latencies)} errors={len(errors)} rps={rps:.0f}")
+    print(f"latency ms: p50={p(0.50):.2f} p95={p(0.95):.2f} p99={p(0.99):.2f} "
+          f"max={lat_ms[-1]:.2f} mean={statistics.fmean(lat_ms):.2f}")
+
+    ok = rps >= args.min_rps and p(0.99) <= args.max_p99_ms and not errors
+    print("OK" if ok else f"FAIL (targets: rps>={args.min_rps}, p99<={args.max_p99_ms} ms, 0 errors)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Signal backtest sweep: one boolean mask per combo vs pipeline.backtest (sorted cumulative sums).
+
+Fills a throw-away database with --days of metrics rows (one per 10-minute run: sopr,
+funding, mempool) and btc / eth coingecko prices (random walk), then sweeps
+--thresholds thresholds per signal × 4 horizons on an hourly grid:
+- "masks"   : per combo, v > threshold masks over the aligned arrays (numpy, no
+              per-timestamp loop, but O(timestamps) work per combo)
+- "backtest": pipeline.backtest.run, workers=1 and workers=--workers
+Both include the alignment read; the combos are checked to agree.
+
+Usage (from the repo root):
+    python benchmarks/backtest.py
+    python benchmarks/backtest.py --days 1000 --thresholds 5000 --workers 4
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from pipeline import backtest, db, schema  # noqa: E402
+from pipeline.signals import RULES  # noqa: E402
+
+T0 = 1_700_000_000
+RANGES = {"sopr": (0.95, 1.05), "funding_btc": (0.0, 0.02), "funding_eth": (0.0, 0.02), "mempool": (0, 100_000)}
+
+
+def fill(path: Path, days: int):
+    rng = np.random.default_rng(1)
+    n = days * 144
+    ts = T0 + np.arange(n) * 600
+    price = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    conn = db.get_conn(path)
+    schema.migrate(conn)
+    conn.executemany("INSERT INTO metrics (ts, sopr, funding_btc, funding_eth, mempool_tx_count) VALUES (?,?,?,?,?)",
+                     zip(ts.tolist(), (1 + 0.02 * rng.standard_normal(n)).tolist(),
+                         rng.normal(0.01, 0.005, n).tolist(), rng.normal(0.01, 0.005, n).tolist(),
+                         rng.integers(0, 100_000, n).tolist()))
+    conn.executemany("INSERT INTO coingecko (ts, symbol, price_usd) VALUES (?,?,?)",
+                     ((t, s, p * k) for t, p in zip(ts.tolist(), price.tolist()) for s, k in (("btc", 1), ("eth", 0.05))))
+    conn.commit()
+    conn.close()
+
+
+def with_masks(path: Path, thresholds: dict) -> dict:
+    from pipeline import align
+
+    conn = db.get_readonly_conn(path)
+    lo, hi = backtest._bounds(conn, ["btc", "eth"])
+    frame = align.align([f"{n}=metrics.{RULES[n][0]}~1d" for n in RULES] + ["btc=coingecko.price_usd@btc~2h",
+                                                                          "eth=coingecko.price_usd@eth~2h"],
+                        lo, hi + 1, 3600, conn=conn)
+    conn.close()
+    out = {}
+    for name, grid in thresholds.items():
+        v = frame[name]
+        d = backtest.DIRECTIONS[name]
+        for h in backtest.DEFAULT_HORIZONS:
+            r = backtest.forward_returns(frame[backtest.PRICES[name]], h // 3600)
+            ok = ~(np.isnan(v) | np.isnan(r))
+            vo, ro = v[ok], r[ok]
+            up, down = (ro > 0, ro < 0) if d > 0 else (ro < 0, ro > 0)
+            for t in grid:
+                above = vo > t
+                out[(name, h, t)] = (np.count_nonzero(above & up) + np.count_nonzero(~above & down)) / len(ro)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mask per combo vs pipeline.backtest sweep")
+    parser.add_argument("--days", type=int, default=365, help="Jours d'historique")
+    parser.add_argument("--thresholds", type=int, default=1000, help="Seuils par signal")
+    parser.add_argument("--workers", type=int, default=4, help="Processus pour la variante parallèle")
+    args = parser.parse_args()
+
+    thresholds = {n: np.linspace(*RANGES[n], args.thresholds) for n in RULES}
+    combos = len(RULES) * args.thresholds * len(backtest.DEFAULT_HORIZONS)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        fill(path, args.days)
+
+        t0 = time.perf_counter()
+        ref = with_masks(path, thresholds)
+        t_masks = time.perf_counter() - t0
+        timings = {}
+        for workers in (1, args.workers):
+            t0 = time.perf_counter()
+            res = backtest.run(thresholds, workers=workers, db_path=path)
+            timings[workers] = time.perf_counter() - t0
+
+    print(f"{combos} combos ({len(RULES)} signals × {args.thresholds} thresholds × "
+          f"{len(backtest.DEFAULT_HORIZONS)} horizons), {args.days} days hourly")
+    print(f"{'masks':<22} {t_masks:>8.2f}s")
+    for workers, t in timings.items():
+        print(f"{f'backtest workers={workers}':<22} {t:>8.2f}s")
+
+    got = {(s, h, t): r for s, h, t, r in zip(res["signal"], res["horizon"], res["threshold"], res["hit_rate"])}
+    bad = [k for k, v in ref.items() if not np.isclose(v, got[k])]
+    if bad:
+        print(f"FAIL: {len(bad)} combos differ, e.g. {bad[0]}: {ref[bad[0]]} vs {got[bad[0]]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Cascade alert latency under replayed load (no network).
+
+Replays synthetic Bybit "allLiquidation" frames through BybitWSService._handle_message
+(real writer on a throw-away database, Parquet on by default): a quiet background of
+small liquidations on every symbol, interrupted by --cascades bursts of large ones on
+the first symbol, each burst separated by more than the detector cooldown.
+
+Reported:
+- alert latency: frame receipt → alert handed to the sinks (alert["latency_ms"])
+- frame latency: time spent in _handle_message per frame (includes writer flushes)
+- ingest throughput (events/s) and alerts fired vs bursts replayed
+Exit 1 when the alert p99 exceeds --budget-ms or a burst raised no alert.
+
+Usage (from the repo root):
+    python benchmarks/cascades.py
+    python benchmarks/cascades.py --cascades 50 --burst 5000 --no-parquet
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import queue
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import cascades  # noqa: E402
+from pipeline.collectors.bybit_ws import BybitWSService  # noqa: E402
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT"]
+PRICES = {"BTCUSDT": 60_000.0, "ETHUSDT": 3_000.0, "SOLUSDT": 150.0, "XRPUSDT": 0.6}
+
+
+def frames(n_cascades: int, quiet: int, burst: int, burst_secs: int, batch: int, seed: int = 1):
+    """Frames (JSON text) in event-time order: quiet period, burst, quiet period, burst…"""
+    rng = random.Random(seed)
+    t = 1_700_000_000_000
+    out = []
+
+    def frame(recs):
+        return json.dumps({"topic": "allLiquidation." + recs[0]["s"], "type": "snapshot",
+                           "ts": recs[-1]["T"], "data": recs})
+
+    def event(sym, ts_ms, usd):
+        price = PRICES[sym] * rng.uniform(0.99, 1.01)
+        return {"T": ts_ms, "s": sym, "S": rng.choice(("Buy", "Sell")), "v": f"{usd / price:.6f}",
+                "p": f"{price:.4f}"}
+
+    for _ in range(n_cascades):
+        # background: ~1 event / 2 s / symbol, a few k USD each
+        for _ in range(quiet):
+            t += 1000
+            for sym in SYMBOLS:
+                if rng.random() < 0.5:
+                    out.append(frame([event(sym, t, rng.uniform(500, 20_000))]))
+        # burst on one symbol: `burst` events over burst_secs, sent in frames of `batch`
+        step = burst_secs * 1000 / burst
+        recs = []
+        for i in range(burst):
+            recs.append(event(SYMBOLS[0], int(t + i * step), rng.uniform(5_000, 200_000)))
+            if len(recs) == batch:
+                out.append(frame(recs))
+                recs = []
+        if recs:
+            out.append(frame(recs))
+        t += burst_secs * 1000
+    return out
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else float("nan")
+
+
+async def replay(args, data):
+    alerts = queue.Queue()
+    detector = cascades.CascadeDetector(sinks=[cascades.QueueSink(alerts, maxsize=0)])
+    with tempfile.TemporaryDirectory() as tmp:
+        svc = BybitWSService(SYMBOLS, ws_url="ws://127.0.0.1:1", db_path=f"{tmp}/bench.db",
+                             parquet_dir=f"{tmp}/parquet", detector=detector)
+        svc.writer.parquet_enabled = args.parquet
+
+        frame_lat = []
+        t0 = time.perf_counter()
+        for raw in data:
+            f0 = time.perf_counter()
+            await svc._handle_message(raw)
+            frame_lat.append(time.perf_counter() - f0)
+        elapsed = time.perf_counter() - t0
+        await svc.writer.close()
+    return [alerts.get() for _ in range(alerts.qsize())], frame_lat, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade detector alert latency")
+    parser.add_argument("--cascades", type=int, default=20, help="Nombre de cascades rejouées")
+    parser.add_argument("--quiet", type=int, default=cascades.WARMUP + cascades.COOLDOWN,
+                        help="Secondes calmes avant chaque cascade")
+    parser.add_argument("--burst", type=int, default=2000, help="Liquidations par cascade")
+    parser.add_argument("--burst-secs", type=int, default=10, help="Durée d'une cascade (secondes)")
+    parser.add_argument("--batch", type=int, default=20, help="Liquidations par frame pendant une cascade")
+    parser.add_argument("--no-parquet", dest="parquet", action="store_false", help="Sans écriture Parquet")
+    parser.add_argument("--budget-ms", type=float, default=10.0, help="Budget p99 de latence d'alerte")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    data = frames(args.cascades, args.quiet, args.burst, args.burst_secs, args.batch)
+    events = sum(len(json.loads(f)["data"]) for f in data)
+    alerts, frame_lat, elapsed = asyncio.run(replay(args, data))
+    lat = [a["latency_ms"] for a in alerts]
+
+    print(f"frames {len(data)}  events {events}  in {elapsed:.2f}s → {events / elapsed:,.0f} events/s")
+    print(f"alerts {len(alerts)} for {args.cascades} cascades")
+    print(f"{'':<16} {'p50':>8} {'p99':>8} {'max':>8}")
+    print(f"{'alert latency':<16} {pct(lat, 50):>6.3f}ms {pct(lat, 99):>6.3f}ms {max(lat, default=float('nan')):>6.3f}ms")
+    fl = [x * 1e3 for x in frame_lat]
+    print(f"{'frame handling':<16} {pct(fl, 50):>6.3f}ms {pct(fl, 99):>6.3f}ms {max(fl):>6.3f}ms")
+
+    ok = True
+    # quiet periods outlast the cooldown: one alert per cascade expected
+    if sum(a["symbol"] == SYMBOLS[0] for a in alerts) < args.cascades:
+        print("FAIL: some cascades raised no alert")
+        ok = False
+    if any(a["symbol"] != SYMBOLS[0] for a in alerts):
+        print("FAIL: alert on a quiet symbol")
+        ok = False
+    if not lat or pct(lat, 99) > args.budget_ms:
+        print(f"FAIL: alert p99 above {args.budget_ms}ms")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
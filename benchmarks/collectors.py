@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the collectors (no network).
+
+Every collector runs against a throw-away SQLite database with its HTTP calls
+answered by httpx.MockTransport (pipeline.httpclient.set_transport), from
+recorded fixtures (benchmarks/fixtures/<collector>.json) or, when none was
+recorded, from synthetic payloads of realistic size (sopr: multi-MB CSV).
+
+Per collector (best of --runs, the least noisy estimate):
+- http   : time inside httpx (client + mock transport + body read)
+- write  : time inside SQLite (execute/executemany/commit)
+- parse  : the rest (JSON/CSV decoding, row building, state publish)
+- peak   : tracemalloc peak during one extra run (kept out of the timings)
+Results are compared with benchmarks/baselines/collectors.json; exit 1 on a
+regression beyond --tolerance, or when a collector wrote no row.
+
+Usage (from the repo root):
+    python benchmarks/collectors.py                       # compare with baselines
+    python benchmarks/collectors.py --only sopr,bybit --runs 10
+    python benchmarks/collectors.py --update-baseline     # after an intended change
+    python benchmarks/collectors.py --record              # refresh fixtures from the live APIs
+"""
+
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from pipeline import httpclient, schema  # noqa: E402
+from pipeline.collectors import (  # noqa: E402
+    altme, bybit, coingecko, defillama, hashrate, mempool, sopr, txcount,
+)
+from pipeline.metrics import HTTP_SECONDS  # noqa: E402
+
+COLLECTORS = {
+    "coingecko": coingecko,
+    "defillama": defillama,
+    "sopr": sopr,
+    "bybit": bybit,
+    "mempool": mempool,
+    "altme": altme,
+    "hashrate": hashrate,
+    "txcount": txcount,
+}
+FIXTURES_DIR = ROOT / "benchmarks" / "fixtures"
+BASELINES = ROOT / "benchmarks" / "baselines" / "collectors.json"
+METRICS = ("total_ms", "http_ms", "parse_ms", "write_ms", "peak_kb")
+# below these, differences are timer / allocator noise
+NOISE_FLOOR = {"total_ms": 1.0, "http_ms": 1.0, "parse_ms": 1.0, "write_ms": 1.0, "peak_kb": 64.0}
+
+
+# -----------------------------------------------------
+# SYNTHETIC PAYLOADS (shape of the real APIs, deterministic)
+# -----------------------------------------------------
+def _coingecko(rng):
+    return [
+        {
+            "id": cid, "symbol": cid[:3], "name": cid.title(), "image": f"https://img/{cid}.png",
+            "current_price": rng.uniform(1, 100_000), "market_cap": rng.uniform(1e9, 1e12),
+            "market_cap_rank": i + 1, "total_volume": rng.uniform(1e8, 1e11),
+            "high_24h": rng.uniform(1, 100_000), "low_24h": rng.uniform(1, 100_000),
+            "price_change_24h": rng.uniform(-500, 500), "price_change_percentage_24h": rng.uniform(-10, 10),
+            "circulating_supply": rng.uniform(1e6, 1e9), "total_supply": None, "ath": rng.uniform(1, 1e5),
+            "last_updated": "2025-09-13T10:00:00.000Z",
+            "price_change_percentage_24h_in_currency": rng.uniform(-10, 10),
+        }
+        for i, cid in enumerate(coingecko.COINS)
+    ]
+
+
+def _defillama(rng, n_assets=300):
+    assets = []
+    for i in range(n_assets):
+        symbol = ("USDT", "USDC")[i] if i < 2 else f"S{i:03d}"
+        chains = [f"Chain{c}" for c in range(rng.randint(1, 40))]
+        assets.append({
+            "id": str(i + 1), "name": f"Stable {symbol}", "symbol": symbol, "pegType": "peggedUSD",
+            "circulating": {"peggedUSD": rng.uniform(1e6, 1.5e11)},
+            "circulatingPrevDay": {"peggedUSD": rng.uniform(1e6, 1.5e11)},
+            "chainCirculating": {c: {"current": {"peggedUSD": rng.uniform(0, 1e9)}} for c in chains},
+            "chains": chains, "price": 1.0,
+        })
+    return {"peggedAssets": assets, "totalCirculatingUSD": sum(a["circulating"]["peggedUSD"] for a in assets)}
+
+
+def _sopr_csv(rng, n_rows):
+    t0 = 1_230_768_000  # 2009-01-01
+    lines = ["d,unixTs,sopr"]
+    for i in range(n_rows):
+        ts = t0 + i * 3600
+        lines.append(f"{time.strftime('%Y-%m-%d', time.gmtime(ts))},{ts},{rng.uniform(0.9, 1.1):.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def _bybit_tickers(rng, n_symbols=500, n_incomplete=5):
+    out = []
+    for i in range(n_symbols):
+        out.append({
+            "symbol": f"C{i:04d}USDT" if i % 10 else f"C{i:04d}USDC",
+            "lastPrice": f"{rng.uniform(0.01, 1e5):.4f}", "indexPrice": f"{rng.uniform(0.01, 1e5):.4f}",
+            "markPrice": f"{rng.uniform(0.01, 1e5):.4f}", "prevPrice24h": f"{rng.uniform(0.01, 1e5):.4f}",
+            "price24hPcnt": f"{rng.uniform(-0.2, 0.2):.6f}", "volume24h": f"{rng.uniform(0, 1e9):.2f}",
+            "turnover24h": f"{rng.uniform(0, 1e10):.2f}", "openInterest": f"{rng.uniform(0, 1e8):.3f}",
+            "fundingRate": "" if i < n_incomplete else f"{rng.uniform(-0.001, 0.001):.8f}",
+            "nextFundingTime": "1726214400000", "bid1Price": "1", "ask1Price": "1",
+        })
+    return {"retCode": 0, "retMsg": "OK", "result": {"category": "linear", "list": out}, "time": 1726200000000}
+
+
+def _hashrate(rng, n_days=90):
+    t0 = 1_718_000_000
+    return {
+        "hashrates": [{"timestamp": t0 + d * 86400, "avgHashrate": rng.uniform(5e20, 7e20)} for d in range(n_days)],
+        "difficulty": [{"time": t0 + d * 1_209_600, "height": 840_000 + d * 2016,
+                        "difficulty": rng.uniform(8e13, 9e13), "adjustment": 1.01} for d in range(n_days // 14)],
+        "currentHashrate": rng.uniform(5e20, 7e20),
+        "currentDifficulty": rng.uniform(8e13, 9e13),
+        # the field the collector reads (EH/s)
+        "hashrate_7d": rng.uniform(500, 700),
+    }
+
+
+def _blocks(rng, n_blocks=15):
+    return [
+        {
+            "id": f"{rng.getrandbits(256):064x}", "height": 860_000 - i, "version": 536_870_912,
+            "timestamp": 1_726_200_000 - i * 600, "bits": 386_089_497, "nonce": rng.getrandbits(32),
+            "difficulty": 8.9e13, "merkle_root": f"{rng.getrandbits(256):064x}",
+            "tx_count": rng.randint(1_000, 5_000), "size": rng.randint(1_000_000, 2_000_000),
+            "weight": 3_993_000, "previousblockhash": f"{rng.getrandbits(256):064x}",
+            "extras": {"totalFees": rng.randint(10**6, 10**8), "medianFee": 5, "feeRange": [1, 2, 5, 10, 50],
+                       "reward": 312_500_000, "pool": {"id": 1, "name": "Pool", "slug": "pool"}},
+        }
+        for i in range(n_blocks)
+    ]
+
+
+def synthetic_handler(sopr_rows: int, seed: int = 42):
+    """MockTransport handler answering every collector endpoint with synthetic data."""
+    rng = random.Random(seed)
+    # built once: the benchmark measures the collectors, not the fixtures
+    routes = {
+        "api.coingecko.com/api/v3/coins/markets": ("json", _coingecko(rng)),
+        "stablecoins.llama.fi/stablecoins": ("json", _defillama(rng)),
+        "bitcoin-data.com/v1/sopr/csv": ("csv", _sopr_csv(rng, sopr_rows)),
+        "api.bybit.com/v5/market/tickers": ("json", _bybit_tickers(rng)),
+        "api.bybit.com/v5/market/funding/history": (
+            "json", {"retCode": 0, "result": {"list": [{"fundingRate": "0.0001", "fundingRateTimestamp": "1"}]}}),
+        "api.bybit.com/v5/market/open-interest": (
+            "json", {"retCode": 0, "result": {"list": [{"openInterest": "12345.6", "timestamp": "1"}]}}),
+        "mempool.space/api/v1/fees/recommended": (
+            "json", {"fastestFee": 12, "halfHourFee": 8, "hourFee": 6, "economyFee": 3, "minimumFee": 1}),
+        "mempool.space/api/mempool": (
+            "json", {"count": 85_000, "vsize": 120_000_000, "total_fee": 1.2e8,
+                     "fee_histogram": [[rng.uniform(1, 200), rng.randint(1_000, 100_000)] for _ in range(300)]}),
+        "api.alternative.me/fng/": (
+            "json", {"name": "Fear and Greed Index", "data": [
+                {"value": "54", "value_classification": "Neutral", "timestamp": "1726185600"}]}),
+        "mempool.space/api/v1/mining/hashrate": ("json", _hashrate(rng)),
+        "mempool.space/api/blocks": ("json", _blocks(rng)),
+    }
+    bodies = {
+        k: (json.dumps(v).encode(), "application/json") if kind == "json" else (v.encode(), "text/csv")
+        for k, (kind, v) in routes.items()
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hit = bodies.get(request.url.host + request.url.path)
+        if hit is None:
+            return httpx.Response(404, text="no synthetic route")
+        body, ctype = hit
+        return httpx.Response(200, content=body, headers={"Content-Type": ctype})
+
+    return handler
+
+
+# -----------------------------------------------------
+# RECORDED FIXTURES
+# -----------------------------------------------------
+def _route_key(url) -> str:
+    parts = urlsplit(str(url))
+    return parts.netloc + parts.path
+
+
+def load_fixture(name: str):
+    """{host+path: (status, body, content-type)} recorded for `name`, or None."""
+    path = FIXTURES_DIR / f"{name}.json"
+    if not path.exists():
+        return None
+    entries = json.loads(path.read_text())
+    return {e["route"]: (e["status"], e["body"].encode(), e["content_type"]) for e in entries}
+
+
+def replay_handler(fixture: dict, fallback):
+    def handler(request: httpx.Request) -> httpx.Response:
+        hit = fixture.get(_route_key(request.url))
+        if hit is None:
+            return fallback(request)
+        status, body, ctype = hit
+        return httpx.Response(status, content=body, headers={"Content-Type": ctype})
+    return handler
+
+
+class RecordingTransport(httpx.HTTPTransport):
+    """Real network transport keeping the last response per route (for --record)."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.recorded = {}
+
+    def handle_request(self, request):
+        resp = super().handle_request(request)
+        resp.read()
+        self.recorded[_route_key(request.url)] = {
+            "route": _route_key(request.url), "status": resp.status_code,
+            "content_type": resp.headers.get("Content-Type", ""), "body": resp.text,
+        }
+        return resp
+
+
+def record(names):
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        transport = RecordingTransport()
+        httpclient.set_transport(transport)
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = _open_db(Path(tmp) / "bench.db")
+            COLLECTORS[name].collect(conn)
+            conn.close()
+        httpclient.set_transport(None)
+        if not transport.recorded:
+            print(f"{name}: nothing recorded (async requests are not captured)")
+            continue
+        out = FIXTURES_DIR / f"{name}.json"
+        out.write_text(json.dumps(list(transport.recorded.values()), indent=1))
+        print(f"{name}: {len(transport.recorded)} response(s) → {out.relative_to(ROOT)}")
+
+
+# -----------------------------------------------------
+# MEASUREMENT
+# -----------------------------------------------------
+class _Clock:
+    seconds = 0.0
+
+
+class BenchCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            _Clock.seconds += time.perf_counter() - t0
+
+    def executemany(self, *args):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            _Clock.seconds += time.perf_counter() - t0
+
+
+class BenchConnection(sqlite3.Connection):
+    """Connection accumulating the time spent inside SQLite into _Clock.seconds."""
+
+    def cursor(self, factory=BenchCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        t0 = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _Clock.seconds += time.perf_counter() - t0
+
+
+def _open_db(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, factory=BenchConnection)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    schema.migrate(conn)
+    return conn
+
+
+def _http_seconds(source: str) -> float:
+    return HTTP_SECONDS.snapshot().get(source, {}).get("sum", 0.0)
+
+
+def run_once(name: str, conn: sqlite3.Connection, trace_memory: bool = False) -> dict:
+    module = COLLECTORS[name]
+    # sopr persists its own rate limit in meta
+    conn.execute("DELETE FROM meta WHERE key='sopr_last_fetch'")
+    conn.commit()
+
+    before_rows = conn.total_changes
+    http0 = _http_seconds(name)
+    _Clock.seconds = 0.0
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    module.collect(conn)
+    total = time.perf_counter() - t0
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    http = _http_seconds(name) - http0
+    write = _Clock.seconds
+    return {
+        "total_ms": total * 1e3,
+        "http_ms": http * 1e3,
+        "write_ms": write * 1e3,
+        "parse_ms": max(total - http - write, 0.0) * 1e3,
+        "peak_kb": peak / 1024,
+        "rows": conn.total_changes - before_rows,
+    }
+
+
+def bench(name: str, runs: int, warmup: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _open_db(Path(tmp) / "bench.db")
+        for _ in range(warmup):
+            run_once(name, conn)
+        samples = [run_once(name, conn) for _ in range(runs)]
+        mem = run_once(name, conn, trace_memory=True)
+        conn.close()
+    best = min(samples, key=lambda s: s["total_ms"])
+    result = {k: best[k] for k in METRICS if k != "peak_kb"}
+    result["peak_kb"] = mem["peak_kb"]
+    result["rows"] = min(s["rows"] for s in samples)
+    return result
+
+
+def compare(results: dict, baselines: dict, tolerance: float):
+    """[(collector, metric, value, baseline)] for every metric above baseline * (1 + tolerance)."""
+    regressions = []
+    for name, res in results.items():
+        base = baselines.get(name)
+        if not base:
+            continue
+        for k in METRICS:
+            if k not in base:
+                continue
+            if res[k] > base[k] * (1 + tolerance) and res[k] - base[k] > NOISE_FLOOR[k]:
+                regressions.append((name, k, res[k], base[k]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline collector benchmark (MockTransport)")
+    parser.add_argument("--only", help="Collecteurs séparés par des virgules (défaut : tous)")
+    parser.add_argument("--runs", type=int, default=7, help="Runs mesurés par collecteur (meilleur run)")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--sopr-rows", type=int, default=150_000, help="Lignes du CSV sopr synthétique")
+    parser.add_argument("--synthetic", action="store_true", help="Ignore les fixtures enregistrées")
+    parser.add_argument("--tolerance", type=float, default=0.50, help="Régression tolérée (0.50 = +50%%)")
+    parser.add_argument("--baseline", default=str(BASELINES), help="Fichier JSON des baselines")
+    parser.add_argument("--update-baseline", action="store_true", help="Écrit les résultats comme baseline")
+    parser.add_argument("--record", action="store_true", help="Enregistre les fixtures depuis les API réelles")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(COLLECTORS)
+    unknown = [n for n in names if n not in COLLECTORS]
+    if unknown:
+        parser.error(f"unknown collector(s): {', '.join(unknown)}")
+
+    if args.record:
+        record(names)
+        return 0
+
+    synthetic = synthetic_handler(args.sopr_rows)
+    results = {}
+    print(f"{'collector':<10} {'total':>9} {'http':>9} {'parse':>9} {'write':>9} {'peak':>10} {'rows':>6}  source")
+    for name in names:
+        fixture = None if args.synthetic else load_fixture(name)
+        handler = replay_handler(fixture, synthetic) if fixture else synthetic
+        httpclient.set_transport(httpx.MockTransport(handler))
+        res = bench(name, args.runs, args.warmup)
+        results[name] = res
+        print(f"{name:<10} {res['total_ms']:>7.2f}ms {res['http_ms']:>7.2f}ms {res['parse_ms']:>7.2f}ms "
+              f"{res['write_ms']:>7.2f}ms {res['peak_kb']:>8.0f}kB {res['rows']:>6}  "
+              f"{'recorded' if fixture else 'synthetic'}")
+    httpclient.set_transport(None)
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        stored.update({n: {k: round(r[k], 3) for k in METRICS} for n, r in results.items()})
+        stored["_meta"] = {"python": platform.python_version(), "machine": platform.machine(),
+                           "sopr_rows": args.sopr_rows, "runs": args.runs}
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"Baselines written to {baseline_path}")
+        return 0
+
+    failed = False
+    empty = [n for n, r in results.items() if r["rows"] == 0]
+    for n in empty:
+        print(f"FAIL {n}: no row written (collector error? see log above)")
+        failed = True
+
+    if baseline_path.exists():
+        regressions = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+        for name, k, value, base in regressions:
+            print(f"FAIL {name}.{k}: {value:.2f} > baseline {base:.2f} (+{(value / base - 1) * 100:.0f}%)")
+        failed = failed or bool(regressions)
+    else:
+        print(f"no baseline at {baseline_path} (run with --update-baseline)")
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
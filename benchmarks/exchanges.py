@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Multi-exchange liquidation ingestion throughput against local fake servers (no network).
+
+One websocket server per exchange (127.0.0.1, random port) waits for the subscribe
+message, then pushes its synthetic liquidations in that exchange's wire format:
+- bybit:   allLiquidation frames of --batch events
+- binance: one forceOrder per frame (as the real stream)
+- okx:     liquidation-orders frames of --batch details (sz in contracts)
+The real Feeds / adapters / Ingest / BybitLiquidationsWriter (throw-away database,
+Parquet off unless --parquet, adaptive flush) consume them:
+- loop mode:    every exchange on one event loop, one shared writer
+- process mode: one process per exchange (own loop, server and writer, same database)
+
+Reported: events/s from connect to the last event committed, overall and per exchange
+(decode + ingest time), and the rows stored per exchange. Exit 1 when a row is missing.
+
+Usage (from the repo root):
+    python benchmarks/exchanges.py
+    python benchmarks/exchanges.py --mode process --events 200000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import websockets  # noqa: E402
+
+from pipeline.collectors import liquidation_feeds as lf  # noqa: E402
+from pipeline.collectors.bybit_liquidations import BybitLiquidationsWriter  # noqa: E402
+
+PRICES = {"BTCUSDT": 60_000.0, "ETHUSDT": 3_000.0, "SOLUSDT": 150.0}
+OKX_IDS = {"BTCUSDT": "BTC-USDT-SWAP", "ETHUSDT": "ETH-USDT-SWAP", "SOLUSDT": "SOL-USDT-SWAP"}
+EXCHANGES = ("bybit", "binance", "okx")
+
+
+def frames(exchange: str, events: int, batch: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    t = 1_700_000_000_000
+    out, recs = [], []
+
+    def tick():
+        nonlocal t
+        t += rng.randint(1, 50)
+        sym = rng.choice(list(PRICES))
+        return sym, PRICES[sym] * rng.uniform(0.98, 1.02), rng.uniform(0.001, 5), rng.choice(("Buy", "Sell"))
+
+    for i in range(events):
+        sym, price, qty, side = tick()
+        if exchange == "binance":
+            out.append(json.dumps({"e": "forceOrder", "E": t + 3, "o": {
+                "s": sym, "S": side.upper(), "o": "LIMIT", "f": "IOC", "q": f"{qty:.3f}", "p": f"{price:.2f}",
+                "ap": f"{price:.2f}", "X": "FILLED", "l": f"{qty:.3f}", "z": f"{qty:.3f}", "T": t}}))
+            continue
+        if exchange == "bybit":
+            recs.append({"T": t, "s": sym, "S": side, "v": f"{qty:.3f}", "p": f"{price:.2f}"})
+        else:
+            ct = lf.OKXAdapter.CONTRACT_VALUES[OKX_IDS[sym]]
+            recs.append({"instId": OKX_IDS[sym], "d": {"bkPx": f"{price:.2f}", "sz": str(max(1, round(qty / ct))),
+                                                         "side": side.lower(), "posSide": "long" if side == "Sell"
+                                                         else "short", "ts": str(t)}})
+        if len(recs) == batch or i == events - 1:
+            if exchange == "bybit":
+                out.append(json.dumps({"topic": "allLiquidation." + recs[0]["s"], "type": "snapshot",
+                                       "ts": recs[-1]["T"], "data": recs}))
+            else:
+                by_inst = {}
+                for r in recs:
+                    by_inst.setdefault(r["instId"], []).append(r["d"])
+                out.append(json.dumps({"arg": {"channel": "liquidation-orders", "instType": "SWAP"},
+                                       "data": [{"instId": k, "instFamily": k[:-5], "instType": "SWAP",
+                                                 "details": v} for k, v in by_inst.items()]}))
+            recs = []
+    return out
+
+
+async def serve(data: list[str]):
+    async def handler(ws):
+        await ws.recv()  # subscribe
+        for f in data:
+            await ws.send(f)
+        await ws.wait_closed()
+
+    server = await websockets.serve(handler, "127.0.0.1", 0, max_size=None)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"ws://127.0.0.1:{port}"
+
+
+class CountingIngest(lf.Ingest):
+    def __init__(self, writer, expected: int):
+        super().__init__(writer)
+        self.expected = expected
+        self.seen = 0
+        self.busy = {}
+        self.done = asyncio.Event()
+
+    async def ingest(self, batch, received=None):
+        await super().ingest(batch, received)
+        self.busy[batch.exchange] = self.busy.get(batch.exchange, 0.0) + time.perf_counter() - received
+        self.seen += len(batch)
+        if self.seen >= self.expected:
+            self.done.set()
+
+
+async def consume(exchanges, args, db_path: str, parquet_dir: str) -> dict:
+    """Servers + feeds for `exchanges` on this loop; returns timings once everything is committed."""
+    data = {x: frames(x, args.events // len(EXCHANGES), args.batch, seed=i) for i, x in enumerate(exchanges)}
+    expected = sum(sum(len(lf.ADAPTERS[x]().decode(f) or ()) for f in fs) for x, fs in data.items())
+    servers = {x: await serve(fs) for x, fs in data.items()}
+
+    writer = BybitLiquidationsWriter(db=db_path, parquet_dir=parquet_dir, parquet_enabled=args.parquet,
+                                     latency_target=2.0, flush_interval=1.0)
+    ingest = CountingIngest(writer, expected)
+    feeds = [lf.Feed(lf.ADAPTERS[x](list(PRICES)), ingest, servers[x][1]) for x in exchanges]
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(f.run()) for f in feeds]
+    await asyncio.wait_for(ingest.done.wait(), args.timeout)
+    await writer.flush()
+    elapsed = time.perf_counter() - t0
+    for f in feeds:
+        await f.stop()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await ingest.close()
+    for server, _ in servers.values():
+        server.close()
+        await server.wait_closed()
+    return {"elapsed": elapsed, "events": ingest.seen, "busy": ingest.busy}
+
+
+def _process(exchange, args, db_path, parquet_dir, out):
+    logging.disable(logging.WARNING)
+    out.put(asyncio.run(consume([exchange], args, db_path, parquet_dir)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-exchange liquidation ingestion throughput")
+    parser.add_argument("--events", type=int, default=90_000, help="Liquidations au total (réparties par exchange)")
+    parser.add_argument("--batch", type=int, default=20, help="Événements par frame (bybit, okx)")
+    parser.add_argument("--mode", choices=("loop", "process"), default="loop",
+                        help="Une boucle pour tous les exchanges, ou un processus par exchange")
+    parser.add_argument("--parquet", action="store_true", help="Avec écriture Parquet")
+    parser.add_argument("--timeout", type=float, default=300, help="Secondes max pour tout ingérer")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, parquet_dir = f"{tmp}/bench.db", f"{tmp}/parquet"
+        if args.mode == "loop":
+            res = asyncio.run(consume(EXCHANGES, args, db_path, parquet_dir))
+            elapsed, events, busy = res["elapsed"], res["events"], res["busy"]
+        else:
+            BybitLiquidationsWriter(db=db_path, parquet_dir=parquet_dir, parquet_enabled=False).conn.close()
+            ctx = multiprocessing.get_context("spawn")
+            out = ctx.Queue()
+            t0 = time.perf_counter()
+            procs = [ctx.Process(target=_process, args=(x, args, db_path, parquet_dir, out)) for x in EXCHANGES]
+            for p in procs:
+                p.start()
+            results = [out.get(timeout=args.timeout) for _ in procs]
+            for p in procs:
+                p.join()
+            # the processes start together: wall time of the slowest, not the sum
+            elapsed = max(r["elapsed"] for r in results)
+            print(f"(wall time incl. process start-up: {time.perf_counter() - t0:.2f}s)")
+            events = sum(r["events"] for r in results)
+            busy = {k: v for r in results for k, v in r["busy"].items()}
+
+        conn = sqlite3.connect(db_path)
+        stored = dict(conn.execute("SELECT exchange, count(*) FROM bybit_liquidations GROUP BY exchange"))
+        conn.close()
+
+    print(f"mode {args.mode}: {events} events in {elapsed:.2f}s → {events / elapsed:,.0f} events/s")
+    print(f"{'exchange':<10} {'stored':>8} {'ingest busy':>12}")
+    for x in EXCHANGES:
+        print(f"{x:<10} {stored.get(x, 0):>8} {busy.get(x, 0.0):>11.2f}s")
+    if sum(stored.values()) != events:
+        print(f"FAIL: {sum(stored.values())} rows stored for {events} events")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Lease coordination (pipeline/leases.py): exclusivity and failover time, per backend.
+
+--nodes Coordinators compete for --leases leases (ttl --ttl) on each backend:
+- memory: one MemoryBackend shared by the nodes (the in-process stand-in)
+- sqlite: one SQLiteBackend per node on the same temp file
+- redis:  one RedisBackend per node on a shared fakeredis server (skipped if not installed)
+A sampler thread checks every 5 ms that no lease is held (holds()) by two nodes at once.
+Once the placement is stable, one node stops ticking without releasing anything (a
+crash); reported: the time until every one of its leases is held by a survivor, which
+must stay within ttl + ttl / 3 (+ one sampling period). Exit 1 on a double holder, a
+lease left unheld or a slow failover.
+
+Usage (from the repo root):
+    python benchmarks/leases.py
+    python benchmarks/leases.py --nodes 5 --leases 40 --ttl 3
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import leases  # noqa: E402
+
+SAMPLE = 0.005
+
+
+def backends(tmp: str) -> dict:
+    """name → factory() returning one backend per node."""
+    shared = leases.MemoryBackend()
+    out = {
+        "memory": lambda: shared,
+        "sqlite": lambda: leases.SQLiteBackend(f"{tmp}/leases.db"),
+    }
+    try:
+        import fakeredis
+    except ImportError:
+        print("redis: skipped (fakeredis not installed)")
+    else:
+        server = fakeredis.FakeServer()
+        out["redis"] = lambda: leases.RedisBackend(client=fakeredis.FakeRedis(server=server))
+    return out
+
+
+class Sampler(threading.Thread):
+    """Counts, every SAMPLE seconds, the nodes that consider each lease theirs."""
+
+    def __init__(self, coords, names):
+        super().__init__(daemon=True)
+        self.coords = coords
+        self.names = names
+        self.conflicts = []
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            for name in self.names:
+                holders = [c.node_id for c in self.coords if c.holds(name)]
+                if len(holders) > 1:
+                    self.conflicts.append((name, holders))
+            time.sleep(SAMPLE)
+
+
+def crash(coord: leases.Coordinator):
+    """Stop renewing without releasing: the backend keeps the leases until they expire."""
+    coord._stop.set()
+    coord._thread.join()
+
+
+def run(factory, nodes: int, names: list, ttl: float) -> dict:
+    coords = [leases.Coordinator(factory(), node_id=f"n{i}", ttl=ttl) for i in range(nodes)]
+    for c in coords:
+        c.want(*names)
+    sampler = Sampler(coords, names)
+    sampler.start()
+    for c in coords:
+        c.start()
+    time.sleep(ttl)  # every node has seen the others (ticks every ttl / 3)
+
+    victim, survivors = coords[0], coords[1:]
+    moved = sorted(victim.held())
+    spread = [len(c.held()) for c in coords]
+    crash(victim)
+    t0 = time.monotonic()
+    failover = None
+    while time.monotonic() - t0 < 3 * ttl:
+        if all(any(c.holds(n) for c in survivors) for n in moved):
+            failover = time.monotonic() - t0
+            break
+        time.sleep(SAMPLE)
+    time.sleep(ttl / 3)
+    unheld = [n for n in names if not any(c.holds(n) for c in survivors)]
+
+    sampler.stop.set()
+    sampler.join()
+    for c in survivors:
+        c.stop()
+    return {"spread": spread, "moved": len(moved), "failover": failover, "unheld": unheld,
+            "conflicts": sampler.conflicts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lease exclusivity and failover per backend")
+    parser.add_argument("--nodes", type=int, default=3, help="Nœuds (Coordinators)")
+    parser.add_argument("--leases", type=int, default=10, help="Baux disputés")
+    parser.add_argument("--ttl", type=float, default=1.5, help="Durée des baux (secondes)")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    names = [f"job{i}" for i in range(args.leases)]
+    bound = args.ttl + args.ttl / 3
+    failed = False
+    print(f"{args.nodes} nodes, {args.leases} leases, ttl {args.ttl:g}s → failover bound {bound:.2f}s")
+    print(f"{'backend':<8} {'spread':<14} {'moved':>6} {'failover':>9}  result")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, factory in backends(tmp).items():
+            res = run(factory, args.nodes, names, args.ttl)
+            problems = []
+            if res["conflicts"]:
+                lease, holders = res["conflicts"][0]
+                problems.append(f"{len(res['conflicts'])} double holds (e.g. {lease}: {','.join(holders)})")
+            if res["failover"] is None or res["failover"] > bound + SAMPLE:
+                problems.append("failover too slow")
+            if res["unheld"]:
+                problems.append(f"unheld: {','.join(res['unheld'])}")
+            failed |= bool(problems)
+            took = f"{res['failover']:.2f}s" if res["failover"] is not None else "-"
+            print(f"{name:<8} {'/'.join(map(str, res['spread'])):<14} {res['moved']:>6} {took:>9}  "
+                  f"{'; '.join(problems) or 'OK'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
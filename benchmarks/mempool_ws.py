@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+mempool.space WebSocket collector against a local fake server (no network).
+
+The server (127.0.0.1, random port) waits for the {"action": "want"} message, answers
+with the recent blocks + a first stats frame, then pushes --rate stats frames per second
+(mempoolInfo.size = sequence number, so every sample is identifiable) and a new block
+every --block-every seconds, answers pings, and drops the connection once half-way
+(the collector reconnects and gets the recent blocks again).
+The real Feed / MempoolAdapter / MempoolWriter consume it for --seconds:
+- hot cache: server send → state publish latency (every sample)
+- database: staleness of max(ts) in mempool, sampled every 0.1s by a reader
+- down-sampling: the mempool rows must be exactly the last sample published in each
+  --resolution bucket; txcount_btc one row per block height (none for the resent ones)
+Compared with the polling collectors over the same time: REST requests and staleness.
+Exit 1 when the stored rows differ from the expected ones.
+
+Usage (from the repo root):
+    python benchmarks/mempool_ws.py
+    python benchmarks/mempool_ws.py --seconds 60 --rate 50 --resolution 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import websockets  # noqa: E402
+
+from pipeline import state  # noqa: E402
+from pipeline.collectors import liquidation_feeds as lf  # noqa: E402
+from pipeline.collectors import mempool, txcount  # noqa: E402
+from pipeline.collectors.mempool_ws import MempoolAdapter, MempoolWriter  # noqa: E402
+
+HEIGHT0 = 850_000
+
+
+class FakeMempool:
+    def __init__(self, rate: float, block_every: float, seconds: float):
+        self.rate = rate
+        self.block_every = block_every
+        self.seconds = seconds
+        self.rng = random.Random(1)
+        self.seq = 0
+        self.height = HEIGHT0
+        self.sent = {}  # seq → perf_counter at send
+        self.blocks = {HEIGHT0: 3000}
+        self.connections = 0
+        self.t0 = None
+
+    def _stats(self) -> dict:
+        self.seq += 1
+        fastest = self.rng.uniform(2, 80)
+        return {"mempoolInfo": {"loaded": True, "size": self.seq, "bytes": self.seq * 250},
+                "vBytesPerSecond": self.rng.randint(1000, 5000),
+                "fees": {"fastestFee": fastest, "halfHourFee": fastest * 0.8, "hourFee": fastest * 0.6,
+                         "economyFee": 2, "minimumFee": 1}}
+
+    def _block(self, height: int) -> dict:
+        return {"id": f"{height:064x}", "height": height, "tx_count": self.blocks[height],
+                "timestamp": int(time.time()), "size": 1_500_000}
+
+    async def _send(self, ws, msg: dict):
+        if "mempoolInfo" in msg:
+            self.sent[msg["mempoolInfo"]["size"]] = time.perf_counter()
+        await ws.send(json.dumps(msg))
+
+    async def handler(self, ws):
+        self.connections += 1
+        first = self.connections == 1
+        async for raw in ws:
+            msg = json.loads(raw)
+            if msg.get("action") == "ping":
+                await ws.send('{"pong":true}')
+            elif msg.get("action") == "want":
+                break
+        if self.t0 is None:
+            self.t0 = time.perf_counter()
+        recent = sorted(self.blocks)[-8:]
+        await self._send(ws, {"blocks": [self._block(h) for h in recent], **self._stats()})
+        next_block = self.t0 + self.block_every * (len(self.blocks))
+        while time.perf_counter() - self.t0 < self.seconds:
+            if first and time.perf_counter() - self.t0 >= self.seconds / 2:
+                await ws.close()  # mid-run disconnect
+                return
+            await asyncio.sleep(1 / self.rate)
+            msg = self._stats()
+            if time.perf_counter() >= next_block:
+                self.height += 1
+                self.blocks[self.height] = self.rng.randint(1000, 5000)
+                msg["block"] = self._block(self.height)
+                next_block += self.block_every
+            await self._send(ws, msg)
+        await ws.wait_closed()
+
+
+async def run(args, db_path: str) -> dict:
+    fake = FakeMempool(args.rate, args.block_every, args.seconds)
+    server = await websockets.serve(fake.handler, "127.0.0.1", 0)
+    url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    backend = state.MemoryBackend()
+    state.set_state(backend)
+    latencies, expected = [], {}
+    writer = MempoolWriter(db_path, args.resolution, args.flush_interval)
+
+    def on_publish(key, value):
+        if key == "mempool":
+            latencies.append(time.perf_counter() - fake.sent[value["tx_count"]])
+            expected[value["ts"] - value["ts"] % writer.resolution] = (value["ts"], value["tx_count"])
+
+    backend.subscribe(on_publish)
+    feed = lf.Feed(MempoolAdapter(), writer, url)
+    task = asyncio.create_task(feed.run())
+
+    reader = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    staleness = []
+    while fake.t0 is None or time.perf_counter() - fake.t0 < args.seconds:
+        await asyncio.sleep(0.1)
+        if fake.t0 is not None and time.perf_counter() - fake.t0 > args.flush_interval + args.resolution:
+            newest = reader.execute("SELECT max(ts) FROM mempool").fetchone()[0]
+            if newest is not None:
+                staleness.append(time.time() - newest)
+    reader.close()
+
+    await feed.stop()
+    await asyncio.gather(task, return_exceptions=True)
+    await writer.close()
+    server.close()
+    await server.wait_closed()
+    return {"fake": fake, "latencies": latencies, "staleness": staleness, "expected": expected,
+            "samples": writer.samples}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mempool.space WS collector vs a local fake server")
+    parser.add_argument("--seconds", type=float, default=20, help="Durée du flux (secondes)")
+    parser.add_argument("--rate", type=float, default=20, help="Frames stats par seconde")
+    parser.add_argument("--block-every", type=float, default=3, help="Un bloc toutes les N secondes")
+    parser.add_argument("--resolution", type=int, default=2, help="Intervalle de sous-échantillonnage (secondes)")
+    parser.add_argument("--flush-interval", type=float, default=1, help="Écriture toutes les N secondes")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = f"{tmp}/bench.db"
+        res = asyncio.run(run(args, db_path))
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT ts, tx_count FROM mempool ORDER BY ts").fetchall()
+        blocks = [r[0] for r in conn.execute("SELECT tx_count FROM txcount_btc ORDER BY ts")]
+        conn.close()
+
+    fake, lat, stale = res["fake"], sorted(res["latencies"]), sorted(res["staleness"])
+    polls = args.seconds / mempool.INTERVAL * 2 + args.seconds / txcount.INTERVAL
+    print(f"{res['samples']} stats frames, {fake.height - HEIGHT0} blocks, {fake.connections} connections "
+          f"in {args.seconds:.0f}s")
+    print(f"hot cache latency   p50 {statistics.median(lat) * 1e3:7.2f}ms   "
+          f"p99 {lat[int(0.99 * (len(lat) - 1))] * 1e3:7.2f}ms")
+    if stale:
+        print(f"database staleness  p50 {statistics.median(stale):7.2f}s    max {stale[-1]:7.2f}s   "
+              f"(resolution {args.resolution}s + flush {args.flush_interval:g}s)")
+    print(f"rows: mempool {len(rows)} for {res['samples']} samples "
+          f"({res['samples'] / max(len(rows), 1):.1f}× down-sampled), txcount_btc {len(blocks)}")
+    print(f"polling over the same {args.seconds:.0f}s: {polls:.1f} REST requests, staleness up to "
+          f"{mempool.INTERVAL}s (mempool) / {txcount.INTERVAL}s (txcount); stream: 1 connection")
+
+    failed = False
+    if rows != sorted(res["expected"].values()):
+        print(f"FAIL: {len(rows)} mempool rows, expected the last sample of {len(res['expected'])} buckets")
+        failed = True
+    # the latest block at the first connect, then every block mined; none for the resent lists
+    want = [fake.blocks[h] for h in sorted(fake.blocks)]
+    if blocks != want:
+        print(f"FAIL: txcount_btc {blocks} != {want}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
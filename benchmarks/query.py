@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Time-range read benchmark: pandas.read_sql_query vs pipeline.query.range.
+
+Fills a throw-away database with --rows bybit snapshots (several symbols),
+then reads one symbol over the whole range, over the most recent 1% and as
+an hourly resample:
+- "pandas/noidx": read_sql_query without the schema v4 range indexes (before)
+- "pandas"      : read_sql_query with the indexes
+- "query/*"     : pipeline.query.range → numpy / arrow
+reporting wall time and tracemalloc peak (separate pass).
+
+Usage (from the repo root):
+    python benchmarks/query.py
+    python benchmarks/query.py --rows 2000000 --symbols 4
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import db, query, schema  # noqa: E402
+
+
+def fill(path: Path, rows: int, symbols: int):
+    conn = db.get_conn(path)
+    schema.migrate(conn)
+    rng = random.Random(1)
+    syms = [f"S{i}USDT" for i in range(symbols)]
+    per_sym = rows // symbols
+    conn.executemany(
+        "INSERT INTO bybit (ts, symbol, funding, open_interest) VALUES (?,?,?,?)",
+        ((t * 60, s, rng.uniform(-1e-3, 1e-3), rng.uniform(1e5, 1e9)) for t in range(per_sym) for s in syms),
+    )
+    conn.commit()
+    conn.close()
+    return syms[0], per_sym * 60
+
+
+def measure(fn, runs: int):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pandas vs pipeline.query time-range reads")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Lignes bybit générées")
+    parser.add_argument("--symbols", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3, help="Runs par méthode (meilleur run)")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        symbol, end = fill(path, args.rows, args.symbols)
+        conn = db.get_readonly_conn(path)
+        recent = end - end // 100
+
+        raw_sql = ("SELECT ts, funding, open_interest FROM bybit "
+                   "WHERE symbol = ? AND ts >= ? AND ts < ? ORDER BY ts")
+        hourly_sql = ("SELECT ts / 3600 * 3600 AS ts, avg(funding) AS funding, avg(open_interest) AS open_interest "
+                      "FROM bybit WHERE symbol = ? AND ts >= ? AND ts < ? GROUP BY 1 ORDER BY 1")
+        cases = {
+            "raw": (
+                lambda: pd.read_sql_query(raw_sql, conn, params=(symbol, 0, end)),
+                lambda: query.range("bybit", ["funding", "open_interest"], 0, end, symbol=symbol, conn=conn),
+                lambda: query.range("bybit", ["funding", "open_interest"], 0, end, symbol=symbol, conn=conn,
+                                    output="arrow"),
+            ),
+            "recent": (
+                lambda: pd.read_sql_query(raw_sql, conn, params=(symbol, recent, end)),
+                lambda: query.range("bybit", ["funding", "open_interest"], recent, end, symbol=symbol, conn=conn),
+                lambda: query.range("bybit", ["funding", "open_interest"], recent, end, symbol=symbol, conn=conn,
+                                    output="arrow"),
+            ),
+            "hourly": (
+                lambda: pd.read_sql_query(hourly_sql, conn, params=(symbol, 0, end)),
+                lambda: query.range("bybit", ["funding", "open_interest"], 0, end, symbol=symbol, conn=conn,
+                                    resample=3600, agg="mean"),
+                lambda: query.range("bybit", ["funding", "open_interest"], 0, end, symbol=symbol, conn=conn,
+                                    resample=3600, agg="mean", output="arrow"),
+            ),
+        }
+
+        # baseline: the pre-v4 layout (no range index)
+        rw = db.get_conn(path)
+        rw.execute("DROP INDEX idx_bybit_ts")
+        rw.execute("DROP INDEX idx_bybit_symbol_ts")
+        rw.commit()
+        before = {case: measure(fns[0], args.runs) for case, fns in cases.items()}
+        for stmt in schema._RANGE_INDEXES:
+            rw.execute(stmt)
+        rw.commit()
+        rw.close()
+
+        print(f"{'case':<8} {'method':<14} {'rows':>9} {'time':>10} {'peak':>10} {'speedup':>8}")
+        for case, (pandas_fn, numpy_fn, arrow_fn) in cases.items():
+            t_ref, peak_ref, df = before[case]
+            print(f"{case:<8} {'pandas/noidx':<14} {len(df):>9} {t_ref * 1e3:>8.1f}ms {peak_ref / 1e6:>8.1f}MB "
+                  f"{'1.0x':>8}")
+            for name, fn in (("pandas", pandas_fn), ("query/numpy", numpy_fn), ("query/arrow", arrow_fn)):
+                t, peak, out = measure(fn, args.runs)
+                n = out.num_rows if name == "query/arrow" else len(out) if name == "pandas" else len(out["ts"])
+                print(f"{case:<8} {name:<14} {n:>9} {t * 1e3:>8.1f}ms {peak / 1e6:>8.1f}MB {t_ref / t:>7.1f}x")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
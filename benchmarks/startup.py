@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Startup-time budget for the pipeline entry points.
+
+Runs each entry point's imports in a fresh interpreter with `-X importtime`,
+records the raw log, prints the slowest imports and exits 1 when the cold
+start exceeds its budget.
+
+Usage (from the repo root):
+    python benchmarks/startup.py                 # check budgets
+    python benchmarks/startup.py --runs 5 --log-dir bench_output/
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# module imported by each entry point → cold-start budget (ms, median of runs)
+BUDGETS_MS = {
+    "main": 250,
+    "pipeline.collectors.bybit_ws": 250,
+}
+
+# heavy dependencies that must NOT be imported at start-up
+FORBIDDEN = ("pandas", "pyarrow", "numpy", "matplotlib")
+
+
+def parse_importtime(stderr: str):
+    """Return ([(module, self_us, cumulative_us, depth)], total_us) from an -X importtime log."""
+    rows = []
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), depth))
+        if depth == 0:
+            total += int(cum_us)
+    return rows, total
+
+
+def measure(module: str):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows, total = parse_importtime(proc.stderr)
+    return rows, total, proc.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import budget check")
+    parser.add_argument("--runs", type=int, default=3, help="Runs par entrypoint (médiane)")
+    parser.add_argument("--top", type=int, default=10, help="Nombre d'imports les plus lents affichés")
+    parser.add_argument("--log-dir", help="Dossier où écrire les logs -X importtime bruts")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        totals = []
+        for _ in range(args.runs):
+            rows, total, raw = measure(module)
+            totals.append(total / 1000)
+        median = statistics.median(totals)
+
+        if args.log_dir:
+            out = Path(args.log_dir)
+            out.mkdir(parents=True, exist_ok=True)
+            (out / f"importtime_{module}.log").write_text(raw)
+
+        loaded = {name for name, *_ in rows}
+        heavy = sorted(m for m in FORBIDDEN if m in loaded)
+        ok = median <= budget and not heavy
+        failed |= not ok
+
+        print(f"{'OK  ' if ok else 'FAIL'} {module}: {median:.1f} ms (budget {budget} ms)")
+        if heavy:
+            print(f"     heavy imports at start-up: {', '.join(heavy)}")
+        for name, self_us, cum_us, depth in sorted(rows, key=lambda r: -r[2])[:args.top]:
+            print(f"     {cum_us / 1000:8.1f} ms  {'  ' * depth}{name}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Hot state cache (pipeline/state.py): round trip and change notifications, per backend.
+
+Each backend goes through the module API the collectors use (set_state + publish /
+publish_many), then is read back by a second instance, as another process would:
+- memory: one MemoryBackend (the in-process default)
+- redis:  RedisBackend on a fakeredis server, the writer and the reader each with
+  their own client (skipped if fakeredis is not installed)
+Checked: get() and snapshot(prefix) return the published values (JSON round trip,
+bytes keys decoded), every change reaches the reader's subscribe() callback (pub/sub
+thread for Redis, waited up to --timeout), and nothing arrives after unsubscribe.
+Reported: publish → callback latency. Exit 1 on a missing or wrong value.
+
+Usage (from the repo root):
+    python benchmarks/state.py
+    python benchmarks/state.py --keys 500
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import state  # noqa: E402
+
+
+def backends() -> dict:
+    """name → (writer backend, reader backend) sharing the same store."""
+    memory = state.MemoryBackend()
+    out = {"memory": (memory, memory)}
+    try:
+        import fakeredis
+    except ImportError:
+        print("redis: skipped (fakeredis not installed)")
+    else:
+        server = fakeredis.FakeServer()
+        out["redis"] = (state.RedisBackend(client=fakeredis.FakeRedis(server=server)),
+                        state.RedisBackend(client=fakeredis.FakeRedis(server=server)))
+    return out
+
+
+def run(writer, reader, keys: int, timeout: float) -> dict:
+    items = {f"bench:{i}": {"ts": 1_700_000_000 + i, "value": i * 0.5, "symbol": f"S{i}"}
+             for i in range(keys)}
+    received, sent = {}, {}
+    done = threading.Event()
+
+    def on_change(key, value):
+        received[key] = (value, time.perf_counter())
+        if len(received) == keys:
+            done.set()
+
+    unsubscribe = reader.subscribe(on_change)
+    time.sleep(0.1)  # the Redis pub/sub thread is listening
+    state.set_state(writer)
+    first, rest = list(items)[0], dict(list(items.items())[1:])
+    sent[first] = time.perf_counter()
+    state.publish(first, items[first])
+    sent.update(dict.fromkeys(rest, time.perf_counter()))
+    state.publish_many(rest)
+    done.wait(timeout)
+
+    problems = []
+    if reader.get(first) != items[first]:
+        problems.append(f"get({first}) = {reader.get(first)}")
+    if reader.get("bench:missing") is not None:
+        problems.append("get(missing) is not None")
+    snap = reader.snapshot("bench:")
+    if snap != items:
+        problems.append(f"snapshot: {len(snap)} keys, {sum(snap.get(k) == v for k, v in items.items())} equal")
+    if reader.snapshot("other:"):
+        problems.append("snapshot(prefix) not filtered")
+    wrong = [k for k, (v, _) in received.items() if v != items[k]]
+    if len(received) < keys or wrong:
+        problems.append(f"callbacks: {len(received)}/{keys} received, {len(wrong)} wrong")
+
+    latencies = sorted(t - sent[k] for k, (_, t) in received.items())
+    count = len(received)
+    unsubscribe()
+    received.clear()
+    state.publish(first, {"ts": 0})
+    time.sleep(0.1)
+    if received:
+        problems.append("callback after unsubscribe")
+    return {"received": count, "problems": problems, "latencies": latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot state cache round trip per backend")
+    parser.add_argument("--keys", type=int, default=100, help="Clés publiées")
+    parser.add_argument("--timeout", type=float, default=5, help="Attente des notifications (secondes)")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    failed = False
+    print(f"{'backend':<8} {'callbacks':>10} {'p50':>9} {'max':>9}  result")
+    for name, (writer, reader) in backends().items():
+        res = run(writer, reader, args.keys, args.timeout)
+        lat = res["latencies"]
+        p50 = f"{statistics.median(lat) * 1e3:.2f}ms" if lat else "-"
+        top = f"{lat[-1] * 1e3:.2f}ms" if lat else "-"
+        failed |= bool(res["problems"])
+        print(f"{name:<8} {res['received']:>10} {p50:>9} {top:>9}  {'; '.join(res['problems']) or 'OK'}")
+        writer.close()
+        reader.close()
+    state.set_state(None)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Row layout vs compact layout (pipeline/compact.py): database size and range scans.
+
+Fills a throw-away database (row layout, schema at the current version) with
+synthetic coingecko / bybit / signals rows and --liquidations Bybit events (raw
+JSON as the writer stores it), copies it, converts the copy with compact.compact()
++ VACUUM, then reports:
+- bytes per table (table + its indexes, from dbstat) and file size, both layouts
+- best-of---runs time of the same reads on both files:
+    per-symbol range over the whole history (query.range / query.liquidations),
+    cross-symbol recent window (last 5%), latest row per symbol
+Each scan is checked to return the same rows on both layouts.
+
+Usage (from the repo root):
+    python benchmarks/storage.py
+    python benchmarks/storage.py --liquidations 2000000 --rows 500000
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import compact, db, query, schema  # noqa: E402
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "DOGEUSDT", "BNBUSDT"]
+COINS = ["bitcoin", "ethereum", "solana", "ripple", "dogecoin", "binancecoin"]
+SIGNALS = ["fng", "sopr", "stablecoins", "mempool", "funding", "oi", "hashrate", "composite"]
+T0 = 1_700_000_000
+
+
+def fill(path: Path, rows: int, liquidations: int, seed: int = 1):
+    rng = random.Random(seed)
+    conn = db.get_conn(path)
+    schema.migrate(conn)
+    per = rows // len(SYMBOLS)
+    conn.executemany("INSERT INTO coingecko (ts, symbol, price_usd) VALUES (?,?,?)",
+                     ((T0 + t * 60, s, rng.uniform(1, 1e5)) for t in range(per) for s in COINS))
+    conn.executemany("INSERT INTO bybit (ts, symbol, funding, open_interest) VALUES (?,?,?,?)",
+                     ((T0 + t * 60, s, rng.uniform(-1e-3, 1e-3), rng.uniform(1e5, 1e9))
+                      for t in range(per) for s in SYMBOLS))
+    conn.executemany("INSERT INTO signals (ts, name, value, classification) VALUES (?,?,?,?)",
+                     ((T0 + t * 300, n, rng.uniform(-1, 1), rng.choice(("bullish", "bearish", "neutral")))
+                      for t in range(rows // len(SIGNALS)) for n in SIGNALS))
+
+    def events():
+        t = T0 * 1000
+        for _ in range(liquidations):
+            t += rng.randint(1, 400)
+            sym = rng.choice(SYMBOLS)
+            side = rng.choice(("Buy", "Sell"))
+            price = round(rng.uniform(0.1, 7e4), 4)
+            qty = round(rng.uniform(0.001, 50), 3)
+            raw = json.dumps({"T": t, "s": sym, "S": side, "v": str(qty), "p": str(price)}, separators=(",", ":"))
+            yield t // 1000, t, sym, side.upper(), price, qty, price * qty, raw
+
+    conn.executemany("INSERT INTO bybit_liquidations (ts, ts_ms, symbol, side, price, qty, qty_usd, raw) "
+                     "VALUES (?,?,?,?,?,?,?,?)", events())
+    conn.commit()
+    end = conn.execute("SELECT max(ts) FROM bybit_liquidations").fetchone()[0]
+    conn.execute("VACUUM")
+    conn.close()
+    return end
+
+
+def table_bytes(path: Path) -> dict:
+    """{table: bytes of the table + its indexes} (compact _data tables under their view name)."""
+    conn = db.get_conn(path)
+    owner = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+    out = {}
+    for name, size in conn.execute("SELECT name, sum(pgsize) FROM dbstat GROUP BY name"):
+        table = owner.get(name, name).removesuffix("_data")
+        if table == "dictionary" or table.startswith("sqlite_autoindex_dictionary"):
+            table = "dictionary"
+        out[table] = out.get(table, 0) + size
+    conn.close()
+    return out
+
+
+def scans(end: int):
+    recent = end - int((end - T0) * 0.05)
+    return {
+        "coingecko symbol": lambda c: query.range("coingecko", symbol="bitcoin", conn=c),
+        "bybit symbol": lambda c: query.range("bybit", symbol="BTCUSDT", conn=c),
+        "signals name": lambda c: query.range("signals", symbol="composite", conn=c),
+        "liq symbol": lambda c: query.liquidations(symbol="BTCUSDT", conn=c, archive_dir="/nonexistent"),
+        "liq recent 5%": lambda c: query.liquidations(start=recent, conn=c, archive_dir="/nonexistent"),
+        "liq 1h resample": lambda c: query.range("bybit_liquidations", ["qty_usd"], symbol="ETHUSDT",
+                                                 resample=3600, agg="sum", conn=c),
+        "latest/symbol": lambda c: [c.execute("SELECT * FROM bybit WHERE symbol = ? ORDER BY ts DESC LIMIT 1",
+                                              (s,)).fetchall() for s in SYMBOLS],
+    }
+
+
+def rows_of(result) -> int:
+    if isinstance(result, dict):
+        return len(next(iter(result.values())))
+    return len(result)
+
+
+def measure(path: Path, fn, runs: int):
+    best = float("inf")
+    for _ in range(runs):
+        conn = db.get_readonly_conn(path)  # fresh page cache per run
+        t0 = time.perf_counter()
+        out = fn(conn)
+        best = min(best, time.perf_counter() - t0)
+        conn.close()
+    return best, rows_of(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row vs compact storage layout")
+    parser.add_argument("--rows", type=int, default=300_000, help="Lignes coingecko / bybit / signals")
+    parser.add_argument("--liquidations", type=int, default=500_000, help="Liquidations générées")
+    parser.add_argument("--runs", type=int, default=3, help="Runs par lecture (meilleur run)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows_db, compact_db = Path(tmp) / "rows.db", Path(tmp) / "compact.db"
+        t0 = time.perf_counter()
+        end = fill(rows_db, args.rows, args.liquidations)
+        print(f"filled in {time.perf_counter() - t0:.1f}s")
+        shutil.copy(rows_db, compact_db)
+        conn = db.get_conn(compact_db)
+        t0 = time.perf_counter()
+        compact.compact(conn)
+        conn.execute("VACUUM")
+        conn.close()
+        print(f"compacted + VACUUM in {time.perf_counter() - t0:.1f}s\n")
+
+        before, after = table_bytes(rows_db), table_bytes(compact_db)
+        print(f"{'table':<22} {'row layout':>12} {'compact':>12} {'ratio':>7}")
+        for table in (*compact.TABLES, "dictionary"):
+            b, a = before.get(table, 0), after.get(table, 0)
+            print(f"{table:<22} {b / 1e6:>10.2f}MB {a / 1e6:>10.2f}MB {a / b if b else float('nan'):>7.2f}")
+        b, a = rows_db.stat().st_size, compact_db.stat().st_size
+        print(f"{'file':<22} {b / 1e6:>10.2f}MB {a / 1e6:>10.2f}MB {a / b:>7.2f}\n")
+
+        ok = True
+        print(f"{'scan':<18} {'rows':>8} {'row layout':>11} {'compact':>10} {'speedup':>8}")
+        for name, fn in scans(end).items():
+            tb, nb = measure(rows_db, fn, args.runs)
+            ta, na = measure(compact_db, fn, args.runs)
+            print(f"{name:<18} {nb:>8} {tb * 1e3:>9.1f}ms {ta * 1e3:>8.1f}ms {tb / ta:>7.2f}x")
+            if nb != na:
+                print(f"FAIL: {name} returned {nb} rows on the row layout, {na} on the compact one")
+                ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
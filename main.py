@@ -1,20 +1,38 @@
 #!/usr/bin/env python3
 """
 Main entrypoint for the pipeline.
-Runs all collectors, then generates report + CSV export.
+Runs all collectors, then generates report + CSV export; charts are rendered
+by a detached process (pipeline/charts.py) so the run never waits for them.
+
+Modes:
+- one-shot (default): python main.py
+- resident scheduler: python main.py --daemon  (see pipeline/scheduler.py); also
+  keeps the Bybit OI/funding history (bybit_oi_hist) up to date, hourly
+- several nodes: python main.py --daemon --coordinator redis://host:6379/0
+  (each collector / shard runs on one node at a time, see pipeline/leases.py)
+- --mempool-ws: mempool data comes from the streaming collector
+  (python -m pipeline.collectors.mempool_ws), the mempool REST polling is skipped
 """
 
+import argparse
 import logging
+import os
 import sqlite3
 from pathlib import Path
 
 # Import collectors explicit
-from pipeline.collectors import coingecko, defillama, sopr, bybit, mempool, altme
+from pipeline.collectors import coingecko, defillama, sopr, bybit, mempool, altme, bybit_oi_hist
 
 # Reporter + Exporter
-from pipeline import reporter, exporter
+from pipeline import reporter, exporter, schema
+from pipeline import metrics, profiling
+from pipeline.db import ConnectionManager
 
 DB_PATH = Path("data/crypto.db")
+METRICS_JSON = Path("exports/metrics_last_run.json")
+COLLECTORS = [coingecko, defillama, sopr, bybit, mempool, altme]
+# resident mode: + the paginated history (INTERVAL 1h, SHARDS jobs with --coordinator)
+DAEMON_COLLECTORS = COLLECTORS + [bybit_oi_hist]
 LOG = logging.getLogger("pipeline.main")
 logging.basicConfig(
     level=logging.INFO,
@@ -23,147 +41,92 @@ logging.basicConfig(
 
 
 def migrate(conn: sqlite3.Connection):
-    """Create all required tables (safe to run repeatedly)."""
-    def ensure_table(ddl: str, name: str):
-        cur = conn.cursor()
-        cur.execute(ddl)
-        conn.commit()
-        LOG.info("Ensured table: %s", name)
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS metrics (
-        ts INTEGER PRIMARY KEY,
-        sopr REAL,
-        stablecoins REAL,
-        mempool_tx_count INTEGER,
-        mempool_fee_fastest REAL,
-        fng INTEGER,
-        oi_btc REAL,
-        oi_eth REAL,
-        funding_btc REAL,
-        funding_eth REAL
-    )
-    """, "metrics")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS coingecko (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        price_usd REAL NOT NULL
-    )
-    """, "coingecko")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS bybit (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        funding REAL,
-        open_interest REAL
-    )
-    """, "bybit")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS sopr (
-        ts INTEGER PRIMARY KEY,
-        value REAL
-    )
-    """, "sopr")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS altme (
-        ts INTEGER PRIMARY KEY,
-        fng INTEGER
-    )
-    """, "altme")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS mempool (
-        ts INTEGER PRIMARY KEY,
-        tx_count INTEGER,
-        fee_fastest REAL,
-        fee_30m REAL
-    )
-    """, "mempool")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS stablecoins (
-        ts INTEGER PRIMARY KEY,
-        total REAL,
-        usdt REAL,
-        usdc REAL
-    )
-    """, "stablecoins")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS bybit_liquidations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        side TEXT NOT NULL,
-        price REAL,
-        qty REAL,
-        qty_usd REAL,
-        raw TEXT
-    )
-    """, "bybit_liquidations")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS bybit_liquidations_hourly (
-        hour_start INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        side TEXT NOT NULL,
-        total_qty_usd REAL NOT NULL DEFAULT 0,
-        events_count INTEGER NOT NULL DEFAULT 0,
-        PRIMARY KEY (hour_start, symbol, side)
-    )
-    """, "bybit_liquidations_hourly")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS meta (
-        key TEXT PRIMARY KEY,
-        value TEXT
-    )
-    """, "meta")
-
-    ensure_table("""
-    CREATE TABLE IF NOT EXISTS signals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts INTEGER NOT NULL,
-        name TEXT NOT NULL,
-        value REAL,
-        extra TEXT
-    )
-    """, "signals")
-
-    LOG.info("✅ Database migration completed at %s", DB_PATH)
+    """Bring the schema to the current version (one pragma read when already current)."""
+    version = schema.migrate(conn)
+    LOG.info("✅ Database schema v%d at %s", version, DB_PATH)
 
 
-def main():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+def run_daemon(workers: int, charts: bool = True, coordinator_url: str | None = None, node_id: str | None = None,
+               collectors=DAEMON_COLLECTORS):
+    """Resident mode: migrate once, then let the scheduler run each collector on its cadence."""
+    from pipeline.scheduler import Scheduler
+
+    with ConnectionManager(DB_PATH) as dbm:
+        migrate(dbm.writer)
+
+    coordinator = None
+    if coordinator_url:
+        from pipeline import leases
+        coordinator = leases.Coordinator(leases.from_url(coordinator_url), node_id=node_id)
+    Scheduler(collectors, db_path=DB_PATH, workers=workers, charts=charts, coordinator=coordinator).run()
 
-    migrate(conn)
+
+def main():
+    parser = argparse.ArgumentParser(description="Crypto pipeline")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Mode résident : chaque collecteur tourne à sa propre cadence")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Nombre de workers du scheduler (mode --daemon)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Expose les métriques Prometheus sur 127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-json", default=str(METRICS_JSON),
+                        help="Fichier JSON des métriques écrit en fin de run (vide = désactivé)")
+    parser.add_argument("--coordinator",
+                        help="Baux partagés entre nœuds (mode --daemon) : sqlite:///chemin ou redis://hôte:6379/0 "
+                             "(défaut $PIPELINE_LEASE_URL)")
+    parser.add_argument("--node-id", help="Identifiant du nœud (défaut hôte:pid)")
+    parser.add_argument("--no-charts", action="store_true",
+                        help="Ne pas rendre les graphiques (exports/charts)")
+    parser.add_argument("--mempool-ws", action="store_true",
+                        help="Mempool alimenté par le flux WS (pipeline.collectors.mempool_ws) : pas de polling REST")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.configure_from_args(args)
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    collectors = [c for c in (DAEMON_COLLECTORS if args.daemon else COLLECTORS)
+                  if not (args.mempool_ws and c is mempool)]
+
+    if args.daemon:
+        run_daemon(args.workers, charts=not args.no_charts,
+                   coordinator_url=args.coordinator or os.environ.get("PIPELINE_LEASE_URL"), node_id=args.node_id,
+                   collectors=collectors)
+        return
+    if args.coordinator:
+        parser.error("--coordinator requires --daemon")
+
+    dbm = ConnectionManager(DB_PATH)
+    conn = dbm.writer
+
+    with metrics.STAGE_SECONDS.time(stage="migrate"):
+        migrate(conn)
 
     LOG.info("Starting collectors…")
-    coingecko.collect(conn)
-    defillama.collect(conn)
-    sopr.collect(conn)
-    bybit.collect(conn)
-    mempool.collect(conn)
-    altme.collect(conn)
+    for collector in collectors:
+        name = collector.__name__.rsplit(".", 1)[-1]
+        before = conn.total_changes
+        with metrics.STAGE_SECONDS.time(stage=name), profiling.stage(f"collect.{name}"):
+            collector.collect(conn)
+        metrics.ROWS_WRITTEN.inc(conn.total_changes - before, source=name)
     LOG.info("✅ All collectors completed.")
 
     # Reporter
     LOG.info("📊 Generating report…")
-    reporter.run(conn)
+    with metrics.STAGE_SECONDS.time(stage="report"), profiling.stage("reporter.run"), dbm.reader() as rconn:
+        reporter.run(rconn)
 
     # Exporter
     LOG.info("💾 Exporting latest data to CSV…")
-    exporter.run(conn)
-
-    conn.close()
+    with metrics.STAGE_SECONDS.time(stage="export"), profiling.stage("exporter.run"), dbm.reader() as rconn:
+        exporter.run(rconn)
+
+    dbm.close()
+    if not args.no_charts:
+        from pipeline import charts
+        charts.spawn(DB_PATH)
+    if args.metrics_json:
+        metrics.REGISTRY.dump_json(args.metrics_json)
     LOG.info("🏁 Pipeline run complete.")
 
 
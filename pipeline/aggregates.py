@@ -0,0 +1,239 @@
+"""
+pipeline/aggregates.py
+In-memory multi-resolution liquidation aggregates (count, notional, qty → VWAP).
+
+    agg = LiquidationAggregator()
+    agg.add(ts, "BTCUSDT", "SELL", price, qty)         # hot path: a few array updates
+    agg.stats("BTCUSDT", seconds=10)                    # {"count", "notional", "qty", "vwap"}
+    agg.buckets("BTCUSDT", resolution=60, last=30)      # [(start, count, notional, qty, vwap), ...]
+    rows = agg.drain(); agg.write(conn, rows)           # closed buckets → SQLite, one upsert per bucket
+
+- one ring buffer per (symbol, side) and resolution (RESOLUTIONS: 1s, 1m, 5m, 1h), backed
+  by array('q') / array('d') columns: a slot is recycled when its bucket falls out of the
+  horizon, so memory is fixed per series
+- VWAP = notional / qty (notional = price * qty summed over the bucket)
+- PERSISTED resolutions (1m → bybit_liquidations_minute, 1h → bybit_liquidations_hourly)
+  accumulate deltas; persist() writes closed buckets, and the open ones at most every
+  `checkpoint` seconds (the current hour stays fresh in reports). Rows are additive
+  upserts: a restart mid-bucket adds to what is already stored.
+- rebuild(conn, since): rollup rows from `since` recomputed from the stored events, for
+  the deltas a crash left unwritten (the writer calls it at startup, unless another
+  writer is live on the database: its own pending deltas would be counted twice)
+Not thread-safe: owned by the writer (one asyncio loop).
+"""
+
+import logging
+import time
+from array import array
+
+LOG = logging.getLogger("pipeline.aggregates")
+
+# resolution (seconds) → slots kept in memory
+RESOLUTIONS = {1: 300, 60: 180, 300: 288, 3600: 168}
+# resolution → (table, bucket column)
+PERSISTED = {
+    60: ("bybit_liquidations_minute", "minute_start"),
+    3600: ("bybit_liquidations_hourly", "hour_start"),
+}
+CHECKPOINT = 60
+
+
+class Ring:
+    """Fixed-size ring of time buckets: start, count, notional, qty per slot."""
+
+    __slots__ = ("res", "size", "start", "count", "notional", "qty")
+
+    def __init__(self, res: int, size: int):
+        self.res = res
+        self.size = size
+        self.start = array("q", [-1]) * size
+        self.count = array("q", [0]) * size
+        self.notional = array("d", [0.0]) * size
+        self.qty = array("d", [0.0]) * size
+
+    def add(self, ts: int, notional: float, qty: float, n: int = 1) -> bool:
+        b = ts - ts % self.res
+        i = (b // self.res) % self.size
+        start = self.start[i]
+        if start != b:
+            if start > b or n < 0:  # older than the horizon of this ring / nothing to take back
+                return False
+            self.start[i] = b
+            self.count[i] = 0
+            self.notional[i] = 0.0
+            self.qty[i] = 0.0
+        self.count[i] += n
+        self.notional[i] += notional
+        self.qty[i] += qty
+        return True
+
+    def buckets(self, last: int, now: int):
+        """(start, count, notional, qty) of the `last` buckets up to now, oldest first (empty ones skipped)."""
+        res = self.res
+        cur = now - now % res
+        out = []
+        for k in range(min(last, self.size) - 1, -1, -1):
+            b = cur - k * res
+            i = (b // res) % self.size
+            if self.start[i] == b:
+                out.append((b, self.count[i], self.notional[i], self.qty[i]))
+        return out
+
+
+class LiquidationAggregator:
+    def __init__(self, resolutions: dict = RESOLUTIONS, persisted: dict = PERSISTED,
+                 checkpoint: float = CHECKPOINT):
+        self.resolutions = tuple(sorted(resolutions.items()))
+        self.persisted = {res: persisted[res] for res, _ in self.resolutions if res in persisted}
+        self.checkpoint = checkpoint
+        self._series = {}   # (symbol, side) → tuple of Ring, in self.resolutions order
+        self._pending = {}  # (res, bucket, symbol, side) → [count, notional, qty]
+        self._last_checkpoint = time.time()
+
+    # -----------------------------------------------------
+    # HOT PATH
+    # -----------------------------------------------------
+    def add(self, ts: int, symbol: str, side: str, price: float, qty: float, persist: bool = True):
+        """One event; persist=False: in-memory windows only (add_pending() once it is stored)."""
+        key = (symbol, side)
+        rings = self._series.get(key)
+        if rings is None:
+            rings = self._series[key] = tuple(Ring(res, size) for res, size in self.resolutions)
+        notional = price * qty
+        for ring in rings:
+            ring.add(ts, notional, qty)
+        if persist:
+            self.add_pending(ts, symbol, side, notional, qty)
+
+    def add_pending(self, ts: int, symbol: str, side: str, notional: float, qty: float, n: int = 1):
+        """Count an event in the persisted rollups only (n=-1 takes it back)."""
+        pending = self._pending
+        for res in self.persisted:
+            k = (res, ts - ts % res, symbol, side)
+            p = pending.get(k)
+            if p is None:
+                pending[k] = [n, notional * n, qty * n]
+            else:
+                p[0] += n
+                p[1] += notional * n
+                p[2] += qty * n
+
+    def remove(self, ts: int, symbol: str, side: str, price: float, qty: float):
+        """Take an event back out of the in-memory windows (found to be a duplicate)."""
+        for ring in self._series.get((symbol, side), ()):
+            ring.add(ts, -price * qty, -qty, -1)
+
+    # -----------------------------------------------------
+    # READS (no DB)
+    # -----------------------------------------------------
+    def _rings(self, symbol: str, side: str | None, resolution: int):
+        idx = [res for res, _ in self.resolutions].index(resolution)
+        return [rings[idx] for (sym, sd), rings in self._series.items()
+                if sym == symbol and (side is None or sd == side)]
+
+    def buckets(self, symbol: str, side: str | None = None, resolution: int = 1, last: int = 60,
+                now: float | None = None) -> list:
+        """Last `last` buckets of one resolution, both sides summed when side is None."""
+        now = int(now if now is not None else time.time())
+        merged = {}
+        for ring in self._rings(symbol, side, resolution):
+            for b, n, notional, qty in ring.buckets(last, now):
+                m = merged.setdefault(b, [0, 0.0, 0.0])
+                m[0] += n
+                m[1] += notional
+                m[2] += qty
+        return [(b, n, notional, qty, notional / qty if qty else None)
+                for b, (n, notional, qty) in sorted(merged.items())]
+
+    def stats(self, symbol: str, seconds: int = 60, side: str | None = None,
+              now: float | None = None) -> dict:
+        """Totals over the last `seconds` (finest resolution whose horizon covers them)."""
+        for res, size in self.resolutions:
+            if res * size >= seconds:
+                break
+        count, notional, qty = 0, 0.0, 0.0
+        for _, n, bn, bq, _ in self.buckets(symbol, side, res, -(-seconds // res), now):
+            count += n
+            notional += bn
+            qty += bq
+        return {"count": count, "notional": notional, "qty": qty,
+                "vwap": notional / qty if qty else None}
+
+    def symbols(self) -> list:
+        return sorted({sym for sym, _ in self._series})
+
+    # -----------------------------------------------------
+    # PERSISTENCE
+    # -----------------------------------------------------
+    def drain(self, now: float | None = None, force: bool = False) -> dict:
+        """
+        Pending deltas due for writing → {res: [(bucket, symbol, side, notional, qty, count)]}.
+        Closed buckets always; open ones when force or the checkpoint period has elapsed.
+        """
+        now = now if now is not None else time.time()
+        partial = force or now - self._last_checkpoint >= self.checkpoint
+        if partial:
+            self._last_checkpoint = now
+        out = {}
+        for k in list(self._pending):
+            res, b, symbol, side = k
+            if partial or b + res <= now:
+                n, notional, qty = self._pending.pop(k)
+                if n:
+                    out.setdefault(res, []).append((b, symbol, side, notional, qty, n))
+        return out
+
+    def restore(self, rows: dict):
+        """Put drained deltas back (the write that should have persisted them failed)."""
+        for res, items in rows.items():
+            for b, symbol, side, notional, qty, n in items:
+                p = self._pending.setdefault((res, b, symbol, side), [0, 0.0, 0.0])
+                p[0] += n
+                p[1] += notional
+                p[2] += qty
+
+    def write(self, conn, rows: dict) -> int:
+        """Additive upserts of drained deltas (the caller commits). Returns the rows written."""
+        for res, items in rows.items():
+            table, col = self.persisted[res]
+            conn.executemany(f"""
+            INSERT INTO {table} ({col}, symbol, side, total_qty_usd, total_qty, events_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT({col}, symbol, side)
+            DO UPDATE SET
+                total_qty_usd = total_qty_usd + excluded.total_qty_usd,
+                total_qty = total_qty + excluded.total_qty,
+                events_count = events_count + excluded.events_count
+            """, items)
+        return sum(len(items) for items in rows.values())
+
+    def rebuild(self, conn, since: int, source: str = "bybit_liquidations") -> int:
+        """
+        Replace the persisted rows from bucket `since` on with totals recomputed from the
+        events in `source` (the caller commits); pending deltas of those buckets are dropped.
+        """
+        written = 0
+        for res, (table, col) in self.persisted.items():
+            start = since - since % res
+            conn.execute(f"DELETE FROM {table} WHERE {col} >= ?", (start,))
+            cur = conn.execute(f"""
+            INSERT INTO {table} ({col}, symbol, side, total_qty_usd, total_qty, events_count)
+            SELECT ts - ts % {res}, symbol, side, SUM(qty_usd), SUM(qty), COUNT(*)
+            FROM {source} WHERE ts >= ? GROUP BY 1, 2, 3
+            """, (start,))
+            written += cur.rowcount
+            for k in [k for k in self._pending if k[0] == res and k[1] >= start]:
+                del self._pending[k]
+        return written
+
+    def persist(self, conn, now: float | None = None, force: bool = False) -> int:
+        """drain() + write() + commit; deltas are restored if anything fails."""
+        rows = self.drain(now, force)
+        try:
+            n = self.write(conn, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self.restore(rows)
+            raise
+        return n
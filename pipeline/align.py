@@ -0,0 +1,212 @@
+"""
+pipeline/align.py
+As-of alignment of sparse series on a regular time grid, at query time (no pandas).
+
+    from pipeline import align
+    frame = align.align(["btc=coingecko.price_usd@bitcoin", "sopr.value~2d", "altme.fng",
+                         "liq=bybit_liquidations.qty_usd@BTCUSDT:sum"], start, end, step=3600)
+    frame["ts"], frame["btc"], frame["sopr.value"], ...     # numpy arrays, one per series
+
+Series spec: [name=]table.column[@symbol][:agg][~max_age]
+(symbol = the table's symbol column, signal name for `signals`; max_age in seconds
+or with an s/m/h/d suffix; name defaults to the spec without its max_age).
+
+- grid: ts_i = start + i * step for ts_i < end; point i closes the interval (ts_i - step, ts_i]
+- agg "last" (default): value of the latest non-NULL row with ts <= ts_i (as-of join,
+  forward fill), NaN / None when there is none or it is older than max_age seconds
+- agg sum|count|mean|min|max: aggregate of the rows in the interval, not filled
+  (sum/count 0, the others NaN when the interval is empty)
+- one SQL scan per series grouped by grid interval in SQLite (at most one row per grid
+  point, + one row before start for "last"), then np.searchsorted onto the grid:
+  memory is linear in the output size, whatever the density of the source
+
+numpy/pyarrow are imported on first call.
+"""
+
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+
+from pipeline import db
+from pipeline.query import TABLES, _fetch_columns, _table_kinds
+
+LOG = logging.getLogger("pipeline.align")
+
+AGGREGATES = {"last": None, "sum": "sum", "count": "count", "mean": "avg", "min": "min", "max": "max"}
+
+_SPEC = re.compile(r"^(?:(?P<name>[^=]+)=)?(?P<table>\w+)\.(?P<column>\w+)"
+                   r"(?:@(?P<symbol>[^:~]+))?(?::(?P<agg>\w+))?(?:~(?P<max_age>\w+))?$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@dataclass(frozen=True)
+class Series:
+    table: str
+    column: str
+    symbol: str | None = None
+    agg: str = "last"
+    max_age: int | None = None  # seconds; None → the max_age given to align()
+    name: str | None = None
+
+    @property
+    def label(self) -> str:
+        if self.name:
+            return self.name
+        label = f"{self.table}.{self.column}"
+        if self.symbol is not None:
+            label += f"@{self.symbol}"
+        if self.agg != "last":
+            label += f":{self.agg}"
+        return label
+
+
+def seconds(value) -> int | None:
+    """"90", 90, "15m", "6h", "2d" → seconds (None stays None)."""
+    if value is None or isinstance(value, int):
+        return value
+    m = re.fullmatch(r"(\d+)([smhd]?)", str(value).strip())
+    if not m:
+        raise ValueError(f"invalid duration {value!r} (seconds or a number with s/m/h/d)")
+    return int(m.group(1)) * _UNITS.get(m.group(2) or "s")
+
+
+def parse(spec: str) -> Series:
+    """"[name=]table.column[@symbol][:agg][~max_age]" → Series (checked against TABLES)."""
+    m = _SPEC.match(spec.strip())
+    if not m:
+        raise ValueError(f"invalid series {spec!r}: [name=]table.column[@symbol][:agg][~max_age]")
+    series = Series(m["table"], m["column"], m["symbol"], m["agg"] or "last", seconds(m["max_age"]), m["name"])
+    _check(series)
+    return series
+
+
+def _check(series: Series):
+    if series.table not in TABLES:
+        raise ValueError(f"unknown table {series.table}")
+    if series.agg not in AGGREGATES:
+        raise ValueError(f"agg must be one of {', '.join(AGGREGATES)}")
+    if series.symbol is not None and TABLES[series.table][1] is None:
+        raise ValueError(f"{series.table} has no symbol column")
+
+
+def grid(start: int, end: int, step: int):
+    """ts_i = start + i * step, ts_i < end (int64)."""
+    import numpy as np
+
+    step = int(step)
+    if step <= 0:
+        raise ValueError("step must be a positive number of seconds")
+    return np.arange(int(start), int(end), step, dtype=np.int64)
+
+
+# -----------------------------------------------------
+# ONE SERIES → ONE COLUMN OF THE GRID
+# -----------------------------------------------------
+def _column(conn: sqlite3.Connection, series: Series, ts, step: int, max_age: int | None):
+    import numpy as np
+
+    n = len(ts)
+    ts_col, sym_col = TABLES[series.table]
+    kinds = _table_kinds(conn, series.table)
+    if series.column not in kinds:
+        raise ValueError(f"unknown column {series.column} for {series.table}")
+    kind = kinds[series.column]
+    if kind == "text" and series.agg not in ("last", "count"):
+        raise ValueError(f"cannot aggregate text column {series.column} with {series.agg}")
+
+    g0, last = int(ts[0]), int(ts[-1])
+    where = f"{series.column} IS NOT NULL"
+    params = []
+    if series.symbol is not None:
+        where += f" AND {sym_col} = ?"
+        params.append(series.symbol)
+    # grid index of a row: ts in (ts_i - step, ts_i] → i (offset by one so that
+    # SQLite's truncating division never sees a negative numerator)
+    k = f"({ts_col} - {g0 - step} + {step - 1}) / {step} - 1"
+
+    if series.agg != "last":
+        fn = AGGREGATES[series.agg]
+        sql = (f"SELECT {k} AS k, {fn}({series.column}) FROM {series.table} "
+               f"WHERE {ts_col} > ? AND {ts_col} <= ? AND {where} GROUP BY 1 ORDER BY 1")
+        rows = _fetch_columns(conn.execute(sql, [g0 - step, last] + params),
+                              [("k", "int"), ("v", "int" if series.agg == "count" else "float")])
+        if series.agg == "count":
+            out = np.zeros(n, dtype=np.int64)
+        else:
+            out = np.full(n, 0.0 if series.agg == "sum" else np.nan)
+        out[rows["k"].astype(np.int64)] = rows["v"]
+        return out
+
+    # as-of: the latest row at or before the first grid point, then the latest row per interval
+    # (SQLite: with a single max() aggregate, the bare column comes from that row)
+    out_kinds = [("k", "int"), ("t", "int"), ("v", kind)]
+    prior = _fetch_columns(conn.execute(
+        f"SELECT 0, {ts_col}, {series.column} FROM {series.table} WHERE {ts_col} <= ? AND {where} "
+        f"ORDER BY {ts_col} DESC LIMIT 1", [g0] + params), out_kinds)
+    rows = _fetch_columns(conn.execute(
+        f"SELECT {k} AS k, max({ts_col}), {series.column} FROM {series.table} "
+        f"WHERE {ts_col} > ? AND {ts_col} <= ? AND {where} GROUP BY 1 ORDER BY 1", [g0, last] + params), out_kinds)
+    keys = np.concatenate([prior["k"], rows["k"]]).astype(np.int64)
+    stamps = np.concatenate([prior["t"], rows["t"]]).astype(np.int64)
+    values = np.concatenate([prior["v"], rows["v"]])
+
+    j = np.searchsorted(keys, np.arange(n), side="right") - 1
+    missing = j < 0
+    j[missing] = 0
+    if max_age is not None and len(stamps):
+        missing |= ts - stamps[j] > max_age
+    if kind == "text":
+        out = values[j] if len(values) else np.full(n, None, dtype=object)
+        out[missing] = None
+        return out
+    out = values[j].astype(np.float64) if len(values) else np.full(n, np.nan)
+    out[missing] = np.nan
+    return out
+
+
+def align(series, start: int, end: int, step: int, max_age=None, output: str = "numpy",
+          conn: sqlite3.Connection | None = None, db_path: str | Path = db.DB_PATH):
+    """
+    Series (specs or Series) sampled on the grid start, start + step, ... < end.
+
+    max_age: default staleness limit of "last" series (seconds or "6h"...; None = no limit)
+    output: "numpy" → {"ts": ndarray, label: ndarray, ...}, "arrow" → pyarrow.Table
+    conn: connection to use (default: a read-only connection on db_path, closed afterwards)
+    """
+    if output not in ("numpy", "arrow"):
+        raise ValueError("output must be numpy or arrow")
+    specs = []
+    for s in series:
+        if isinstance(s, Series):
+            _check(s)
+        specs.append(parse(s) if isinstance(s, str) else s)
+    labels = [s.label for s in specs]
+    if len(set(labels)) != len(labels) or "ts" in labels:
+        raise ValueError("series names must be unique (and not ts)")
+    default_age = seconds(max_age)
+    ts = grid(start, end, step)
+
+    cols = {"ts": ts}
+    if len(ts):
+        own_conn = conn is None
+        if own_conn:
+            conn = db.get_readonly_conn(db_path)
+        try:
+            for s in specs:
+                age = s.max_age if s.max_age is not None else default_age
+                cols[s.label] = _column(conn, s, ts, int(step), age)
+        finally:
+            if own_conn:
+                conn.close()
+    else:
+        import numpy as np
+        cols.update((label, np.empty(0)) for label in labels)
+    LOG.debug("align %d series on %d points (step %s)", len(specs), len(ts), step)
+
+    if output == "arrow":
+        import pyarrow as pa
+        # from_pandas: NaN → null
+        return pa.table({name: pa.array(col, from_pandas=True) for name, col in cols.items()})
+    return cols
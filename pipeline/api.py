@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+pipeline/api.py
+Local read-only HTTP API over data/crypto.db (aiohttp).
+
+Endpoints:
+- GET /health
+- GET /latest/{table}[?symbol=]                 latest row (per symbol for symbol tables)
+- GET /range/{table}?start=&end=[&symbol=&limit=&format=json|ndjson|arrow]
+- GET /liquidations/hourly?start=&end=[&symbol=&side=&bucket=]
+  (bybit_liquidations_hourly summed by bucket/symbol/side; bucket multiple of 3600)
+- GET /align?series=spec,spec&start=&end=&step=[&max_age=&format=json|arrow]
+  (series as-of aligned on a regular grid, see pipeline/align.py; at most ALIGN_MAX_POINTS)
+
+- Queries run in a thread pool on a pool of read-only (mode=ro) connections,
+  so they never block the WAL writers; a request waits for a free connection on the
+  event loop (semaphore sized to the pool), never on a worker thread, so streams
+  holding every connection can still fetch their next chunk
+- Every response carries an ETag derived from the request + the table watermark;
+  If-None-Match → 304 without touching the data
+- json responses are cached (LRU) per request and watermark; ndjson/arrow are
+  streamed in chunks and never buffered whole
+
+Usage: python -m pipeline.api --db data/crypto.db --port 8088
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from pipeline import align, compact, db
+from pipeline.query import TABLES, _arrow_type, _table_kinds, watermark_sql
+
+LOG = logging.getLogger("pipeline.api")
+
+DEFAULT_LIMIT = 10_000
+CHUNK_ROWS = 5_000
+CACHE_ENTRIES = 256
+ALIGN_MAX_POINTS = 100_000
+
+
+class _ByteSink(io.RawIOBase):
+    """Collects what the Arrow IPC writer emits so each batch can be sent as it is written."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        return out
+
+
+class QueryAPI:
+    def __init__(self, db_path=db.DB_PATH, pool_size: int = 4):
+        self.pool = db.ReadPool(db_path, size=pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="api-read")
+        # one slot per pooled connection, taken before any executor call that checks one out
+        self._slots = asyncio.Semaphore(pool_size)
+        self._cache: OrderedDict = OrderedDict()
+        self._compact = None  # compact layout (pipeline/compact.py), checked on first use
+
+    # -----------------------------------------------------
+    # DB ACCESS (worker threads)
+    # -----------------------------------------------------
+    def _query(self, sql: str, params=()):
+        with self.pool.connection() as conn:
+            cur = conn.execute(sql, params)
+            return [d[0] for d in cur.description], cur.fetchall()
+
+    def _is_compact(self) -> bool:
+        with self.pool.connection() as conn:
+            return compact.is_compact(conn)
+
+    async def run(self, func, *args):
+        """func(*args) on a worker thread, once a pooled connection is free for it."""
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def query(self, sql: str, params=()):
+        return await self.run(self._query, sql, params)
+
+    async def watermark(self, table: str) -> str:
+        """Cheap change marker for a table (query.watermark_sql)."""
+        if self._compact is None:
+            self._compact = await self.run(self._is_compact)
+        _, rows = await self.query(watermark_sql(table, self._compact))
+        return ":".join(str(v) for v in rows[0])
+
+    # -----------------------------------------------------
+    # CACHE / ETAG
+    # -----------------------------------------------------
+    @staticmethod
+    def _etag(request: web.Request, watermark: str) -> str:
+        key = f"{request.path}?{sorted(request.query.items())}|{watermark}"
+        return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+    def _cache_get(self, etag: str):
+        hit = self._cache.get(etag)
+        if hit is not None:
+            self._cache.move_to_end(etag)
+        return hit
+
+    def _cache_put(self, etag: str, body: bytes):
+        self._cache[etag] = body
+        if len(self._cache) > CACHE_ENTRIES:
+            self._cache.popitem(last=False)
+
+    async def _json_cached(self, request: web.Request, table: str, build, watermark: str | None = None):
+        """build() → JSON-serialisable payload; cached per (request, table watermark)."""
+        if watermark is None:
+            watermark = await self.watermark(table)
+        etag = self._etag(request, watermark)
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        body = self._cache_get(etag)
+        if body is None:
+            body = json.dumps(await build(), separators=(",", ":")).encode()
+            self._cache_put(etag, body)
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    # -----------------------------------------------------
+    # HANDLERS
+    # -----------------------------------------------------
+    @staticmethod
+    def _table(request: web.Request) -> str:
+        table = request.match_info["table"]
+        if table not in TABLES:
+            raise web.HTTPNotFound(text=f"unknown table {table}")
+        return table
+
+    @staticmethod
+    def _int(request: web.Request, name: str, default=None):
+        raw = request.query.get(name)
+        if raw is None:
+            return default
+        try:
+            return int(raw)
+        except ValueError:
+            raise web.HTTPBadRequest(text=f"{name} must be an integer")
+
+    async def health(self, request: web.Request):
+        return web.json_response({"status": "ok"})
+
+    async def latest(self, request: web.Request):
+        table = self._table(request)
+        ts_col, sym_col = TABLES[table]
+        symbol = request.query.get("symbol")
+
+        async def build():
+            if sym_col is None:
+                cols, rows = await self.query(f"SELECT * FROM {table} ORDER BY {ts_col} DESC LIMIT 1")
+            elif symbol:
+                cols, rows = await self.query(
+                    f"SELECT * FROM {table} WHERE {sym_col}=? ORDER BY {ts_col} DESC LIMIT 1", (symbol,))
+            else:
+                cols, rows = await self.query(
+                    f"SELECT * FROM {table} WHERE {ts_col} = (SELECT MAX({ts_col}) FROM {table})")
+            return [dict(zip(cols, r)) for r in rows]
+
+        return await self._json_cached(request, table, build)
+
+    def _range_sql(self, request: web.Request, table: str):
+        ts_col, sym_col = TABLES[table]
+        start = self._int(request, "start", 0)
+        end = self._int(request, "end", 2**62)
+        limit = self._int(request, "limit", DEFAULT_LIMIT)
+        where, params = [f"{ts_col} >= ?", f"{ts_col} < ?"], [start, end]
+        symbol = request.query.get("symbol")
+        if symbol and sym_col:
+            where.append(f"{sym_col} = ?")
+            params.append(symbol)
+        sql = f"SELECT * FROM {table} WHERE {' AND '.join(where)} ORDER BY {ts_col}"
+        if limit > 0:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    async def range(self, request: web.Request):
+        table = self._table(request)
+        sql, params = self._range_sql(request, table)
+        fmt = request.query.get("format", "json")
+
+        if fmt == "json":
+            async def build():
+                cols, rows = await self.query(sql, params)
+                return {"columns": cols, "rows": rows}
+            return await self._json_cached(request, table, build)
+        if fmt not in ("ndjson", "arrow"):
+            raise web.HTTPBadRequest(text="format must be json, ndjson or arrow")
+
+        etag = self._etag(request, await self.watermark(table))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return await self._stream(request, table, sql, params, fmt, etag)
+
+    async def _stream(self, request: web.Request, table: str, sql: str, params, fmt: str, etag: str):
+        """Stream CHUNK_ROWS rows at a time; one pooled connection held for the whole response."""
+        ctype = "application/x-ndjson" if fmt == "ndjson" else "application/vnd.apache.arrow.stream"
+        resp = web.StreamResponse(headers={"Content-Type": ctype, "ETag": etag})
+        await resp.prepare(request)
+
+        # the slot guarantees a free connection: acquire() does not block a worker thread
+        async with self._slots:
+            conn = self.pool.acquire()
+            try:
+                await self._stream_rows(resp, conn, table, sql, params, fmt)
+            finally:
+                self.pool.release(conn)
+        await resp.write_eof()
+        return resp
+
+    async def _stream_rows(self, resp: web.StreamResponse, conn, table: str, sql: str, params, fmt: str):
+        loop = asyncio.get_running_loop()
+        cur = await loop.run_in_executor(self.executor, conn.execute, sql, params)
+        cols = [d[0] for d in cur.description]
+        if fmt == "arrow":
+            import pyarrow as pa
+            # declared column types: a column null in the first chunk keeps its type in the next ones
+            kinds = await loop.run_in_executor(self.executor, _table_kinds, conn, table)
+            schema = pa.schema([(c, _arrow_type(kinds.get(c, "text"))) for c in cols])
+            sink = _ByteSink()
+            writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+        while True:
+            rows = await loop.run_in_executor(self.executor, cur.fetchmany, CHUNK_ROWS)
+            if fmt == "ndjson":
+                if not rows:
+                    break
+                await resp.write("".join(
+                    json.dumps(dict(zip(cols, r)), separators=(",", ":")) + "\n" for r in rows
+                ).encode())
+                continue
+            if not rows:
+                writer.close()
+                await resp.write(sink.drain())
+                break
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array([r[i] for r in rows], type=f.type) for i, f in enumerate(schema)], schema=schema))
+            await resp.write(sink.drain())
+        cur.close()
+
+    async def liquidations_hourly(self, request: web.Request):
+        table = "bybit_liquidations_hourly"
+        start = self._int(request, "start", 0)
+        end = self._int(request, "end", 2**62)
+        bucket = self._int(request, "bucket", 3600)
+        if bucket <= 0 or bucket % 3600:
+            raise web.HTTPBadRequest(text="bucket must be a positive multiple of 3600")
+        where, params = ["hour_start >= ?", "hour_start < ?"], [start, end]
+        for col in ("symbol", "side"):
+            if request.query.get(col):
+                where.append(f"{col} = ?")
+                params.append(request.query[col].upper())
+        sql = (
+            f"SELECT hour_start / {bucket} * {bucket} AS bucket, symbol, side, "
+            "SUM(total_qty_usd) AS total_qty_usd, SUM(events_count) AS events_count "
+            f"FROM {table} WHERE {' AND '.join(where)} "
+            "GROUP BY bucket, symbol, side ORDER BY bucket, symbol, side"
+        )
+
+        async def build():
+            cols, rows = await self.query(sql, params)
+            return {"columns": cols, "rows": rows}
+
+        return await self._json_cached(request, table, build)
+
+    def _align(self, specs, start: int, end: int, step: int, max_age):
+        with self.pool.connection() as conn:
+            return align.align(specs, start, end, step, max_age, conn=conn)
+
+    async def align(self, request: web.Request):
+        start, end, step = (self._int(request, k) for k in ("start", "end", "step"))
+        if None in (start, end, step):
+            raise web.HTTPBadRequest(text="start, end and step are required")
+        fmt = request.query.get("format", "json")
+        if fmt not in ("json", "arrow"):
+            raise web.HTTPBadRequest(text="format must be json or arrow")
+        try:
+            specs = [align.parse(s) for s in request.query.get("series", "").split(",") if s]
+            max_age = align.seconds(request.query.get("max_age"))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        if not specs or step <= 0:
+            raise web.HTTPBadRequest(text="series and a positive step are required")
+        if -(-(end - start) // step) > ALIGN_MAX_POINTS:
+            raise web.HTTPBadRequest(text=f"grid larger than {ALIGN_MAX_POINTS} points")
+
+        tables = sorted({s.table for s in specs})
+        watermark = "|".join([await self.watermark(t) for t in tables])
+
+        async def frame():
+            try:
+                return await self.run(self._align, specs, start, end, step, max_age)
+            except ValueError as e:
+                raise web.HTTPBadRequest(text=str(e))
+
+        if fmt == "json":
+            async def build():
+                cols = await frame()
+                names = list(cols)
+                # NaN is not JSON: null, as in the database
+                data = [[None if v != v else v for v in cols[n].tolist()] for n in names]
+                return {"columns": names, "rows": [list(r) for r in zip(*data)]}
+            return await self._json_cached(request, ",".join(tables), build, watermark)
+
+        etag = self._etag(request, watermark)
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        body = self._cache_get(etag)
+        if body is None:
+            import pyarrow as pa
+            cols = await frame()
+            tbl = pa.table({n: pa.array(c, from_pandas=True) for n, c in cols.items()})
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, tbl.schema) as writer:
+                writer.write_table(tbl)
+            body = sink.getvalue().to_pybytes()
+            self._cache_put(etag, body)
+        return web.Response(body=body, content_type="application/vnd.apache.arrow.stream",
+                            headers={"ETag": etag})
+
+    # -----------------------------------------------------
+    # APP
+    # -----------------------------------------------------
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get("/health", self.health),
+            web.get("/latest/{table}", self.latest),
+            web.get("/range/{table}", self.range),
+            web.get("/liquidations/hourly", self.liquidations_hourly),
+            web.get("/align", self.align),
+        ])
+        app.on_cleanup.append(self._cleanup)
+        return app
+
+    async def _cleanup(self, app):
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local read-only query API")
+    parser.add_argument("--db", default=str(db.DB_PATH), help="Fichier SQLite")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--pool-size", type=int, default=4, help="Connexions read-only")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    web.run_app(QueryAPI(args.db, args.pool_size).app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+pipeline/cascades.py
+Streaming liquidation cascade detector (plugged into BybitWSService._handle_message).
+
+    det = CascadeDetector(sinks=[LogSink(), QueueSink(q)])
+    det.observe("BTCUSDT", "SELL", ts_ms, price, qty, received=time.perf_counter())
+
+- per symbol: rolling `window`-second notional and event count (ring of per-second
+  slots), and an EWMA baseline (mean / variance) of both, fed once per elapsed second
+- alert when the rolling notional or count is `z` standard deviations above its
+  baseline (after `warmup` seconds of history), the notional is >= min_notional,
+  and the symbol's last alert is older than `cooldown` seconds
+- sinks receive the alert dict through emit(), which must not block: LogSink logs,
+  QueueSink put_nowait()s (drops when full), WebhookSink hands it to its own thread
+- alert latency = frame receipt → alert handed to the sinks (pipeline_cascade_alert_latency_seconds);
+  detection runs before the writer, a flush never delays an alert
+"""
+
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from array import array
+
+from pipeline.metrics import REGISTRY
+
+LOG = logging.getLogger("pipeline.cascades")
+
+CASCADE_ALERTS = REGISTRY.counter("pipeline_cascade_alerts_total", "Liquidation cascade alerts", ("symbol",))
+CASCADE_LATENCY = REGISTRY.histogram(
+    "pipeline_cascade_alert_latency_seconds", "Frame receipt → alert dispatched",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1),
+)
+SINK_DROPPED = REGISTRY.counter("pipeline_cascade_sink_dropped_total", "Alerts dropped by a full sink", ("sink",))
+
+WINDOW = 10          # rolling window (seconds)
+BASELINE = 900       # EWMA span of the baseline (seconds)
+WARMUP = 120         # seconds of history before alerting
+Z = 4.0
+MIN_NOTIONAL = 250_000.0
+COOLDOWN = 60
+# longest gap (seconds without events) replayed into the baseline; beyond it, it just stops decaying
+_MAX_ROLL = 3600
+
+
+class _SymbolState:
+    __slots__ = ("sec", "slot_n", "slot_usd", "win_n", "win_usd",
+                 "mean_n", "var_n", "mean_usd", "var_usd", "seen", "last_alert")
+
+    def __init__(self, sec: int, window: int):
+        self.sec = sec
+        self.slot_n = array("q", [0]) * window
+        self.slot_usd = array("d", [0.0]) * window
+        self.win_n = 0
+        self.win_usd = 0.0
+        self.mean_n = self.var_n = self.mean_usd = self.var_usd = 0.0
+        self.seen = 0
+        self.last_alert = -(1 << 62)
+
+
+class CascadeDetector:
+    def __init__(self, window: int = WINDOW, baseline: int = BASELINE, warmup: int = WARMUP,
+                 z: float = Z, min_notional: float = MIN_NOTIONAL, cooldown: int = COOLDOWN, sinks=()):
+        self.window = int(window)
+        self.alpha = 2.0 / (baseline + 1)
+        self.warmup = warmup
+        self.z = z
+        self.min_notional = min_notional
+        self.cooldown = cooldown
+        self.sinks = list(sinks)
+        self._symbols = {}
+
+    # -----------------------------------------------------
+    # ROLLING STATE
+    # -----------------------------------------------------
+    def _roll(self, st: _SymbolState, sec: int):
+        """Advance st to second `sec`: one baseline update per elapsed second, expire old slots."""
+        a = self.alpha
+        gap = sec - st.sec
+        for k in range(min(gap, _MAX_ROLL)):
+            # EWMA of the window totals (West 1979 incremental variance)
+            d = st.win_usd - st.mean_usd
+            st.mean_usd += a * d
+            st.var_usd = (1 - a) * (st.var_usd + a * d * d)
+            d = st.win_n - st.mean_n
+            st.mean_n += a * d
+            st.var_n = (1 - a) * (st.var_n + a * d * d)
+            st.seen += 1
+
+            i = (st.sec + k + 1) % self.window
+            st.win_n -= st.slot_n[i]
+            st.win_usd -= st.slot_usd[i]
+            st.slot_n[i] = 0
+            st.slot_usd[i] = 0.0
+        if st.win_n == 0:
+            st.win_usd = 0.0  # no float drift once the window is empty
+        st.sec = sec
+
+    def observe(self, symbol: str, side: str, ts_ms: int, price: float, qty: float,
+                received: float | None = None) -> dict | None:
+        """One liquidation event; returns the alert dict when it fires one."""
+        sec = int(ts_ms) // 1000
+        st = self._symbols.get(symbol)
+        if st is None:
+            st = self._symbols[symbol] = _SymbolState(sec, self.window)
+        if sec > st.sec:
+            self._roll(st, sec)
+        elif sec <= st.sec - self.window:
+            return None  # late event, already out of the window
+
+        usd = price * qty
+        i = sec % self.window
+        st.slot_n[i] += 1
+        st.slot_usd[i] += usd
+        st.win_n += 1
+        st.win_usd += usd
+
+        if st.seen < self.warmup or st.win_usd < self.min_notional or sec - st.last_alert < self.cooldown:
+            return None
+        z_usd = (st.win_usd - st.mean_usd) / math.sqrt(st.var_usd) if st.var_usd > 0 else math.inf
+        z_n = (st.win_n - st.mean_n) / math.sqrt(st.var_n) if st.var_n > 0 else math.inf
+        if z_usd < self.z and z_n < self.z:
+            return None
+
+        st.last_alert = sec
+        alert = {
+            "symbol": symbol,
+            "side": side,
+            "ts": sec,
+            "window": self.window,
+            "notional": st.win_usd,
+            "count": st.win_n,
+            "baseline_notional": st.mean_usd,
+            "z_notional": z_usd,
+            "z_rate": z_n,
+            "price": price,
+        }
+        self._dispatch(alert, received)
+        return alert
+
+    def stats(self, symbol: str) -> dict | None:
+        st = self._symbols.get(symbol)
+        if st is None:
+            return None
+        return {"ts": st.sec, "notional": st.win_usd, "count": st.win_n,
+                "baseline_notional": st.mean_usd, "baseline_count": st.mean_n, "seen": st.seen}
+
+    # -----------------------------------------------------
+    # SINKS
+    # -----------------------------------------------------
+    def _dispatch(self, alert: dict, received: float | None):
+        if received is not None:
+            latency = time.perf_counter() - received
+            alert["latency_ms"] = latency * 1e3
+            CASCADE_LATENCY.observe(latency)
+        CASCADE_ALERTS.inc(symbol=alert["symbol"])
+        for sink in self.sinks:
+            try:
+                sink.emit(alert)
+            except Exception:
+                LOG.exception("cascade sink %s failed", type(sink).__name__)
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+
+
+class LogSink:
+    def emit(self, alert: dict):
+        LOG.warning("🚨 Cascade %s: %.0f USD / %d liquidations in %ds (z=%.1f, rate z=%.1f, last %s @ %s)",
+                    alert["symbol"], alert["notional"], alert["count"], alert["window"],
+                    alert["z_notional"], alert["z_rate"], alert["side"], alert["price"])
+
+
+class QueueSink:
+    """put_nowait() into a queue.Queue or asyncio.Queue (same-loop consumers); drops when full."""
+
+    def __init__(self, q=None, maxsize: int = 1000):
+        self.queue = q if q is not None else queue.Queue(maxsize)
+
+    def emit(self, alert: dict):
+        try:
+            self.queue.put_nowait(alert)
+        except Exception:  # queue.Full / asyncio.QueueFull
+            SINK_DROPPED.inc(sink="queue")
+
+
+class WebhookSink:
+    """POST each alert as JSON to a (local) URL from a background thread."""
+
+    def __init__(self, url: str, timeout: float = 2.0, maxsize: int = 100, transport=None):
+        self.url = url
+        self.timeout = timeout
+        self._transport = transport
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name="cascade-webhook", daemon=True)
+        self._thread.start()
+
+    def emit(self, alert: dict):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            SINK_DROPPED.inc(sink="webhook")
+
+    def _run(self):
+        import httpx
+
+        with httpx.Client(timeout=self.timeout, transport=self._transport) as client:
+            while True:
+                alert = self._queue.get()
+                if alert is None:
+                    return
+                try:
+                    client.post(self.url, content=json.dumps(alert, default=str),
+                                headers={"Content-Type": "application/json"})
+                except Exception as e:
+                    LOG.warning("cascade webhook %s failed: %s", self.url, e)
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
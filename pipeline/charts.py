@@ -0,0 +1,379 @@
+"""
+pipeline/charts.py
+Chart stage: price, funding/OI, SOPR and liquidation charts, rendered outside the collection cycle.
+
+- CHARTS: one class per chart with the tables it reads; a chart is re-rendered only when
+  the watermark of one of them (query.watermark) changed since its last version
+- rendering happens in a separate process (matplotlib Agg through Figure, no pyplot);
+  each chart's Figure and artists are created once and updated in place afterwards
+- artifacts next to the exports: CHART_DIR/<name>.v<N>.png and .svg (the KEEP_VERSIONS
+  latest kept) and CHART_DIR/manifest.json {name: {version, watermark, png, svg,
+  rendered_at}}, replaced atomically: dashboards read the manifest, never a half-written file
+- daemon mode: ChartWorker, a resident process kicked after each report stage (kicks
+  coalesce); one-shot main.py: spawn() starts a detached `python -m pipeline.charts`
+  and returns immediately
+
+Usage: python -m pipeline.charts --db data/crypto.db [--force] [--chart sopr]
+"""
+
+import abc
+import argparse
+import json
+import logging
+import os
+import queue
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pipeline import db, query
+
+LOG = logging.getLogger("pipeline.charts")
+
+CHART_DIR = Path("exports/charts")
+MANIFEST = "manifest.json"
+KEEP_VERSIONS = 3
+WINDOW_DAYS = 30
+FIGSIZE = (10, 5)
+DPI = 110
+FORMATS = ("png", "svg")
+
+
+def _days(ts):
+    """epoch seconds → matplotlib date numbers (days since 1970-01-01)."""
+    return ts / 86400.0
+
+
+def _date_axis(ax):
+    from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+
+    locator = AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+
+
+# -----------------------------------------------------
+# CHARTS (figure built on first render, artists updated afterwards)
+# -----------------------------------------------------
+class Chart(abc.ABC):
+    name = ""
+    title = ""
+    tables: tuple = ()
+
+    def __init__(self):
+        self.fig = None
+
+    def render(self, conn: sqlite3.Connection, start: int):
+        data = self.load(conn, start)
+        if self.fig is None:
+            from matplotlib.figure import Figure
+            self.fig = Figure(figsize=FIGSIZE, dpi=DPI, layout="constrained")
+            self.fig.suptitle(self.title)
+            self.setup(self.fig)
+        self.update(data)
+        return self.fig
+
+    @abc.abstractmethod
+    def load(self, conn: sqlite3.Connection, start: int):
+        """Data of the chart's tables from `start` on."""
+
+    @abc.abstractmethod
+    def setup(self, fig):
+        """Axes and artists, once per figure."""
+
+    @abc.abstractmethod
+    def update(self, data):
+        """Refresh the artists with load()'s data."""
+
+    @staticmethod
+    def _rescale(*axes):
+        for ax in axes:
+            ax.relim()
+            ax.autoscale_view()
+
+
+class PriceChart(Chart):
+    name = "price"
+    title = "Prix (CoinGecko, horaire)"
+    tables = ("coingecko",)
+    symbols = ("btc", "eth")
+
+    def load(self, conn, start):
+        return {s: query.range("coingecko", ["price_usd"], start, symbol=s, resample=3600, conn=conn)
+                for s in self.symbols}
+
+    def setup(self, fig):
+        axes = fig.subplots(len(self.symbols), 1, sharex=True)
+        self.lines = {}
+        for ax, s in zip(axes, self.symbols):
+            self.lines[s], = ax.plot([], [], lw=1.2)
+            ax.set_ylabel(f"{s.upper()} (USD)")
+            _date_axis(ax)
+            ax.grid(alpha=0.3)
+        self.axes = axes
+
+    def update(self, data):
+        for s, line in self.lines.items():
+            line.set_data(_days(data[s]["ts"]), data[s]["price_usd"])
+        self._rescale(*self.axes)
+
+
+class FundingOIChart(Chart):
+    name = "funding_oi"
+    title = "Funding / open interest (Bybit, horaire)"
+    tables = ("bybit",)
+    symbol = "BTCUSDT"
+
+    def load(self, conn, start):
+        return query.range("bybit", ["funding", "open_interest"], start, symbol=self.symbol,
+                           resample=3600, conn=conn)
+
+    def setup(self, fig):
+        ax = fig.subplots()
+        oi = ax.twinx()
+        self.funding, = ax.plot([], [], lw=1.0, color="tab:blue", label="funding")
+        self.oi, = oi.plot([], [], lw=1.0, color="tab:orange", label="open interest")
+        ax.axhline(0, color="grey", lw=0.6)
+        ax.set_ylabel(f"funding {self.symbol}")
+        oi.set_ylabel("open interest")
+        _date_axis(ax)
+        ax.grid(alpha=0.3)
+        fig.legend(handles=[self.funding, self.oi], loc="upper left")
+        self.axes = (ax, oi)
+
+    def update(self, data):
+        x = _days(data["ts"])
+        self.funding.set_data(x, data["funding"])
+        self.oi.set_data(x, data["open_interest"])
+        self._rescale(*self.axes)
+
+
+class SoprChart(Chart):
+    name = "sopr"
+    title = "SOPR"
+    tables = ("sopr",)
+
+    def load(self, conn, start):
+        return query.range("sopr", ["value"], start, conn=conn)
+
+    def setup(self, fig):
+        from pipeline.signals import RULES
+
+        self.ax = fig.subplots()
+        self.line, = self.ax.plot([], [], lw=1.2, marker=".", ms=3)
+        self.ax.axhline(RULES["sopr"][1], color="grey", lw=0.8, ls="--")
+        _date_axis(self.ax)
+        self.ax.grid(alpha=0.3)
+
+    def update(self, data):
+        self.line.set_data(_days(data["ts"]), data["value"])
+        self._rescale(self.ax)
+
+
+class LiquidationsChart(Chart):
+    name = "liquidations"
+    title = "Liquidations par heure (USD) : longs ↑ / shorts ↓"
+    tables = ("bybit_liquidations_hourly",)
+
+    def load(self, conn, start):
+        import numpy as np
+
+        start = start // 3600 * 3600
+        rows = conn.execute(
+            "SELECT (hour_start - ?) / 3600, side, SUM(total_qty_usd) FROM bybit_liquidations_hourly "
+            "WHERE hour_start >= ? GROUP BY 1, 2", (start, start)).fetchall()
+        hours = max((r[0] for r in rows), default=-1) + 1
+        longs, shorts = np.zeros(hours), np.zeros(hours)
+        for i, side, total in rows:
+            # BUY = long positions liquidated (see collectors/liquidation_feeds.py)
+            (longs if side == "BUY" else shorts)[i] += total or 0.0
+        return start, longs, shorts
+
+    def setup(self, fig):
+        self.ax = fig.subplots()
+        self.longs = self.ax.stairs([], [0], fill=True, color="tab:red", label="longs")
+        self.shorts = self.ax.stairs([], [0], fill=True, color="tab:green", label="shorts")
+        self.ax.axhline(0, color="grey", lw=0.6)
+        _date_axis(self.ax)
+        self.ax.legend(loc="upper left")
+        self.ax.grid(alpha=0.3)
+
+    def update(self, data):
+        import numpy as np
+
+        start, longs, shorts = data
+        edges = _days(start + 3600 * np.arange(len(longs) + 1))
+        self.longs.set_data(longs, edges)
+        self.shorts.set_data(-shorts, edges)
+        self._rescale(self.ax)
+
+
+CHARTS = {c.name: c for c in (PriceChart, FundingOIChart, SoprChart, LiquidationsChart)}
+
+
+# -----------------------------------------------------
+# RENDER (only what changed)
+# -----------------------------------------------------
+def load_manifest(out_dir: Path = CHART_DIR) -> dict:
+    try:
+        return json.loads((Path(out_dir) / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path: Path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class Renderer:
+    """Keeps one Chart (and its Figure) per name for the life of the process."""
+
+    def __init__(self, db_path: str | Path = db.DB_PATH, out_dir: str | Path = CHART_DIR,
+                 window_days: int = WINDOW_DAYS):
+        self.db_path = db_path
+        self.out_dir = Path(out_dir)
+        self.window = window_days * 86400
+        self.charts = {}
+        self.manifest = load_manifest(self.out_dir)
+
+    def _chart(self, name: str) -> Chart:
+        chart = self.charts.get(name)
+        if chart is None:
+            chart = self.charts[name] = CHARTS[name]()
+        return chart
+
+    def run(self, names=None, force: bool = False) -> list:
+        """Render the charts whose watermark changed (or all with force); → names rendered."""
+        import matplotlib
+        matplotlib.use("Agg")
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        rendered = []
+        conn = db.get_readonly_conn(self.db_path)
+        try:
+            for name in names or CHARTS:
+                chart = self._chart(name)
+                try:
+                    mark = "|".join(query.watermark(conn, t) for t in chart.tables)
+                except sqlite3.Error as e:
+                    LOG.warning("chart %s: %s", name, e)
+                    continue
+                entry = self.manifest.get(name, {})
+                if not force and entry.get("watermark") == mark:
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    fig = chart.render(conn, int(time.time()) - self.window)
+                    self._save(name, fig, mark, entry.get("version", 0) + 1)
+                except Exception:
+                    LOG.exception("chart %s failed", name)
+                    continue
+                rendered.append(name)
+                LOG.info("chart %s v%d rendered in %.2fs", name, self.manifest[name]["version"],
+                         time.perf_counter() - t0)
+        finally:
+            conn.close()
+        if rendered:
+            _write_atomic(self.out_dir / MANIFEST,
+                          lambda p: p.write_text(json.dumps(self.manifest, indent=2, sort_keys=True)))
+        return rendered
+
+    def _save(self, name: str, fig, mark: str, version: int):
+        files = {}
+        for fmt in FORMATS:
+            path = self.out_dir / f"{name}.v{version}.{fmt}"
+            _write_atomic(path, lambda p: fig.savefig(p, format=fmt))
+            files[fmt] = path.name
+        self.manifest[name] = {"version": version, "watermark": mark, **files,
+                               "rendered_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        for old in self.out_dir.glob(f"{name}.v*.*"):
+            v = old.name[len(name) + 2:].split(".", 1)[0]
+            if v.isdigit() and int(v) <= version - KEEP_VERSIONS:
+                old.unlink(missing_ok=True)
+
+
+# -----------------------------------------------------
+# WORKER PROCESS
+# -----------------------------------------------------
+def _worker_main(db_path, out_dir, window_days, kicks):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    renderer = Renderer(db_path, out_dir, window_days)
+    while True:
+        msgs = [kicks.get()]
+        try:
+            while True:  # a burst of kicks → one pass
+                msgs.append(kicks.get_nowait())
+        except queue.Empty:
+            pass
+        if "stop" in msgs:
+            return
+        try:
+            renderer.run()
+        except Exception:
+            LOG.exception("chart pass failed")
+
+
+class ChartWorker:
+    """Resident rendering process; kick() never blocks the caller."""
+
+    def __init__(self, db_path: str | Path = db.DB_PATH, out_dir: str | Path = CHART_DIR,
+                 window_days: int = WINDOW_DAYS):
+        self.args = (str(db_path), str(out_dir), window_days)
+        self.proc = None
+        self.kicks = None
+
+    def start(self):
+        import multiprocessing
+
+        ctx = multiprocessing.get_context("spawn")
+        self.kicks = ctx.Queue()
+        self.proc = ctx.Process(target=_worker_main, args=(*self.args, self.kicks), name="charts", daemon=True)
+        self.proc.start()
+        LOG.info("chart worker started (pid %s)", self.proc.pid)
+
+    def kick(self):
+        if self.proc is None or not self.proc.is_alive():
+            if self.proc is not None:
+                LOG.warning("chart worker exited (code %s), restarting", self.proc.exitcode)
+            self.start()
+        self.kicks.put(None)
+
+    def stop(self, timeout: float = 10.0):
+        if self.proc is None:
+            return
+        if self.proc.is_alive():
+            self.kicks.put("stop")
+            self.proc.join(timeout)
+            if self.proc.is_alive():
+                self.proc.terminate()
+        self.proc = None
+
+
+def spawn(db_path: str | Path = db.DB_PATH, out_dir: str | Path = CHART_DIR):
+    """One-shot pass in a detached process (outlives the caller, which never waits)."""
+    return subprocess.Popen([sys.executable, "-m", "pipeline.charts", "--db", str(db_path), "--out", str(out_dir)],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the dashboard charts whose data changed")
+    parser.add_argument("--db", default=str(db.DB_PATH), help="Fichier SQLite")
+    parser.add_argument("--out", default=str(CHART_DIR), help="Dossier des graphiques")
+    parser.add_argument("--days", type=int, default=WINDOW_DAYS, help="Fenêtre affichée (jours)")
+    parser.add_argument("--chart", action="append", choices=list(CHARTS), help="Graphique(s) à rendre")
+    parser.add_argument("--force", action="store_true", help="Re-rendre même sans nouvelles données")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    rendered = Renderer(args.db, args.out, args.days).run(args.chart, args.force)
+    LOG.info("charts: %s", ", ".join(rendered) or "up to date")
+
+
+if __name__ == "__main__":
+    main()
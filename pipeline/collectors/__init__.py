@@ -3,21 +3,13 @@ Pipeline collectors package
 Expose uniquement les modules batch (collect(conn)).
 
 ⚠️ Attention :
-- `bybit_ws` est un service temps réel → NE DOIT PAS être importé ici,
-  il s’exécute séparément via : python -m pipeline.collectors.bybit_ws
+- `bybit_ws` / `mempool_ws` sont des services temps réel → NE DOIVENT PAS être importés ici,
+  ils s’exécutent séparément via : python -m pipeline.collectors.bybit_ws (resp. mempool_ws)
+- Les modules sont chargés à la demande (PEP 562) : `import pipeline.collectors`
+  ne coûte rien, `from pipeline.collectors import bybit` ne charge que bybit.
 """
 
-from . import (
-    coingecko,
-    defillama,
-    sopr,
-    bybit,
-    mempool,
-    altme,
-    bybit_oi_hist,
-    hashrate,
-    txcount,
-)
+import importlib
 
 __all__ = [
     "coingecko",
@@ -30,3 +22,15 @@ __all__ = [
     "hashrate",
     "txcount",
 ]
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f"{__name__}.{name}")
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,9 +1,14 @@
-import httpx, time, logging, sqlite3
+import time, logging, sqlite3
+from pipeline import httpclient, spill, state
 LOG = logging.getLogger("pipeline.collectors.altme")
 
+# scheduler cadence (seconds), see pipeline/scheduler.py
+INTERVAL = 3600
+JITTER = 120
+
 def collect(conn: sqlite3.Connection):
     try:
-        r = httpx.get("https://api.alternative.me/fng/?limit=1", timeout=10.0)
+        r = httpclient.get("altme", "https://api.alternative.me/fng/?limit=1", timeout=10.0)
         r.raise_for_status()
         j = r.json()
         data = j.get("data", [])
@@ -11,10 +16,9 @@ def collect(conn: sqlite3.Connection):
             return
         v = int(data[0].get("value", 0))
         ts = int(time.time())
-        cur = conn.cursor()
         # correspond au schéma migrate.py (table altme avec colonne fng)
-        cur.execute("INSERT OR REPLACE INTO altme (ts, fng) VALUES (?,?)", (ts, v))
-        conn.commit()
+        spill.store(conn, "altme", "INSERT OR REPLACE INTO altme (ts, fng) VALUES (?,?)", [(ts, v)])
+        state.publish("altme", {"ts": ts, "fng": v})
         LOG.info("altme: fng=%s", v)
     except Exception:
         LOG.exception("altme failed")
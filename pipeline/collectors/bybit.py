@@ -1,58 +1,111 @@
-import httpx, time, logging, sqlite3
+import time, logging, sqlite3, asyncio
+from pipeline import httpclient, spill, state
+from pipeline.ratelimit import TokenBucket
 LOG = logging.getLogger("pipeline.collectors.bybit")
 
-SYMS = ["BTCUSDT","ETHUSDT"]
+# scheduler cadence (seconds), see pipeline/scheduler.py
+INTERVAL = 60
+JITTER = 10
+# no SHARDS (pipeline/leases.py): the bulk snapshot is one request for every symbol,
+# split jobs would each repeat it
 
-def _get_oi(symbol, interval):
-    url = f"https://api.bybit.com/v5/market/open-interest?category=linear&symbol={symbol}&interval={interval}&limit=1"
-    r = httpx.get(url, timeout=10.0)
-    r.raise_for_status()
-    j = r.json()
-    # path: result.list[0].open_interest
+TICKERS_URL = "https://api.bybit.com/v5/market/tickers"
+OI_URL = "https://api.bybit.com/v5/market/open-interest"
+FUNDING_URL = "https://api.bybit.com/v5/market/funding/history"
+
+# None → whole linear perp universe returned by /tickers (filtered on QUOTE)
+SYMS = None
+QUOTE = "USDT"
+# used when /tickers is down and SYMS is None
+FALLBACK_SYMS = ["BTCUSDT", "ETHUSDT"]
+
+# per-symbol fallbacks only (the snapshot itself is a single request)
+FALLBACK_RATE_PER_SEC = 20
+FALLBACK_CONCURRENCY = 8
+
+
+def _float(v):
     try:
-        lst = j.get("result", {}).get("list", [])
-        if not lst:
-            return None
-        v = lst[0].get("open_interest")
-        return float(v) if v is not None else None
-    except Exception:
+        return float(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
         return None
 
-def _get_funding(symbol):
-    url = f"https://api.bybit.com/v5/market/funding/history?category=linear&symbol={symbol}&limit=1"
-    r = httpx.get(url, timeout=10.0)
+
+def _get_tickers():
+    """One request → {symbol: (funding, open_interest)} for every linear contract."""
+    r = httpclient.get("bybit", TICKERS_URL, params={"category": "linear"}, timeout=10.0)
     r.raise_for_status()
-    j = r.json()
-    try:
-        lst = j.get("result", {}).get("list", [])
-        if not lst:
-            return None
-        v = lst[0].get("funding_rate")
-        return float(v) if v is not None else None
-    except Exception:
-        return None
+    lst = r.json().get("result", {}).get("list", [])
+    return {t["symbol"]: (_float(t.get("fundingRate")), _float(t.get("openInterest"))) for t in lst}
+
+
+async def _get_oi(client, bucket, symbol):
+    # try intervals 5min->1h->4h
+    for interval in ("5min", "1h", "4h"):
+        await bucket.acquire()
+        r = await client.get(OI_URL, params={"category": "linear", "symbol": symbol,
+                                             "intervalTime": interval, "limit": 1})
+        r.raise_for_status()
+        lst = r.json().get("result", {}).get("list", [])
+        if lst and _float(lst[0].get("openInterest")) is not None:
+            return _float(lst[0]["openInterest"])
+    return None
+
+
+async def _get_funding(client, bucket, symbol):
+    await bucket.acquire()
+    r = await client.get(FUNDING_URL, params={"category": "linear", "symbol": symbol, "limit": 1})
+    r.raise_for_status()
+    lst = r.json().get("result", {}).get("list", [])
+    return _float(lst[0].get("fundingRate")) if lst else None
+
+
+async def _fill_missing(snapshot: dict, missing: list):
+    """Fetch funding/OI concurrently for symbols the bulk snapshot left incomplete."""
+    bucket = TokenBucket(FALLBACK_RATE_PER_SEC)
+    sem = asyncio.Semaphore(FALLBACK_CONCURRENCY)
+
+    async def one(client, s):
+        funding, oi = snapshot.get(s, (None, None))
+        async with sem:
+            try:
+                if funding is None:
+                    funding = await _get_funding(client, bucket, s)
+                if oi is None:
+                    oi = await _get_oi(client, bucket, s)
+            except Exception:
+                LOG.debug("bybit fallback failed for %s", s, exc_info=True)
+        snapshot[s] = (funding, oi)
+
+    async with httpclient.async_client("bybit", timeout=10.0) as client:
+        await asyncio.gather(*(one(client, s) for s in missing))
+
 
 def collect(conn: sqlite3.Connection):
     ts = int(time.time())
-    cur = conn.cursor()
     try:
-        for s in SYMS:
-            funding = None
-            oi = None
-            try:
-                funding = _get_funding(s)
-            except Exception:
-                LOG.debug("bybit funding failed for %s", s, exc_info=True)
-            # try intervals 5min->1h->4h
-            for interval in ("5min","1h","4h"):
-                try:
-                    oi = _get_oi(s, interval)
-                    if oi is not None:
-                        break
-                except Exception:
-                    continue
-            cur.execute("INSERT OR REPLACE INTO bybit (ts,symbol,funding,open_interest) VALUES (?,?,?,?)", (ts, s, funding, oi))
-        conn.commit()
-        LOG.info("bybit: metrics saved")
+        snapshot = {}
+        try:
+            snapshot = _get_tickers()
+        except Exception:
+            LOG.warning("bybit tickers failed, falling back to per-symbol requests", exc_info=True)
+
+        if SYMS is not None:
+            symbols = list(SYMS)
+        elif snapshot:
+            symbols = sorted(s for s in snapshot if s.endswith(QUOTE))
+        else:
+            symbols = list(FALLBACK_SYMS)
+
+        missing = [s for s in symbols if None in snapshot.get(s, (None, None))]
+        if missing:
+            asyncio.run(_fill_missing(snapshot, missing))
+
+        rows = [(ts, s) + snapshot.get(s, (None, None)) for s in symbols]
+        spill.store(conn, "bybit", "INSERT INTO bybit (ts,symbol,funding,open_interest) VALUES (?,?,?,?)", rows)
+        state.publish_many({
+            f"bybit:{s}": {"ts": ts, "funding": funding, "open_interest": oi} for _, s, funding, oi in rows
+        })
+        LOG.info("bybit: metrics saved (%d symbols, %d fallbacks)", len(rows), len(missing))
     except Exception:
         LOG.exception("bybit collector failed")
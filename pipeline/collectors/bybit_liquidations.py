@@ -1,122 +1,432 @@
 """
 Bybit Liquidations Writer (prod-safe)
-- Ecrit en SQLite (événements + agrégats horaires)
+- Ecrit en SQLite (événements + agrégats minute/heure)
+- Agrégats multi-résolution en mémoire (pipeline/aggregates.py) : 1s/1m/5m/1h par
+  symbole et side, lisibles sans requête DB (writer.aggregates) ; un upsert par bucket,
+  écrit aussi sans nouvel événement (timer) ; au démarrage, les rollups de l'heure
+  courante et de la précédente sont recalculés depuis les événements (deltas perdus
+  lors d'un arrêt brutal), seulement si aucun autre writer n'est actif sur la base
+  (chacun s'y enregistre, table leases : ses deltas en attente seraient comptés deux fois)
+- Ingestion idempotente : clé (ts_ms, symbol, side, price, qty, exchange) filtrée par un LRU
+  en mémoire (pipeline/dedup.py), index unique en base pour les doublons plus anciens
+- Flush piloté par un timer (pipeline/flush.py) : en mode adaptatif (latency_target),
+  taille de lot et attente max calculées depuis le débit et la latence de commit
+- Lot en échec (base verrouillée, disque plein…) → file de débordement sur disque
+  (pipeline/spill.py), rejouée dès que la base accepte à nouveau les écritures, par
+  tranches de REPLAY_BUDGET par flush / tick du timer (la boucle WS n'est pas bloquée)
+- Schéma compact (pipeline/compact.py) : insertion directe dans bybit_liquidations_data
+  (ids symbol/side en cache, raw compressé)
 - Flush vers Parquet (optionnel)
-- Utilisé par bybit_ws.py
+- Lots normalisés multi-exchange (write_batch, pipeline/collectors/liquidation_feeds.py) ;
+  write_record garde le format brut Bybit
+- Utilisé par bybit_ws.py et liquidation_feeds.py
+- pyarrow n'est importé qu'au premier flush Parquet (démarrage rapide du service WS)
 """
 
 import os
+import json
+import time
+import socket
 import sqlite3
 import asyncio
 import logging
 from datetime import datetime
-import pandas as pd
+
+from pipeline import compact, leases, profiling, schema, state
+from pipeline.aggregates import LiquidationAggregator
+from pipeline.db import get_conn
+from pipeline.dedup import RecentKeys
+from pipeline.flush import FlushController
+from pipeline.metrics import DUPLICATES, WRITER_BUFFER, WRITER_FLUSH_SECONDS, WRITER_FLUSHED
+from pipeline.spill import REPLAY_BUDGET, SpillQueue
 
 logger = logging.getLogger(__name__)
 
+# live writers of a database: registered in its leases table, renewed every WRITER_TTL / 3
+WRITER_TTL = 60.0
+_WRITER_PREFIX = "writer:bybit_liquidations:"
+
+_INSERT = """
+INSERT {} INTO bybit_liquidations (ts, ts_ms, symbol, side, price, qty, qty_usd, raw, exchange)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_COMPACT = """
+INSERT {} INTO bybit_liquidations_data (symbol_id, ts, ms, side_id, price, qty, qty_usd, raw, exchange_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def normalize(record):
+    """Bybit liquidation dict → (ts_ms, SYMBOL, SIDE, price, qty), None when unusable."""
+    symbol = record.get("symbol") or record.get("s")
+    side = record.get("side") or record.get("S", "UNKNOWN")
+    price = float(record.get("price") or record.get("p") or 0)
+    # v5 "liquidation" topic: size/updatedTime, "allLiquidation": v/T
+    qty = float(record.get("qty") or record.get("size") or record.get("q") or record.get("v") or 0)
+    ts_ms = int(record.get("ts") or record.get("updatedTime") or record.get("T")
+                or datetime.utcnow().timestamp() * 1000)
+
+    if not symbol or price == 0 or qty == 0:
+        return None
+    return ts_ms, symbol.upper(), side.upper(), price, qty
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
 
 class BybitLiquidationsWriter:
     def __init__(self, db="data/crypto.db", parquet_dir="data/bybit_liquidations",
-                 flush_size=100, flush_interval=5, parquet_enabled=True):
+                 flush_size=100, flush_interval=5, parquet_enabled=True,
+                 latency_target=None, max_batch=5000, spill_dir=None):
+        """
+        latency_target=None: flush every flush_size records or flush_interval seconds;
+        otherwise adaptive (p99 target in seconds, batches up to max_batch, wait <= flush_interval).
+        """
         self.db = db
         self.parquet_dir = parquet_dir
         self.flush_size = flush_size
         self.flush_interval = flush_interval
         self.parquet_enabled = parquet_enabled
+        self.flush_policy = FlushController(
+            latency_target,
+            max_size=flush_size if latency_target is None else max_batch,
+            max_wait=flush_interval,
+            name="bybit_liquidations",
+        )
 
         os.makedirs(os.path.dirname(db), exist_ok=True)
         os.makedirs(parquet_dir, exist_ok=True)
 
-        self.conn = sqlite3.connect(self.db, check_same_thread=False)
+        self.conn = get_conn(self.db, check_same_thread=False)
+        schema.migrate(self.conn)
+        # compact layout: symbol/side ids cached here, raw deflated before the insert
+        self.dictionary = compact.Dictionary(self.conn) if compact.is_compact(self.conn) else None
 
         self.buffer = []
-        self.last_flush = datetime.utcnow().timestamp()
+        self.aggregates = LiquidationAggregator()
+        self.writer_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.registry = leases.SQLiteBackend(db)
+        self._registered = None
+        self._heartbeat()
+        self._rebuild_rollups()
+        self.spill = SpillQueue(spill_dir or os.path.join(os.path.dirname(db), "spill", "bybit_liquidations"))
+        self.recent = RecentKeys()
+        self.duplicates = 0
+        self.last_flush = time.monotonic()
+        self.oldest = None  # monotonic time the oldest buffered record arrived
         self.lock = asyncio.Lock()
+        self._timer = None
 
         logger.info(
             "BybitLiquidationsWriter initialized (db=%s parquet=%s parquet_enabled=%s)",
             db, parquet_dir, parquet_enabled
         )
 
+    def _heartbeat(self):
+        """Register (renew) this writer as live on the database, at most every WRITER_TTL / 3."""
+        now = time.monotonic()
+        if self._registered is not None and now - self._registered < WRITER_TTL / 3:
+            return
+        try:
+            self.registry.acquire(_WRITER_PREFIX + self.writer_id, self.writer_id, WRITER_TTL)
+            self._registered = now
+        except sqlite3.Error as e:
+            logger.warning("Writer registration error: %s", e)
+
+    def _other_writers(self) -> list:
+        """Live writers of this database besides this one (same host: dead pids are dropped)."""
+        host, others = socket.gethostname(), []
+        for name, owner in self.registry.holders(_WRITER_PREFIX).items():
+            if owner == self.writer_id:
+                continue
+            owner_host, pid, _ = owner.rsplit(":", 2)
+            if owner_host == host and not _pid_alive(int(pid)):
+                self.registry.release(name, owner)
+                continue
+            others.append(owner)
+        return others
+
+    def _rebuild_rollups(self):
+        """
+        Deltas still in memory at a crash are lost: recompute the recent buckets from the events.
+        Skipped while another writer is live: its pending deltas cover some of those events.
+        """
+        latest = self.conn.execute("SELECT MAX(ts) FROM bybit_liquidations").fetchone()[0]
+        if latest is None:
+            return
+        try:
+            others = self._other_writers()
+        except sqlite3.Error as e:
+            logger.warning("Rollup rebuild skipped, live writers unknown: %s", e)
+            return
+        if others:
+            logger.info("Rollup rebuild skipped: %d other writer(s) live (%s)", len(others), ", ".join(others))
+            return
+        since = latest - latest % 3600 - 3600
+        try:
+            n = self.aggregates.rebuild(self.conn, since)
+            self.conn.commit()
+            logger.info("Rollups rebuilt from %s (%d rows)", datetime.utcfromtimestamp(since).isoformat(), n)
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error("Rollup rebuild error: %s", e, exc_info=True)
+
     # -----------------------------------------------------
     # RECORD WRITE
     # -----------------------------------------------------
-    async def write_record(self, record):
+    def fresh(self, event, exchange: str = "bybit") -> bool:
+        """normalize() result → False when the same event was recently seen (reconnect, replay)."""
+        if self.recent.add((exchange, *event)):
+            return True
+        self.duplicates += 1
+        DUPLICATES.inc(writer="bybit_liquidations", stage="memory")
+        return False
+
+    async def write_record(self, record, event=None):
+        """record: raw Bybit liquidation dict; event: its normalize() result, already accepted by fresh()."""
         async with self.lock:
             try:
-                symbol = record.get("symbol") or record.get("s")
-                side = record.get("side") or record.get("S", "UNKNOWN")
-                price = float(record.get("price") or record.get("p") or 0)
-                qty = float(record.get("qty") or record.get("q") or 0)
-                ts = int(record.get("ts") or record.get("T") or datetime.utcnow().timestamp() * 1000)
-
-                if not symbol or price == 0 or qty == 0:
-                    return
-
-                self.buffer.append({
-                    "symbol": symbol.upper(),
-                    "side": side.upper(),
-                    "price": price,
-                    "qty": qty,
-                    "time": ts
-                })
-
-                now = datetime.utcnow().timestamp()
-                if len(self.buffer) >= self.flush_size or (now - self.last_flush) >= self.flush_interval:
-                    await self.flush()
+                if event is None:
+                    event = normalize(record)
+                    if event is None or not self.fresh(event):
+                        return
+                self._append(event, json.dumps(record, separators=(",", ":")), "bybit")
+                await self._maybe_flush()
 
             except Exception as e:
                 logger.error("Error parsing record: %s", e, exc_info=True)
 
+    async def write_batch(self, batch, accepted=None):
+        """
+        batch: normalized EventBatch (pipeline/collectors/liquidation_feeds.py);
+        accepted: per-event fresh() results (default: every event, already deduplicated).
+        """
+        async with self.lock:
+            for i, event in enumerate(batch.events()):
+                if accepted is None or accepted[i]:
+                    try:
+                        self._append(event, batch.raw[i], batch.exchange)
+                    except Exception as e:
+                        logger.error("Error parsing %s record: %s", batch.exchange, e, exc_info=True)
+            try:
+                await self._maybe_flush()
+            except Exception as e:
+                logger.error("Flush trigger error: %s", e, exc_info=True)
+
+    def _append(self, event, raw: str, exchange: str):
+        ts_ms, symbol, side, price, qty = event
+        ts = ts_ms // 1000
+        # persisted rollups count the rows actually inserted (see _flush)
+        self.aggregates.add(ts, symbol, side, price, qty, persist=False)
+
+        # same layout as the bybit_liquidations table (ts in epoch seconds)
+        self.buffer.append({
+            "ts": ts,
+            "ts_ms": ts_ms,
+            "symbol": symbol,
+            "side": side,
+            "price": price,
+            "qty": qty,
+            "qty_usd": price * qty,
+            "raw": raw,
+            "exchange": exchange,
+        })
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+
+    async def _maybe_flush(self):
+        WRITER_BUFFER.set(len(self.buffer), writer="bybit_liquidations")
+        if not self.buffer:
+            return
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().create_task(self._flush_timer())
+        if self.flush_policy.should_flush(len(self.buffer), time.monotonic() - self.oldest):
+            await self.flush()
+
     # -----------------------------------------------------
     # FLUSH
     # -----------------------------------------------------
+    async def _flush_timer(self):
+        """
+        Time trigger: the oldest record never waits more than flush_policy.max_wait.
+        Idle: closed buckets and the open ones' checkpoint are written without waiting for an event,
+        and the spill backlog is replayed in REPLAY_BUDGET slices (the loop runs in between).
+        """
+        while True:
+            wait = self.flush_policy.max_wait
+            if self.oldest is not None:
+                wait -= time.monotonic() - self.oldest
+            if wait > 0:
+                await asyncio.sleep(wait)
+                if self.oldest is None:
+                    async with self.lock:
+                        self._persist_rollups()
+                        self._heartbeat()
+                while self.oldest is None and self.spill.due():
+                    async with self.lock:
+                        try:
+                            if not self._replay_spill():
+                                break
+                        except sqlite3.OperationalError:
+                            break  # logged by the queue, retried after its backoff
+                    await asyncio.sleep(0)
+                continue
+            async with self.lock:
+                if self.oldest is not None and time.monotonic() - self.oldest >= self.flush_policy.max_wait:
+                    await self.flush()
+
     async def flush(self):
         if not self.buffer:
             return
 
         buf = self.buffer
         self.buffer = []
-        self.last_flush = datetime.utcnow().timestamp()
+        now = time.monotonic()
+        waited, since_last = now - self.oldest, now - self.last_flush
+        self.oldest = None
+        self.last_flush = now
+        WRITER_BUFFER.set(0, writer="bybit_liquidations")
+        t0 = time.perf_counter()
 
         try:
-            df = pd.DataFrame(buf)
-            if df.empty:
-                return
+            # failed batches first (a bounded slice, the rest on later flushes / idle ticks);
+            # while the DB is known to be down (replay backoff), new batches go straight to
+            # the spill instead of blocking on busy_timeout
+            if self.spill:
+                if not self.spill.due():
+                    raise sqlite3.OperationalError("database unavailable, replay backing off")
+                self._replay_spill()
+            with profiling.stage("writer.flush"):
+                self._flush(buf)
+            elapsed = time.perf_counter() - t0
+            WRITER_FLUSH_SECONDS.observe(elapsed, writer="bybit_liquidations")
+            self.flush_policy.observe_flush(len(buf), elapsed, waited, since_last)
+            WRITER_FLUSHED.inc(len(buf), writer="bybit_liquidations")
+            logger.info("Flushed %s records", len(buf))
+            self._heartbeat()
 
-            # SQLite: raw events
-            cur = self.conn.cursor()
-            cur.executemany("""
-            INSERT INTO bybit_liquidations (symbol, side, price, qty, time)
-            VALUES (?, ?, ?, ?, ?)
-            """, [(r["symbol"], r["side"], r["price"], r["qty"], r["time"]) for _, r in df.iterrows()])
-
-            # SQLite: aggregates
-            for _, r in df.iterrows():
-                hour_start = int(r["time"] // 1000 // 3600 * 3600)
-                cur.execute("""
-                INSERT INTO bybit_liquidations_hourly (hour_start, symbol, side, total_qty_usd, events_count)
-                VALUES (?, ?, ?, ?, 1)
-                ON CONFLICT(hour_start, symbol, side)
-                DO UPDATE SET
-                    total_qty_usd = total_qty_usd + excluded.total_qty_usd,
-                    events_count = events_count + 1
-                """, (hour_start, r["symbol"], r["side"], r["qty"] * r["price"]))
+        except Exception as e:
+            logger.error("Flush error, %d records spilled to %s: %s", len(buf), self.spill.dir, e,
+                         exc_info=not isinstance(e, sqlite3.OperationalError))
+            self.spill.append({"rows": buf})
 
+    def _flush(self, buf):
+        """Events + rollups in one transaction (rolled back entirely on error), then hot cache / Parquet."""
+        inserted, rows = [], None
+        try:
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            # SQLite: raw events
+            inserted, duplicates = self._insert_events(buf)
+            for r in inserted:
+                self.aggregates.add_pending(r["ts"], r["symbol"], r["side"], r["qty_usd"], r["qty"])
+            # SQLite: aggregates (closed buckets, open ones every checkpoint)
+            rows = self.aggregates.drain()
+            self.aggregates.write(self.conn, rows)
             self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            if self.dictionary is not None:
+                self.dictionary.clear()  # ids of values added in this transaction are void
+            if rows is not None:
+                self.aggregates.restore(rows)
+            for r in inserted:
+                self.aggregates.add_pending(r["ts"], r["symbol"], r["side"], r["qty_usd"], r["qty"], -1)
+            raise
 
-            # Parquet
-            if self.parquet_enabled:
-                ts_str = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-                fname = os.path.join(self.parquet_dir, f"liq_{ts_str}.parquet")
-                df.to_parquet(fname, engine="pyarrow", index=False)
+        # committed: what follows must not send the batch to the spill
+        # (duplicates taken out of the windows only now: a rolled back batch is retried)
+        for r in duplicates:
+            self.aggregates.remove(r["ts"], r["symbol"], r["side"], r["price"], r["qty"])
+        if duplicates:
+            self.duplicates += len(duplicates)
+            DUPLICATES.inc(len(duplicates), writer="bybit_liquidations", stage="db")
+        try:
+            # hot cache: last event per symbol (buffer is in arrival order) + rolling 1 min totals
+            latest = {
+                f"bybit_liquidations:{r['symbol']}": {k: r[k] for k in ("ts", "side", "price", "qty", "qty_usd")}
+                for r in buf
+            }
+            for symbol in {r["symbol"] for r in buf}:
+                latest[f"bybit_liquidations_1m:{symbol}"] = self.aggregates.stats(symbol, 60)
+            state.publish_many(latest)
+        except Exception as e:
+            logger.error("State publish error: %s", e, exc_info=True)
 
-            logger.info("Flushed %s records", len(df))
+        # Parquet: the rows actually inserted (the archive's cold scan must not see duplicates)
+        if self.parquet_enabled and inserted:
+            try:
+                self._write_parquet(inserted)
+            except Exception as e:
+                logger.error("Parquet write error: %s", e, exc_info=True)
 
+    def _replay_spill(self) -> int:
+        """Spilled batches, oldest first, for at most REPLAY_BUDGET seconds (runs on the event loop)."""
+        return self.spill.drain(lambda rec: self._flush(rec["rows"]), REPLAY_BUDGET)
+
+    def _persist_rollups(self):
+        try:
+            self.aggregates.persist(self.conn)
         except Exception as e:
-            logger.error("Flush error: %s", e, exc_info=True)
+            logger.error("Aggregates flush error: %s", e, exc_info=True)
+
+    def _insert_events(self, buf) -> tuple[list, list]:
+        """INSERT buf; returns (rows inserted, rows skipped as already stored)."""
+        if self.dictionary is None:
+            sql = _INSERT
+            # spilled before v7: no exchange
+            params = [(r["ts"], r["ts_ms"], r["symbol"], r["side"], r["price"], r["qty"], r["qty_usd"], r["raw"],
+                       r.get("exchange", "bybit")) for r in buf]
+        else:
+            sql, ids = _INSERT_COMPACT, self.dictionary.id
+            params = [(ids(r["symbol"]), r["ts"], r["ts_ms"] - r["ts"] * 1000, ids(r["side"]), r["price"], r["qty"],
+                       r["qty_usd"], compact.deflate(r["raw"]), ids(r.get("exchange", "bybit"))) for r in buf]
+        cur = self.conn.cursor()
+        cur.execute("SAVEPOINT liq_insert")
+        try:
+            cur.executemany(sql.format(""), params)
+            inserted, duplicates = buf, []
+        except sqlite3.IntegrityError:
+            # unique index hit: event older than the in-memory window (restart, replay) → row by row
+            cur.execute("ROLLBACK TO liq_insert")
+            inserted, duplicates = [], []
+            for r, p in zip(buf, params):
+                cur.execute(sql.format("OR IGNORE"), p)
+                (inserted if cur.rowcount else duplicates).append(r)
+        cur.execute("RELEASE liq_insert")
+        return inserted, duplicates
+
+    def _write_parquet(self, buf):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # µs: several flushes per second under the adaptive policy
+        ts_str = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
+        fname = os.path.join(self.parquet_dir, f"liq_{ts_str}.parquet")
+        pq.write_table(pa.Table.from_pylist(buf), fname)
 
     async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
         await self.flush()
+        # open buckets too
+        try:
+            self.aggregates.persist(self.conn, force=True)
+        except Exception as e:
+            logger.error("Aggregates flush error: %s", e, exc_info=True)
+        try:
+            self.registry.release(_WRITER_PREFIX + self.writer_id, self.writer_id)
+        except sqlite3.Error as e:
+            logger.warning("Writer unregistration error: %s", e)
+        self.registry.close()
         self.conn.close()
+        self.spill.close()
         logger.info("Writer closed")
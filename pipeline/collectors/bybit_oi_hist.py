@@ -1,51 +1,207 @@
 #!/usr/bin/env python3
 """
 Bybit Open Interest & Funding history collector.
-Fetches OI/funding for BTCUSDT and ETHUSDT and stores into SQLite.
+- Pages through /v5/market/open-interest (cursor) and /v5/market/funding/history
+  (no cursor on this endpoint: pages are chained on endTime)
+- Symbols are fetched concurrently, all requests share one token bucket
+- Bulk insert with dedup on (symbol, ts) into bybit_oi_hist / bybit_funding_hist
+
+collect(conn) is incremental (resumes after the last stored ts per symbol and table).
+Backfill: python -m pipeline.collectors.bybit_oi_hist -s BTCUSDT,ETHUSDT --days 180
 """
 
-import sqlite3
+import argparse
+import asyncio
 import logging
+import sqlite3
 import time
+
 import httpx
 
+from pipeline import httpclient
+from pipeline.ratelimit import TokenBucket
+
 logger = logging.getLogger("pipeline.bybit_oi_hist")
 
-API_URL = "https://api.bybit.com/v5/market/open-interest"
+# scheduler cadence (seconds), see pipeline/scheduler.py
+INTERVAL = 3600
+JITTER = 120
+# several nodes (pipeline/leases.py): one job per shard of SYMBOLS, each paging its own
+# symbols' history (the requests are per symbol)
+SHARDS = 2
+
+OI_URL = "https://api.bybit.com/v5/market/open-interest"
+FUNDING_URL = "https://api.bybit.com/v5/market/funding/history"
 
 SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+INTERVAL_TIME = "1h"        # 5min, 15min, 30min, 1h, 4h, 1d
+PAGE_LIMIT = 200            # max allowed by both endpoints
+DEFAULT_BACKFILL_DAYS = 30  # first run of collect() on an empty table
+
+# Bybit public limit is 600 req / 5 s per IP; stay well below it
+RATE_PER_SEC = 20
+MAX_CONCURRENCY = 8
+MAX_RETRIES = 3
+
+
+async def _get(client: httpx.AsyncClient, bucket, url: str, params: dict) -> dict:
+    """GET with rate limiting; retries on 429/5xx and Bybit rate-limit retCode."""
+    for attempt in range(MAX_RETRIES + 1):
+        await bucket.acquire()
+        r = await client.get(url, params=params)
+        if r.status_code != 429 and r.status_code < 500:
+            r.raise_for_status()
+            j = r.json()
+            if j.get("retCode", 0) == 0:
+                return j.get("result") or {}
+            if j.get("retCode") != 10006:  # 10006 = too many visits
+                raise RuntimeError(f"bybit retCode={j.get('retCode')} {j.get('retMsg')}")
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(2 ** attempt)
+    raise RuntimeError(f"bybit: giving up on {url} {params}")
+
+
+async def _fetch_oi(client, bucket, symbol: str, start_ms: int, end_ms: int, interval_time: str):
+    rows = []
+    cursor = None
+    while True:
+        params = {
+            "category": "linear", "symbol": symbol, "intervalTime": interval_time,
+            "startTime": start_ms, "endTime": end_ms, "limit": PAGE_LIMIT,
+        }
+        if cursor:
+            params["cursor"] = cursor
+        result = await _get(client, bucket, OI_URL, params)
+        page = result.get("list") or []
+        rows.extend((symbol, int(p["timestamp"]) // 1000, float(p["openInterest"])) for p in page)
+        cursor = result.get("nextPageCursor")
+        if not page or not cursor:
+            return rows
+
+
+async def _fetch_funding(client, bucket, symbol: str, start_ms: int, end_ms: int):
+    rows = []
+    while end_ms >= start_ms:
+        params = {
+            "category": "linear", "symbol": symbol,
+            "startTime": start_ms, "endTime": end_ms, "limit": PAGE_LIMIT,
+        }
+        result = await _get(client, bucket, FUNDING_URL, params)
+        page = result.get("list") or []
+        if not page:
+            break
+        stamps = [int(p["fundingRateTimestamp"]) for p in page]
+        rows.extend((symbol, t // 1000, float(p["fundingRate"])) for t, p in zip(stamps, page))
+        if len(page) < PAGE_LIMIT:
+            break
+        end_ms = min(stamps) - 1  # newest first → continue before the oldest of this page
+    return rows
 
-def collect(conn: sqlite3.Connection):
+
+def _insert(conn: sqlite3.Connection, table: str, column: str, rows) -> int:
+    before = conn.total_changes
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {table} (symbol, ts, {column}) VALUES (?, ?, ?)", rows
+    )
+    return conn.total_changes - before
+
+
+async def backfill(conn: sqlite3.Connection, ranges: dict, interval_time: str = INTERVAL_TIME,
+                   client: httpx.AsyncClient | None = None, funding_ranges: dict | None = None):
     """
-    Fetch and store open interest & funding for supported symbols.
+    Fetch OI + funding history for {symbol: (start_ms, end_ms)} and store it
+    (funding_ranges: funding's own ranges, default the same).
+    Returns (oi_rows_inserted, funding_rows_inserted).
     """
-    for symbol in SYMBOLS:
-        try:
-            r = httpx.get(API_URL, params={"category": "linear", "symbol": symbol}, timeout=30.0)
-            r.raise_for_status()
-            data = r.json()
-        except Exception:
-            logger.exception("Failed to fetch Bybit OI for %s", symbol)
-            continue
-
-        try:
-            oi_value = None
-            result = data.get("result", {})
-            if isinstance(result, dict):
-                oi_data = result.get("list") or []
-                if oi_data:
-                    oi_value = float(oi_data[0].get("openInterest", 0))
-
-            ts = int(time.time())
-            cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO bybit (ts, symbol, open_interest)
-                VALUES (?, ?, ?)
-                """,
-                (ts, symbol, oi_value),
-            )
-            conn.commit()
-            logger.info("Inserted OI snapshot for %s (oi=%.2f)", symbol, oi_value or 0)
-        except Exception:
-            logger.exception("Failed to insert Bybit OI for %s", symbol)
+    bucket = TokenBucket(RATE_PER_SEC)
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    own_client = client is None
+    client = client or httpclient.async_client("bybit_oi_hist", timeout=30.0)
+
+    async def run(kind, symbol, coro):
+        async with sem:
+            try:
+                return kind, symbol, await coro
+            except Exception:
+                logger.exception("Failed to fetch Bybit %s history for %s", kind, symbol)
+                return kind, symbol, []
+
+    tasks = []
+    for symbol, (start_ms, end_ms) in ranges.items():
+        tasks.append(run("oi", symbol, _fetch_oi(client, bucket, symbol, start_ms, end_ms, interval_time)))
+    for symbol, (start_ms, end_ms) in (ranges if funding_ranges is None else funding_ranges).items():
+        tasks.append(run("funding", symbol, _fetch_funding(client, bucket, symbol, start_ms, end_ms)))
+
+    n_oi = n_funding = 0
+    try:
+        # insert each symbol's pages as soon as they arrive; one commit at the end
+        for fut in asyncio.as_completed(tasks):
+            kind, symbol, rows = await fut
+            if kind == "oi":
+                n_oi += _insert(conn, "bybit_oi_hist", "open_interest", rows)
+            else:
+                n_funding += _insert(conn, "bybit_funding_hist", "funding", rows)
+        conn.commit()
+    finally:
+        if own_client:
+            await client.aclose()
+
+    logger.info("bybit_oi_hist: %d OI rows, %d funding rows inserted (%d symbols)",
+                n_oi, n_funding, len(ranges))
+    return n_oi, n_funding
+
+
+def _resume_ranges(conn: sqlite3.Connection, symbols, default_days: int, table: str) -> dict:
+    """{symbol: (start_ms, now_ms)} resuming after the last ts stored in `table` (each table on its own)."""
+    now_ms = int(time.time() * 1000)
+    default_start = now_ms - default_days * 86400 * 1000
+    ranges = {}
+    for symbol in symbols:
+        last = conn.execute(f"SELECT MAX(ts) FROM {table} WHERE symbol=?", (symbol,)).fetchone()[0]
+        start = (last + 1) * 1000 if last is not None else default_start
+        ranges[symbol] = (start, now_ms)
+    return ranges
+
+
+def collect(conn: sqlite3.Connection, shard: tuple[int, int] | None = None):
+    """
+    Incremental OI & funding history for SYMBOLS.
+    shard=(i, n): only SYMBOLS[i::n] (same split on every node), the rest runs elsewhere.
+    """
+    symbols = SYMBOLS if shard is None else SYMBOLS[shard[0]::shard[1]]
+    if not symbols:
+        return
+    try:
+        ranges = _resume_ranges(conn, symbols, DEFAULT_BACKFILL_DAYS, "bybit_oi_hist")
+        funding = _resume_ranges(conn, symbols, DEFAULT_BACKFILL_DAYS, "bybit_funding_hist")
+        asyncio.run(backfill(conn, ranges, funding_ranges=funding))
+    except Exception:
+        logger.exception("bybit_oi_hist collect failed")
+
+
+def main():
+    from pipeline import db
+
+    parser = argparse.ArgumentParser(description="Bybit OI/funding history backfill")
+    parser.add_argument("-s", "--symbols", default=",".join(SYMBOLS),
+                        help="Liste des symboles séparés par des virgules")
+    parser.add_argument("--days", type=int, default=DEFAULT_BACKFILL_DAYS, help="Profondeur en jours")
+    parser.add_argument("--interval", default=INTERVAL_TIME, help="intervalTime OI (5min…1d)")
+    parser.add_argument("--db", default=str(db.DB_PATH), help="Fichier SQLite")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    now_ms = int(time.time() * 1000)
+    ranges = {s: (now_ms - args.days * 86400 * 1000, now_ms) for s in symbols}
+
+    conn = db.init_db(args.db)
+    t0 = time.monotonic()
+    asyncio.run(backfill(conn, ranges, interval_time=args.interval))
+    conn.close()
+    logger.info("Backfill done in %.1fs", time.monotonic() - t0)
+
+
+if __name__ == "__main__":
+    main()
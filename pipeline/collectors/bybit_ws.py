@@ -3,20 +3,25 @@
 Bybit Liquidations WebSocket Collector (v20, prod-safe)
 - Connexion WS Bybit (v5 API, spot/linear auto-détection)
 - Flush vers SQLite et Parquet
+- Détection de cascades en streaming (pipeline/cascades.py), avant l'écriture
+- Décodage / ingestion partagés avec les autres exchanges (liquidation_feeds.py :
+  BybitAdapter + Ingest)
 - Args robustes avec argparse
 """
 
 import asyncio
-import json
 import logging
 import os
 import signal
 import sys
+import time
 import argparse
 from datetime import datetime
 
 import websockets
+from pipeline import cascades, metrics, profiling
 from pipeline.collectors.bybit_liquidations import BybitLiquidationsWriter
+from pipeline.collectors.liquidation_feeds import BybitAdapter, Ingest
 
 # ---------------------------------------------------------
 # LOGGING
@@ -35,7 +40,8 @@ logger = logging.getLogger(__name__)
 class BybitWSService:
     def __init__(self, symbols, ws_url=None, db_path="data/crypto.db",
                  parquet_dir="data/bybit_liquidations", flush_size=100,
-                 flush_interval=5, subscribe_tpl="liquidation.{}"):
+                 flush_interval=5, subscribe_tpl="liquidation.{}", detector=None,
+                 latency_target=None, max_batch=5000):
         self.symbols = symbols
         self.ws_url = ws_url or self._auto_detect_url(symbols)
         self.subscribe_tpl = subscribe_tpl
@@ -47,9 +53,16 @@ class BybitWSService:
             db=db_path,
             parquet_dir=parquet_dir,
             flush_size=flush_size,
-            flush_interval=flush_interval
+            flush_interval=flush_interval,
+            latency_target=latency_target,
+            max_batch=max_batch,
         )
 
+        # detector=False: no cascade detection
+        self.detector = cascades.CascadeDetector(sinks=[cascades.LogSink()]) if detector is None else detector
+        self.adapter = BybitAdapter(symbols, subscribe_tpl)
+        self.ingest = Ingest(self.writer, self.detector)
+
         self.ws = None
         self.stop_event = asyncio.Event()
         self._reconnect_delay = 1
@@ -74,9 +87,9 @@ class BybitWSService:
                 logger.info("WS connected to %s", self.ws_url)
 
                 # subscribe
-                subs = [self.subscribe_tpl.format(sym) for sym in self.symbols]
-                await ws.send(json.dumps({"op": "subscribe", "args": subs}))
-                logger.info("WS subscribed: %s", subs)
+                for sub in self.adapter.subscribe():
+                    await ws.send(sub)
+                    logger.info("WS subscribed: %s", sub)
 
                 self._reconnect_delay = 1
 
@@ -88,6 +101,7 @@ class BybitWSService:
             raise
         except Exception as e:
             logger.warning("WS error: %s", e, exc_info=True)
+            metrics.WS_RECONNECTS.inc(service="bybit_ws")
             logger.info("Reconnecting in %s seconds...", self._reconnect_delay)
             await asyncio.sleep(self._reconnect_delay)
             self._reconnect_delay = min(self._reconnect_delay * 2, 60)
@@ -95,22 +109,12 @@ class BybitWSService:
                 await self.connect()
 
     async def _handle_message(self, raw_msg):
-        try:
-            msg = json.loads(raw_msg)
-        except json.JSONDecodeError:
-            logger.warning("Invalid JSON: %s", raw_msg)
-            return
-
-        if "topic" in msg and "data" in msg:
-            topic = msg["topic"]
-            data = msg["data"]
-
-            if topic.startswith("liquidation."):
-                if isinstance(data, dict):
-                    await self.writer.write_record(data)
-                elif isinstance(data, list):
-                    for d in data:
-                        await self.writer.write_record(d)
+        received = time.perf_counter()
+        metrics.WS_MESSAGES.inc(service="bybit_ws")
+        # v5 "liquidation.<sym>" (one record) and "allLiquidation.<sym>" (batches); other frames → None
+        batch = self.adapter.decode(raw_msg)
+        if batch:
+            await self.ingest.ingest(batch, received)
 
     async def run(self):
         logger.info("Starting BybitWSService")
@@ -122,6 +126,8 @@ class BybitWSService:
             await self.connect()
 
         await self.writer.close()
+        if self.detector:
+            self.detector.close()
         logger.info("BybitWSService stopped")
 
     async def stop(self):
@@ -130,6 +136,8 @@ class BybitWSService:
         if self.ws:
             await self.ws.close()
         await self.writer.close()
+        if self.detector:
+            self.detector.close()
 
 
 # ---------------------------------------------------------
@@ -142,12 +150,36 @@ def main():
     parser.add_argument("--ws-url", help="Endpoint WS Bybit (défaut auto spot/linear)")
     parser.add_argument("--db", dest="db_path", default="data/crypto.db", help="Fichier SQLite")
     parser.add_argument("--parquet-dir", default="data/bybit_liquidations", help="Dossier Parquet")
-    parser.add_argument("--flush-size", type=int, default=100, help="Flush après N enregistrements")
-    parser.add_argument("--flush-interval", type=int, default=5, help="Flush après N secondes")
+    parser.add_argument("--flush-size", type=int, default=100,
+                        help="Flush après N enregistrements (mode statique, --latency-target 0)")
+    parser.add_argument("--flush-interval", type=float, default=5, help="Attente max avant flush (secondes)")
+    parser.add_argument("--latency-target", type=float, default=2.0,
+                        help="Flush adaptatif : latence p99 visée événement → commit (secondes, 0 = statique)")
+    parser.add_argument("--max-batch", type=int, default=5000, help="Taille de lot max en mode adaptatif")
     parser.add_argument("--subscribe-tpl", default="liquidation.{}", help="Template de souscription")
+    parser.add_argument("--metrics-port", type=int, help="Expose les métriques Prometheus sur ce port")
+    parser.add_argument("--no-cascade", action="store_true", help="Désactive la détection de cascades")
+    parser.add_argument("--cascade-window", type=int, default=cascades.WINDOW,
+                        help="Fenêtre glissante de détection (secondes)")
+    parser.add_argument("--cascade-z", type=float, default=cascades.Z, help="Seuil de z-score")
+    parser.add_argument("--cascade-min-usd", type=float, default=cascades.MIN_NOTIONAL,
+                        help="Notionnel minimal (USD) sur la fenêtre pour alerter")
+    parser.add_argument("--cascade-webhook", help="URL (locale) recevant les alertes en POST JSON")
+    profiling.add_arguments(parser)
 
     args = parser.parse_args()
     symbols = [s.strip().upper() for s in args.symbols.split(",")]
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    profiling.configure_from_args(args)
+
+    detector = False
+    if not args.no_cascade:
+        sinks = [cascades.LogSink()]
+        if args.cascade_webhook:
+            sinks.append(cascades.WebhookSink(args.cascade_webhook))
+        detector = cascades.CascadeDetector(window=args.cascade_window, z=args.cascade_z,
+                                            min_notional=args.cascade_min_usd, sinks=sinks)
 
     svc = BybitWSService(
         symbols,
@@ -156,7 +188,10 @@ def main():
         parquet_dir=args.parquet_dir,
         flush_size=args.flush_size,
         flush_interval=args.flush_interval,
+        latency_target=args.latency_target or None,
+        max_batch=args.max_batch,
         subscribe_tpl=args.subscribe_tpl,
+        detector=detector,
     )
 
     loop = asyncio.get_event_loop()
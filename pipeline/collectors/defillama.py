@@ -1,9 +1,14 @@
-import httpx, time, logging, sqlite3
+import time, logging, sqlite3
+from pipeline import httpclient, spill, state
 LOG = logging.getLogger("pipeline.collectors.defillama")
 
+# scheduler cadence (seconds), see pipeline/scheduler.py
+INTERVAL = 600
+JITTER = 60
+
 def collect(conn: sqlite3.Connection):
     try:
-        r = httpx.get("https://stablecoins.llama.fi/stablecoins", timeout=15.0)
+        r = httpclient.get("defillama", "https://stablecoins.llama.fi/stablecoins", timeout=15.0)
         r.raise_for_status()
         data = r.json()
 
@@ -25,12 +30,9 @@ def collect(conn: sqlite3.Connection):
             elif symbol == "USDC":
                 usdc = circulating_val
 
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT OR REPLACE INTO stablecoins (ts,total,usdt,usdc) VALUES (?,?,?,?)",
-            (ts, total, usdt, usdc)
-        )
-        conn.commit()
+        spill.store(conn, "defillama", "INSERT OR REPLACE INTO stablecoins (ts,total,usdt,usdc) VALUES (?,?,?,?)",
+                    [(ts, total, usdt, usdc)])
+        state.publish("stablecoins", {"ts": ts, "total": total, "usdt": usdt, "usdc": usdc})
         LOG.info("defillama: stablecoins total=%s usdt=%s usdc=%s", total, usdt, usdc)
     except Exception:
         LOG.exception("defillama: failed")
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Multi-exchange liquidation feeds sharing one ingestion pipeline.
+
+    python -m pipeline.collectors.liquidation_feeds -x bybit,binance,okx -s BTCUSDT,ETHUSDT
+
+- Adapter (one per exchange): url, subscribe(symbols) → messages to send on connect,
+  decode(frame) → EventBatch or None (acks, pongs, other channels). Adding an exchange
+  = one Adapter subclass registered in ADAPTERS.
+- EventBatch: normalized, columnar (ts_ms / price / qty arrays, symbol / side / raw lists)
+    symbol: base + quote without separator (BTCUSDT)
+    side:   liquidated position in Bybit's convention (BUY = long liquidated)
+    price / qty: coin units (contracts converted)
+- Ingest: the shared pipeline, dedup (writer.fresh) → cascade detector → one batched
+  BybitLiquidationsWriter; every Feed of the process calls it
+- Feed: websocket loop of one adapter (reconnect with backoff, heartbeat)
+- all exchanges on one event loop (default), or one per process (-x binance, -x okx…)
+  writing to the same database (WAL, busy timeout)
+- several nodes (--coordinator, pipeline/leases.py): each exchange feed runs where its
+  lease "feed:<exchange>" is held and moves on failover (the writer's event key drops
+  what both nodes saw around the handover)
+"""
+
+import abc
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sys
+import time
+from array import array
+
+import websockets
+
+from pipeline import cascades, metrics, profiling
+from pipeline.collectors.bybit_liquidations import BybitLiquidationsWriter, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class EventBatch:
+    __slots__ = ("exchange", "ts_ms", "symbol", "side", "price", "qty", "raw")
+
+    def __init__(self, exchange: str):
+        self.exchange = exchange
+        self.ts_ms = array("q")
+        self.symbol = []
+        self.side = []
+        self.price = array("d")
+        self.qty = array("d")
+        self.raw = []
+
+    def append(self, ts_ms: int, symbol: str, side: str, price: float, qty: float, raw: str):
+        self.ts_ms.append(ts_ms)
+        self.symbol.append(symbol)
+        self.side.append(side)
+        self.price.append(price)
+        self.qty.append(qty)
+        self.raw.append(raw)
+
+    def events(self):
+        """(ts_ms, symbol, side, price, qty) per event, the writer's event key."""
+        return zip(self.ts_ms, self.symbol, self.side, self.price, self.qty)
+
+    def __len__(self) -> int:
+        return len(self.ts_ms)
+
+
+def _raw(record: dict) -> str:
+    return json.dumps(record, separators=(",", ":"))
+
+
+# -----------------------------------------------------
+# ADAPTERS
+# -----------------------------------------------------
+class Adapter(abc.ABC):
+    name = ""
+    url = ""
+    heartbeat = None  # (text frame, seconds) for exchanges that drop silent clients
+
+    def __init__(self, symbols=None):
+        # None: every symbol the channel delivers
+        self.symbols = {s.upper() for s in symbols} if symbols else None
+
+    @abc.abstractmethod
+    def subscribe(self) -> list[str]:
+        """Messages to send once connected."""
+
+    @abc.abstractmethod
+    def decode(self, frame) -> EventBatch | None:
+        """One frame → its events, None for acks, pongs and other channels."""
+
+    def _load(self, frame):
+        try:
+            return json.loads(frame)
+        except (json.JSONDecodeError, TypeError):
+            if frame != "pong":
+                logger.warning("%s: invalid JSON: %.200s", self.name, frame)
+            return None
+
+
+class BybitAdapter(Adapter):
+    """v5 public linear: "liquidation.<sym>" (one record) or "allLiquidation.<sym>" (batches)."""
+    name = "bybit"
+    url = "wss://stream.bybit.com/v5/public/linear"
+    heartbeat = ('{"op":"ping"}', 20)
+
+    def __init__(self, symbols=None, subscribe_tpl: str = "allLiquidation.{}"):
+        super().__init__(symbols)
+        self.subscribe_tpl = subscribe_tpl
+
+    def subscribe(self) -> list[str]:
+        topics = [self.subscribe_tpl.format(s) for s in sorted(self.symbols or ())]
+        return [json.dumps({"op": "subscribe", "args": topics})]
+
+    def decode(self, frame) -> EventBatch | None:
+        msg = self._load(frame)
+        if not isinstance(msg, dict) or not str(msg.get("topic", "")).startswith(("liquidation.", "allLiquidation.")):
+            return None
+        data = msg.get("data")
+        batch = EventBatch(self.name)
+        for record in data if isinstance(data, list) else [data]:
+            if not isinstance(record, dict):
+                continue
+            try:
+                event = normalize(record)
+            except (TypeError, ValueError) as e:
+                logger.error("Error parsing record: %s", e)
+                continue
+            if event is not None:
+                batch.append(*event, _raw(record))
+        return batch
+
+
+class BinanceAdapter(Adapter):
+    """USDⓈ-M futures forceOrder: <sym>@forceOrder streams, or !forceOrder@arr without symbols."""
+    name = "binance"
+    url = "wss://fstream.binance.com/ws"
+
+    def subscribe(self) -> list[str]:
+        streams = [f"{s.lower()}@forceOrder" for s in sorted(self.symbols)] if self.symbols else ["!forceOrder@arr"]
+        return [json.dumps({"method": "SUBSCRIBE", "params": streams, "id": 1})]
+
+    def decode(self, frame) -> EventBatch | None:
+        msg = self._load(frame)
+        if isinstance(msg, dict) and "stream" in msg:  # combined stream envelope
+            msg = msg.get("data")
+        if not isinstance(msg, dict) or msg.get("e") != "forceOrder":
+            return None
+        o = msg.get("o") or {}
+        try:
+            symbol = o["s"].upper()
+            price = float(o.get("ap") or 0) or float(o["p"])
+            qty = float(o.get("z") or 0) or float(o["q"])
+            ts_ms = int(o.get("T") or msg["E"])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error("binance: unusable forceOrder %s: %s", o, e)
+            return None
+        batch = EventBatch(self.name)
+        if price and qty and (self.symbols is None or symbol in self.symbols):
+            # order side: a SELL closes a long → long liquidated
+            batch.append(ts_ms, symbol, "BUY" if o.get("S") == "SELL" else "SELL", price, qty, _raw(o))
+        return batch
+
+
+class OKXAdapter(Adapter):
+    """liquidation-orders channel (all SWAP instruments); sz is in contracts → × CONTRACT_VALUES."""
+    name = "okx"
+    url = "wss://ws.okx.com:8443/ws/v5/public"
+    heartbeat = ("ping", 25)
+    # ctVal of the linear swaps (coin per contract), https://www.okx.com/api/v5/public/instruments
+    CONTRACT_VALUES = {"BTC-USDT-SWAP": 0.01, "ETH-USDT-SWAP": 0.1, "SOL-USDT-SWAP": 1.0,
+                       "XRP-USDT-SWAP": 100.0, "DOGE-USDT-SWAP": 1000.0, "BNB-USDT-SWAP": 0.01}
+
+    def __init__(self, symbols=None, contract_values: dict | None = None):
+        super().__init__(symbols)
+        self.contract_values = {**self.CONTRACT_VALUES, **(contract_values or {})}
+        self._unknown = set()
+
+    def subscribe(self) -> list[str]:
+        return [json.dumps({"op": "subscribe", "args": [{"channel": "liquidation-orders", "instType": "SWAP"}]})]
+
+    def decode(self, frame) -> EventBatch | None:
+        msg = self._load(frame)
+        if not isinstance(msg, dict) or (msg.get("arg") or {}).get("channel") != "liquidation-orders":
+            return None
+        batch = EventBatch(self.name)
+        for inst in msg.get("data") or []:
+            inst_id = inst.get("instId", "")
+            parts = inst_id.split("-")
+            if len(parts) < 2:
+                continue
+            symbol = parts[0] + parts[1]
+            if self.symbols is not None and symbol not in self.symbols:
+                continue
+            ct_val = self.contract_values.get(inst_id)
+            if ct_val is None:
+                if inst_id not in self._unknown:
+                    self._unknown.add(inst_id)
+                    logger.warning("okx: no contract value for %s, sz taken as coin quantity", inst_id)
+                ct_val = 1.0
+            for d in inst.get("details") or []:
+                try:
+                    price, qty, ts_ms = float(d["bkPx"]), float(d["sz"]) * ct_val, int(d["ts"])
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error("okx: unusable liquidation %s: %s", d, e)
+                    continue
+                pos = d.get("posSide")
+                long = pos == "long" or (pos not in ("long", "short") and d.get("side") == "sell")
+                if price and qty:
+                    batch.append(ts_ms, symbol, "BUY" if long else "SELL", price, qty, _raw({"instId": inst_id, **d}))
+        return batch
+
+
+ADAPTERS = {cls.name: cls for cls in (BybitAdapter, BinanceAdapter, OKXAdapter)}
+
+
+# -----------------------------------------------------
+# SHARED PIPELINE
+# -----------------------------------------------------
+class Ingest:
+    """dedup → cascade detector (the whole batch, before any write) → batched writer."""
+
+    def __init__(self, writer: BybitLiquidationsWriter, detector=None):
+        self.writer = writer
+        self.detector = detector
+
+    async def ingest(self, batch: EventBatch, received: float | None = None):
+        if not batch:
+            return
+        # duplicates (reconnect, replay) are dropped here: no write, no double count
+        accepted = [self.writer.fresh(e, batch.exchange) for e in batch.events()]
+        if self.detector:
+            for ok, (ts_ms, symbol, side, price, qty) in zip(accepted, batch.events()):
+                if ok:
+                    self.detector.observe(symbol, side, ts_ms, price, qty, received)
+        await self.writer.write_batch(batch, accepted)
+
+    async def close(self):
+        await self.writer.close()
+        if self.detector:
+            self.detector.close()
+
+
+class Feed:
+    """
+    Websocket loop of one adapter: subscribe, decode every frame into the shared Ingest
+    (or any object with ingest(decoded, received) / close(), e.g. mempool_ws.MempoolWriter).
+    """
+
+    def __init__(self, adapter: Adapter, ingest: Ingest, url: str | None = None):
+        self.adapter = adapter
+        self.ingest = ingest
+        self.url = url or adapter.url
+        self.service = f"{adapter.name}_ws"
+        self.ws = None
+        self.stop_event = asyncio.Event()
+        self._reconnect_delay = 1
+
+    async def handle(self, frame):
+        received = time.perf_counter()
+        metrics.WS_MESSAGES.inc(service=self.service)
+        batch = self.adapter.decode(frame)
+        if batch:
+            await self.ingest.ingest(batch, received)
+
+    async def _heartbeat(self, ws):
+        text, interval = self.adapter.heartbeat
+        while True:
+            await asyncio.sleep(interval)
+            await ws.send(text)
+
+    async def connect(self):
+        logger.info("Connecting to %s WS %s", self.adapter.name, self.url)
+        async with websockets.connect(self.url) as ws:
+            self.ws = ws
+            for msg in self.adapter.subscribe():
+                await ws.send(msg)
+            logger.info("%s WS subscribed", self.adapter.name)
+            self._reconnect_delay = 1
+            beat = asyncio.create_task(self._heartbeat(ws)) if self.adapter.heartbeat else None
+            try:
+                async for frame in ws:
+                    await self.handle(frame)
+            finally:
+                if beat is not None:
+                    beat.cancel()
+
+    async def run(self):
+        while not self.stop_event.is_set():
+            try:
+                await self.connect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("%s WS error: %s", self.adapter.name, e)
+            if self.stop_event.is_set():
+                break
+            metrics.WS_RECONNECTS.inc(service=self.service)
+            logger.info("%s: reconnecting in %s seconds...", self.adapter.name, self._reconnect_delay)
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), self._reconnect_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._reconnect_delay = min(self._reconnect_delay * 2, 60)
+
+    async def stop(self):
+        self.stop_event.set()
+        if self.ws is not None:
+            await self.ws.close()
+
+
+async def run_feeds(feeds: list[Feed], ingest: Ingest, stop: asyncio.Event):
+    """All feeds on this loop until `stop`, then the writer's final flush."""
+    tasks = [asyncio.create_task(f.run(), name=f.service) for f in feeds]
+    await stop.wait()
+    for f in feeds:
+        await f.stop()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await ingest.close()
+
+
+async def run_leased_feeds(feeds: list[Feed], ingest: Ingest, stop: asyncio.Event, coordinator,
+                           poll: float = 1.0):
+    """Like run_feeds, but a feed only runs while this node holds its lease "feed:<exchange>"."""
+    leases = {f"feed:{f.adapter.name}": f for f in feeds}
+    coordinator.want(*leases)
+    # the coordinator renews from its own thread; its first tick blocks on the backend
+    await asyncio.to_thread(coordinator.start)
+    running = {}
+
+    async def halt(name):
+        await leases[name].stop()
+        await asyncio.gather(running.pop(name), return_exceptions=True)
+
+    try:
+        while not stop.is_set():
+            for name, feed in leases.items():
+                held = coordinator.holds(name)
+                if held and name not in running:
+                    logger.info("%s: lease held, starting", name)
+                    feed.stop_event.clear()
+                    running[name] = asyncio.create_task(feed.run(), name=feed.service)
+                elif not held and name in running:
+                    logger.info("%s: lease lost, stopping", name)
+                    await halt(name)
+            try:
+                await asyncio.wait_for(stop.wait(), poll)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for name in list(running):
+            await halt(name)
+        await asyncio.to_thread(coordinator.stop)
+        await ingest.close()
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Multi-exchange liquidation collector")
+    parser.add_argument("-x", "--exchanges", default="bybit",
+                        help=f"Exchanges séparés par des virgules ({','.join(ADAPTERS)})")
+    parser.add_argument("-s", "--symbols", required=True,
+                        help="Liste des symboles séparés par des virgules (ex: BTCUSDT,ETHUSDT)")
+    parser.add_argument("--url", action="append", default=[], metavar="EXCHANGE=URL",
+                        help="Endpoint WS d'un exchange (répétable)")
+    parser.add_argument("--db", dest="db_path", default="data/crypto.db", help="Fichier SQLite")
+    parser.add_argument("--parquet-dir", default="data/bybit_liquidations", help="Dossier Parquet")
+    parser.add_argument("--no-parquet", dest="parquet", action="store_false", help="Sans écriture Parquet")
+    parser.add_argument("--flush-interval", type=float, default=5, help="Attente max avant flush (secondes)")
+    parser.add_argument("--latency-target", type=float, default=2.0,
+                        help="Flush adaptatif : latence p99 visée événement → commit (secondes)")
+    parser.add_argument("--max-batch", type=int, default=5000, help="Taille de lot max")
+    parser.add_argument("--no-cascade", action="store_true", help="Désactive la détection de cascades")
+    parser.add_argument("--metrics-port", type=int, help="Expose les métriques Prometheus sur ce port")
+    parser.add_argument("--coordinator", help="Baux partagés entre nœuds : sqlite:///chemin ou redis://hôte:6379/0")
+    parser.add_argument("--node-id", help="Identifiant du nœud (défaut hôte:pid)")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    names = [x.strip().lower() for x in args.exchanges.split(",") if x.strip()]
+    unknown = [x for x in names if x not in ADAPTERS]
+    if unknown:
+        parser.error(f"unknown exchange(s): {', '.join(unknown)}")
+    urls = dict(u.split("=", 1) for u in args.url)
+    symbols = [s.strip().upper() for s in args.symbols.split(",")]
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    profiling.configure_from_args(args)
+
+    async def run():
+        writer = BybitLiquidationsWriter(db=args.db_path, parquet_dir=args.parquet_dir,
+                                         flush_interval=args.flush_interval, parquet_enabled=args.parquet,
+                                         latency_target=args.latency_target or None, max_batch=args.max_batch)
+        detector = None if args.no_cascade else cascades.CascadeDetector(sinks=[cascades.LogSink()])
+        ingest = Ingest(writer, detector)
+        feeds = [Feed(ADAPTERS[name](symbols), ingest, urls.get(name)) for name in names]
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        logger.info("Liquidation feeds: %s (symbols=%s)", ",".join(names), ",".join(symbols))
+        if args.coordinator:
+            from pipeline import leases
+            coordinator = leases.Coordinator(leases.from_url(args.coordinator), node_id=args.node_id)
+            await run_leased_feeds(feeds, ingest, stop, coordinator)
+        else:
+            await run_feeds(feeds, ingest, stop)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,17 @@
-import httpx, time, logging, sqlite3
+import time, logging, sqlite3
+from pipeline import httpclient, spill, state
 LOG = logging.getLogger("pipeline.collectors.mempool")
 
+# scheduler cadence (seconds), see pipeline/scheduler.py
+INTERVAL = 60
+JITTER = 10
+
 def collect(conn: sqlite3.Connection):
     try:
-        r1 = httpx.get("https://mempool.space/api/v1/fees/recommended", timeout=10.0)
+        r1 = httpclient.get("mempool", "https://mempool.space/api/v1/fees/recommended", timeout=10.0)
         r1.raise_for_status()
         fees = r1.json()
-        r2 = httpx.get("https://mempool.space/api/mempool", timeout=10.0)
+        r2 = httpclient.get("mempool", "https://mempool.space/api/mempool", timeout=10.0)
         r2.raise_for_status()
         m = r2.json()
         ts = int(time.time())
@@ -15,13 +20,10 @@ def collect(conn: sqlite3.Connection):
         fee_fastest = int(fees.get("fastestFee") or fees.get("fastest") or 0)
         fee_30m = int(fees.get("halfHourFee") or fees.get("half") or 0)
 
-        cur = conn.cursor()
         # correspond au schéma migrate.py : (ts, tx_count, fee_fastest, fee_30m)
-        cur.execute(
-            "INSERT OR REPLACE INTO mempool (ts, tx_count, fee_fastest, fee_30m) VALUES (?,?,?,?)",
-            (ts, tx_count, fee_fastest, fee_30m)
-        )
-        conn.commit()
+        spill.store(conn, "mempool", "INSERT OR REPLACE INTO mempool (ts, tx_count, fee_fastest, fee_30m) VALUES (?,?,?,?)",
+                    [(ts, tx_count, fee_fastest, fee_30m)])
+        state.publish("mempool", {"ts": ts, "tx_count": tx_count, "fee_fastest": fee_fastest, "fee_30m": fee_30m})
         LOG.info("mempool: tx_count=%s | fastest=%s | 30m=%s", tx_count, fee_fastest, fee_30m)
     except Exception:
         LOG.exception("mempool: failed")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+mempool.space WebSocket collector: mempool size, fee estimates and new blocks as they happen.
+
+    python -m pipeline.collectors.mempool_ws --db data/crypto.db
+
+Replaces the REST polling of mempool.collect (fees/recommended + mempool, every minute)
+and txcount.collect (blocks, every 10 minutes) with one persistent connection
+(hashrate stays polled: the websocket has no hashrate channel).
+- MempoolAdapter: {"action": "want", "data": ["stats", "blocks"]}; stats frames carry
+  mempoolInfo + fees (fee estimates), block frames the new block, the first frame the
+  recent blocks. Runs in the liquidation feeds' Feed loop (reconnect with backoff,
+  ping heartbeat), so --coordinator leases work the same way ("feed:mempool")
+- MempoolWriter, batched and down-sampled:
+    hot cache (state "mempool" / "txcount_btc"): every sample, on receipt
+    mempool table: the last sample of each --resolution bucket, at its own ts
+    txcount_btc: one row per new block height (the blocks resent on reconnect are skipped)
+  closed buckets and blocks are written every --flush-interval (spill.store: spilled
+  and replayed like the polling collectors' rows when the database is unavailable)
+- run with it: python main.py --mempool-ws (the one-shot / daemon runs skip mempool)
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sqlite3
+import sys
+import time
+
+from pipeline import db, metrics, profiling, schema, spill, state
+from pipeline.collectors.liquidation_feeds import Adapter, Feed, run_feeds, run_leased_feeds
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION = 10
+FLUSH_INTERVAL = 5.0
+
+_INSERT_MEMPOOL = "INSERT OR REPLACE INTO mempool (ts, tx_count, fee_fastest, fee_30m) VALUES (?,?,?,?)"
+_INSERT_TXCOUNT = "INSERT OR REPLACE INTO txcount_btc (ts, tx_count) VALUES (?, ?)"
+
+
+class MempoolAdapter(Adapter):
+    """mempool.space /api/v1/ws: decode(frame) → {"stats": {...}, "block": {...}} or None."""
+    name = "mempool"
+    url = "wss://mempool.space/api/v1/ws"
+    heartbeat = ('{"action":"ping"}', 30)
+
+    def subscribe(self) -> list[str]:
+        return [json.dumps({"action": "want", "data": ["stats", "blocks"]})]
+
+    def decode(self, frame) -> dict | None:
+        msg = self._load(frame)
+        if not isinstance(msg, dict):
+            return None
+        update = {}
+        info, fees = msg.get("mempoolInfo"), msg.get("fees")
+        if isinstance(info, dict) or isinstance(fees, dict):
+            info, fees = info or {}, fees or {}
+            update["stats"] = {
+                "tx_count": int(info.get("size") or info.get("count") or 0),
+                "vsize": info.get("bytes"),
+                "fee_fastest": float(fees.get("fastestFee") or 0),
+                "fee_30m": float(fees.get("halfHourFee") or 0),
+                "fee_1h": float(fees.get("hourFee") or 0),
+                "fee_economy": float(fees.get("economyFee") or 0),
+                "fee_minimum": float(fees.get("minimumFee") or 0),
+            }
+        # "block": mined since the subscription; "blocks": the recent ones, sent on connect
+        blocks = [msg["block"]] if isinstance(msg.get("block"), dict) else msg.get("blocks")
+        if isinstance(blocks, list):
+            blocks = [b for b in blocks if isinstance(b, dict) and "height" in b and "tx_count" in b]
+            if blocks:
+                latest = max(blocks, key=lambda b: b["height"])
+                update["block"] = {"height": int(latest["height"]), "tx_count": int(latest["tx_count"])}
+        return update or None
+
+
+# -----------------------------------------------------
+# WRITER
+# -----------------------------------------------------
+class MempoolWriter:
+    """Feed's ingest side: every sample to the hot cache, down-sampled batches to SQLite."""
+
+    def __init__(self, db_path=db.DB_PATH, resolution: int = RESOLUTION, flush_interval: float = FLUSH_INTERVAL):
+        self.resolution = max(int(resolution), 1)
+        self.flush_interval = flush_interval
+        self.conn = db.get_conn(db_path)
+        schema.migrate(self.conn)
+        self.buckets = {}  # bucket start → last mempool row of that bucket
+        self.blocks = []   # txcount_btc rows
+        self.height = None
+        self.samples = 0
+        self._timer = None
+        logger.info("MempoolWriter initialized (db=%s resolution=%ss flush=%ss)", db_path, self.resolution,
+                    flush_interval)
+
+    async def ingest(self, update: dict, received: float | None = None):
+        ts = int(time.time())
+        published = {}
+        stats = update.get("stats")
+        if stats is not None:
+            self.samples += 1
+            self.buckets[ts - ts % self.resolution] = (ts, stats["tx_count"], stats["fee_fastest"], stats["fee_30m"])
+            published["mempool"] = {"ts": ts, **stats}
+        block = update.get("block")
+        if block is not None and (self.height is None or block["height"] > self.height):
+            self.height = block["height"]
+            self.blocks.append((ts, block["tx_count"]))
+            published["txcount_btc"] = {"ts": ts, **block}
+        state.publish_many(published)
+        metrics.WRITER_BUFFER.set(len(self.buckets) + len(self.blocks), writer="mempool")
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().create_task(self._flush_timer())
+
+    async def _flush_timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Flush error: %s", e, exc_info=True)
+
+    def flush(self, everything: bool = False):
+        """Write the closed buckets (all of them with everything=True) and the new blocks."""
+        now = int(time.time())
+        open_bucket = now - now % self.resolution
+        closed = sorted(b for b in self.buckets if everything or b < open_bucket)
+        rows = [self.buckets.pop(b) for b in closed]
+        blocks, self.blocks = self.blocks, []
+        if not rows and not blocks:
+            return
+        t0 = time.perf_counter()
+        with profiling.stage("mempool_ws.flush"):
+            if rows:
+                spill.store(self.conn, "mempool", _INSERT_MEMPOOL, rows, spill.REPLAY_BUDGET)
+            if blocks:
+                spill.store(self.conn, "txcount", _INSERT_TXCOUNT, blocks, spill.REPLAY_BUDGET)
+        metrics.WRITER_FLUSH_SECONDS.observe(time.perf_counter() - t0, writer="mempool")
+        metrics.WRITER_FLUSHED.inc(len(rows) + len(blocks), writer="mempool")
+        metrics.WRITER_BUFFER.set(len(self.buckets), writer="mempool")
+        logger.debug("mempool: %d row(s), %d block(s) written", len(rows), len(blocks))
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        try:
+            self.flush(everything=True)
+        except sqlite3.Error as e:
+            logger.error("Final flush error: %s", e, exc_info=True)
+        self.conn.close()
+        logger.info("MempoolWriter closed (%d samples)", self.samples)
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="mempool.space WebSocket collector")
+    parser.add_argument("--url", default=MempoolAdapter.url, help="Endpoint WS mempool.space")
+    parser.add_argument("--db", dest="db_path", default=str(db.DB_PATH), help="Fichier SQLite")
+    parser.add_argument("--resolution", type=int, default=RESOLUTION,
+                        help="Sous-échantillonnage : une ligne mempool par intervalle (secondes)")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                        help="Écriture des lignes en attente toutes les N secondes")
+    parser.add_argument("--metrics-port", type=int, help="Expose les métriques Prometheus sur ce port")
+    parser.add_argument("--coordinator", help="Baux partagés entre nœuds : sqlite:///chemin ou redis://hôte:6379/0")
+    parser.add_argument("--node-id", help="Identifiant du nœud (défaut hôte:pid)")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    profiling.configure_from_args(args)
+
+    async def run():
+        writer = MempoolWriter(args.db_path, args.resolution, args.flush_interval)
+        feeds = [Feed(MempoolAdapter(), writer, args.url)]
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        if args.coordinator:
+            from pipeline import leases
+            coordinator = leases.Coordinator(leases.from_url(args.coordinator), node_id=args.node_id)
+            await run_leased_feeds(feeds, writer, stop, coordinator)
+        else:
+            await run_feeds(feeds, writer, stop)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
-import httpx, csv, io, time, logging, sqlite3
+import csv, io, time, logging, sqlite3
 LOG = logging.getLogger("pipeline.collectors.sopr")
 
 URL = "https://bitcoin-data.com/v1/sopr/csv"
 # Persisted rate-limit: 4 req/hour -> min interval 3600/4 = 900s
+MIN_FETCH_INTERVAL = 900
 
+# scheduler cadence (seconds), see pipeline/scheduler.py
+# (the scheduler counts from the end of a run, so it never hits the throttle above)
+INTERVAL = MIN_FETCH_INTERVAL
+JITTER = 60
+
+from pipeline import httpclient, spill, state
 from pipeline.db import get_meta, set_meta
 
 def collect(conn: sqlite3.Connection):
@@ -12,12 +19,12 @@ def collect(conn: sqlite3.Connection):
         now = int(time.time())
         if last:
             try:
-                if now - int(last) < 900:
+                if now - int(last) < MIN_FETCH_INTERVAL:
                     LOG.warning("sopr: skipped to respect rate limit (last fetch too recent)")
                     return
             except Exception:
                 pass
-        r = httpx.get(URL, timeout=20.0)
+        r = httpclient.get("sopr", URL, timeout=20.0)
         if r.status_code != 200:
             LOG.warning("sopr: HTTP %s", r.status_code)
             return
@@ -43,9 +50,9 @@ def collect(conn: sqlite3.Connection):
             except Exception:
                 continue
         if last_val is not None:
-            cur = conn.cursor()
-            cur.execute("INSERT OR REPLACE INTO sopr (ts,value) VALUES (?,?)", (last_ts or int(time.time()), last_val))
-            conn.commit()
+            spill.store(conn, "sopr", "INSERT OR REPLACE INTO sopr (ts,value) VALUES (?,?)",
+                        [(last_ts or int(time.time()), last_val)])
+            state.publish("sopr", {"ts": last_ts or int(time.time()), "value": last_val})
             set_meta(conn, "sopr_last_fetch", str(int(time.time())))
             LOG.info("sopr: %.4f", last_val)
         else:
@@ -1,24 +1,21 @@
-import httpx
 import logging
 import sqlite3
 from datetime import datetime
+from pipeline import httpclient, spill, state
 
 logger = logging.getLogger("pipeline.collectors.txcount")
 
+# scheduler cadence (seconds), see pipeline/scheduler.py
+INTERVAL = 600
+JITTER = 60
+
 URL_BTC = "https://mempool.space/api/blocks"
 
 def collect(conn: sqlite3.Connection):
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS txcount_btc (
-            ts INTEGER PRIMARY KEY,
-            tx_count INTEGER NOT NULL
-        )
-    """)
     ts = int(datetime.utcnow().timestamp())
     tx_count = None
     try:
-        r = httpx.get(URL_BTC, timeout=10)
+        r = httpclient.get("txcount", URL_BTC, timeout=10)
         r.raise_for_status()
         block = r.json()[0]  # dernier bloc
         tx_count = block.get("tx_count")
@@ -26,8 +23,9 @@ def collect(conn: sqlite3.Connection):
         logger.error(f"txcount fetch error: {e}")
 
     if tx_count is not None:
-        cur.execute("INSERT OR REPLACE INTO txcount_btc (ts, tx_count) VALUES (?, ?)", (ts, tx_count))
-        conn.commit()
+        spill.store(conn, "txcount", "INSERT OR REPLACE INTO txcount_btc (ts, tx_count) VALUES (?, ?)",
+                    [(ts, tx_count)])
+        state.publish("txcount_btc", {"ts": ts, "tx_count": tx_count})
         logger.info(f"txcount BTC: {tx_count}")
     else:
         logger.warning("txcount skipped (no valid value)")
@@ -0,0 +1,426 @@
+"""
+pipeline/compact.py
+Optional compact storage layout for the repetitive time-series tables.
+
+    python -m pipeline.compact --db data/crypto.db            # row layout → compact (+ VACUUM)
+    python -m pipeline.compact --db data/crypto.db --expand   # back to the row layout
+
+- dictionary (id, value): symbols, sides, exchanges and signal names as small integer ids;
+  Dictionary = in-process value ↔ id cache (ids never change once assigned)
+- <table>_data: WITHOUT ROWID, clustered on (symbol_id, ts) (signals: (name_id, ts)),
+  plus a (ts) index for cross-symbol ranges / latest-row lookups; no autoincrement id
+- bybit_liquidations_data: ts split into ts (s) + ms, side/exchange as ids, and raw as a
+  raw-deflate BLOB with a preset dictionary of Bybit field names (deflate()/inflate())
+- coingecko, bybit, signals, bybit_liquidations stay readable and writable by their
+  old names: views with the original columns (minus `id`) and INSTEAD OF INSERT
+  triggers, so collectors, query/API readers and exports keep their SQL. The
+  liquidation writer inserts into the _data table directly (Dictionary + deflate).
+- the views call inflate() / the triggers deflate(): pipeline.db connections register
+  both (register(conn)); outside the pipeline, read the _data tables
+- coingecko/bybit had no key: one row per (symbol, ts) is kept, the latest one
+- table_versions (name, version): bumped by triggers on every insert / update / delete
+  of a _data table, the change marker of query.watermark_sql (no rowid to take MAX of,
+  and late or replaced rows don't move MAX(ts))
+
+Schema migrations that alter these four tables must handle both layouts (is_compact()).
+"""
+
+import logging
+import sqlite3
+import zlib
+
+LOG = logging.getLogger("pipeline.compact")
+
+TABLES = ("coingecko", "bybit", "signals", "bybit_liquidations")
+
+# view columns without a declared type (expressions): pipeline.query reads them with these
+VIEW_TYPES = {"bybit_liquidations": {"raw": "TEXT", "ts_ms": "INTEGER"}}
+
+# -----------------------------------------------------
+# RAW PAYLOADS
+# -----------------------------------------------------
+# raw deflate (no zlib header/checksum) primed with the usual Bybit liquidation keys and
+# values: a ~100-byte JSON event has nothing to back-reference on its own.
+# Never edit _ZDICT_V1: stored payloads need it to decompress; add a new version byte instead.
+_V1 = b"\x01"
+_ZDICT_V1 = (b'"updatedTime":1700000000000,"symbol":"BTCUSDT","side":"Sell","price":"","size":"0.'
+             b'{"T":1700000000000,"s":"ETHUSDT","S":"Buy","v":"0.","p":"')
+
+
+def deflate(text: str | None) -> bytes | None:
+    if text is None:
+        return None
+    c = zlib.compressobj(9, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, _ZDICT_V1)
+    return _V1 + c.compress(text.encode()) + c.flush()
+
+
+def inflate(blob: bytes | None) -> str | None:
+    if blob is None or isinstance(blob, str):
+        return blob
+    if blob[:1] != _V1:
+        raise ValueError(f"unknown raw payload version {blob[:1]!r}")
+    d = zlib.decompressobj(-15, _ZDICT_V1)
+    return (d.decompress(blob[1:]) + d.flush()).decode()
+
+
+def register(conn: sqlite3.Connection):
+    """SQL functions used by the compact views / triggers (harmless on the row layout)."""
+    conn.create_function("deflate", 1, deflate, deterministic=True)
+    conn.create_function("inflate", 1, inflate, deterministic=True)
+
+
+def is_compact(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'bybit_liquidations_data'").fetchone() is not None
+
+
+# -----------------------------------------------------
+# DICTIONARY
+# -----------------------------------------------------
+class Dictionary:
+    """
+    value ↔ id over the dictionary table, cached in process.
+    A new value is inserted in the caller's transaction: clear() after a rollback,
+    the id it got may be handed to another value later.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._ids = {}
+        self._values = {}
+
+    def id(self, value: str) -> int:
+        i = self._ids.get(value)
+        if i is None:
+            self.conn.execute(_DICT_ADD.format("?"), (value, value))
+            i = self.conn.execute("SELECT id FROM dictionary WHERE value = ?", (value,)).fetchone()[0]
+            self._ids[value] = i
+            self._values[i] = value
+        return i
+
+    def value(self, i: int) -> str:
+        v = self._values.get(i)
+        if v is None:
+            v = self.conn.execute("SELECT value FROM dictionary WHERE id = ?", (i,)).fetchone()[0]
+            self._ids[v] = i
+            self._values[i] = v
+        return v
+
+    def clear(self):
+        self._ids.clear()
+        self._values.clear()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+# never conflicts, so the conflict policy of an outer INSERT OR REPLACE (applied to
+# trigger statements) can't renumber an existing value
+_DICT_ADD = "INSERT INTO dictionary (value) SELECT {0} WHERE NOT EXISTS (SELECT 1 FROM dictionary WHERE value = {0})"
+
+
+def _dict_id(expr: str) -> str:
+    return f"(SELECT id FROM dictionary WHERE value = {expr})"
+
+
+# -----------------------------------------------------
+# LAYOUTS
+# -----------------------------------------------------
+# compact: data table DDL, view, trigger body, copy from the row table (alias r)
+_COMPACT = {
+    "coingecko": (
+        """
+        CREATE TABLE coingecko_data (
+            symbol_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            price_usd REAL NOT NULL,
+            PRIMARY KEY (symbol_id, ts)
+        ) WITHOUT ROWID
+        """,
+        "SELECT d.ts AS ts, s.value AS symbol, d.price_usd AS price_usd "
+        "FROM coingecko_data d JOIN dictionary s ON s.id = d.symbol_id",
+        f"""
+        {_DICT_ADD.format("NEW.symbol")};
+        INSERT OR REPLACE INTO coingecko_data (symbol_id, ts, price_usd)
+        VALUES ({_dict_id("NEW.symbol")}, NEW.ts, NEW.price_usd);
+        """,
+        "SELECT s.id, r.ts, r.price_usd FROM coingecko r JOIN dictionary s ON s.value = r.symbol ORDER BY r.id",
+    ),
+    "bybit": (
+        """
+        CREATE TABLE bybit_data (
+            symbol_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            funding REAL,
+            open_interest REAL,
+            PRIMARY KEY (symbol_id, ts)
+        ) WITHOUT ROWID
+        """,
+        "SELECT d.ts AS ts, s.value AS symbol, d.funding AS funding, d.open_interest AS open_interest "
+        "FROM bybit_data d JOIN dictionary s ON s.id = d.symbol_id",
+        f"""
+        {_DICT_ADD.format("NEW.symbol")};
+        INSERT OR REPLACE INTO bybit_data (symbol_id, ts, funding, open_interest)
+        VALUES ({_dict_id("NEW.symbol")}, NEW.ts, NEW.funding, NEW.open_interest);
+        """,
+        "SELECT s.id, r.ts, r.funding, r.open_interest FROM bybit r JOIN dictionary s ON s.value = r.symbol "
+        "ORDER BY r.id",
+    ),
+    "signals": (
+        """
+        CREATE TABLE signals_data (
+            name_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            value REAL,
+            classification TEXT,
+            PRIMARY KEY (name_id, ts)
+        ) WITHOUT ROWID
+        """,
+        "SELECT d.ts AS ts, n.value AS name, d.value AS value, d.classification AS classification "
+        "FROM signals_data d JOIN dictionary n ON n.id = d.name_id",
+        f"""
+        {_DICT_ADD.format("NEW.name")};
+        INSERT INTO signals_data (name_id, ts, value, classification)
+        VALUES ({_dict_id("NEW.name")}, NEW.ts, NEW.value, NEW.classification);
+        """,
+        "SELECT n.id, r.ts, r.value, r.classification FROM signals r JOIN dictionary n ON n.value = r.name",
+    ),
+    "bybit_liquidations": (
+        """
+        CREATE TABLE bybit_liquidations_data (
+            symbol_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,               -- epoch seconds UTC
+            ms INTEGER NOT NULL,               -- exchange ts_ms - ts * 1000
+            side_id INTEGER NOT NULL,
+            price REAL NOT NULL,
+            qty REAL NOT NULL,
+            qty_usd REAL,
+            raw BLOB,                          -- deflate(raw JSON)
+            exchange_id INTEGER NOT NULL,
+            PRIMARY KEY (symbol_id, ts, ms, side_id, price, qty, exchange_id)
+        ) WITHOUT ROWID
+        """,
+        "SELECT d.ts AS ts, s.value AS symbol, sd.value AS side, d.price AS price, d.qty AS qty, "
+        "d.qty_usd AS qty_usd, inflate(d.raw) AS raw, d.ts * 1000 + d.ms AS ts_ms, x.value AS exchange "
+        "FROM bybit_liquidations_data d JOIN dictionary s ON s.id = d.symbol_id "
+        "JOIN dictionary sd ON sd.id = d.side_id JOIN dictionary x ON x.id = d.exchange_id",
+        # plain INSERT: a duplicate event aborts (unique event key), as with the row table
+        f"""
+        {_DICT_ADD.format("NEW.symbol")};
+        {_DICT_ADD.format("NEW.side")};
+        {_DICT_ADD.format("COALESCE(NEW.exchange, 'bybit')")};
+        INSERT INTO bybit_liquidations_data (symbol_id, ts, ms, side_id, price, qty, qty_usd, raw, exchange_id)
+        VALUES ({_dict_id("NEW.symbol")}, NEW.ts, COALESCE(NEW.ts_ms - NEW.ts * 1000, 0),
+                {_dict_id("NEW.side")}, NEW.price, NEW.qty, NEW.qty_usd, deflate(NEW.raw),
+                {_dict_id("COALESCE(NEW.exchange, 'bybit')")});
+        """,
+        "SELECT s.id, r.ts, COALESCE(r.ts_ms - r.ts * 1000, 0), sd.id, COALESCE(r.price, 0), COALESCE(r.qty, 0), "
+        "r.qty_usd, deflate(r.raw), x.id FROM bybit_liquidations r JOIN dictionary s ON s.value = r.symbol "
+        "JOIN dictionary sd ON sd.value = r.side JOIN dictionary x ON x.value = r.exchange",
+    ),
+}
+
+# row layout (pipeline/schema.py as of v7), for --expand
+_ROWS = {
+    "coingecko": (
+        """
+        CREATE TABLE coingecko (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            price_usd REAL NOT NULL
+        )
+        """,
+        "ts, symbol, price_usd",
+        ["CREATE INDEX idx_coingecko_ts ON coingecko (ts)",
+         "CREATE INDEX idx_coingecko_symbol_ts ON coingecko (symbol, ts, price_usd)"],
+    ),
+    "bybit": (
+        """
+        CREATE TABLE bybit (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            funding REAL,
+            open_interest REAL
+        )
+        """,
+        "ts, symbol, funding, open_interest",
+        ["CREATE INDEX idx_bybit_ts ON bybit (ts)",
+         "CREATE INDEX idx_bybit_symbol_ts ON bybit (symbol, ts, funding, open_interest)"],
+    ),
+    "signals": (
+        """
+        CREATE TABLE signals (
+            ts INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value REAL,
+            classification TEXT,
+            PRIMARY KEY (ts, name)
+        )
+        """,
+        "ts, name, value, classification",
+        ["CREATE INDEX idx_signals_name_ts ON signals (name, ts)"],
+    ),
+    "bybit_liquidations": (
+        """
+        CREATE TABLE bybit_liquidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,               -- epoch seconds UTC
+            symbol TEXT NOT NULL,
+            side TEXT NOT NULL,
+            price REAL,
+            qty REAL,
+            qty_usd REAL,
+            raw TEXT,
+            ts_ms INTEGER,
+            exchange TEXT NOT NULL DEFAULT 'bybit'
+        )
+        """,
+        "ts, symbol, side, price, qty, qty_usd, raw, ts_ms, exchange",
+        ["CREATE INDEX idx_bybit_liquidations_ts ON bybit_liquidations (ts)",
+         "CREATE INDEX idx_bybit_liquidations_symbol_ts ON bybit_liquidations (symbol, ts)",
+         "CREATE UNIQUE INDEX idx_bybit_liquidations_event "
+         "ON bybit_liquidations (ts_ms, symbol, side, price, qty, exchange)"],
+    ),
+}
+
+
+# -----------------------------------------------------
+# CONVERSIONS
+# -----------------------------------------------------
+def _begin(conn: sqlite3.Connection):
+    from pipeline import schema
+
+    schema.migrate(conn)
+    register(conn)
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+
+
+def _create_view(conn: sqlite3.Connection, table: str):
+    _, view, trigger, _ = _COMPACT[table]
+    conn.execute(f"CREATE INDEX idx_{table}_data_ts ON {table}_data (ts)")
+    conn.execute(f"CREATE VIEW {table} AS {view}")
+    conn.execute(f"CREATE TRIGGER {table}_insert INSTEAD OF INSERT ON {table} BEGIN {trigger} END")
+    _create_counter(conn, table)
+
+
+def _create_counter(conn: sqlite3.Connection, table: str):
+    conn.execute("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_data_{event.lower()} AFTER {event} ON {table}_data "
+                     f"BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END")
+
+
+def create_counters(conn: sqlite3.Connection):
+    """table_versions + its triggers on an existing compact layout (schema migration v8)."""
+    for table in TABLES:
+        _create_counter(conn, table)
+
+
+def rebuild(conn: sqlite3.Connection, table: str, copy: str):
+    """
+    Schema migrations on the compact layout: recreate <table>_data with its current DDL
+    (+ index, view, trigger); copy = SELECT of the new columns FROM {table}_old.
+    """
+    conn.execute(f"DROP VIEW {table}")
+    conn.execute(f"ALTER TABLE {table}_data RENAME TO {table}_old")
+    conn.execute(_COMPACT[table][0])
+    conn.execute(f"INSERT INTO {table}_data {copy}")
+    conn.execute(f"DROP TABLE {table}_old")
+    _create_view(conn, table)
+
+
+def compact(conn: sqlite3.Connection) -> dict:
+    """Row layout → compact layout, in one transaction. Returns {table: rows}; {} if already compact."""
+    _begin(conn)
+    try:
+        if is_compact(conn):
+            conn.rollback()
+            return {}
+        conn.execute("CREATE TABLE IF NOT EXISTS dictionary (id INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE)")
+        conn.execute("INSERT OR IGNORE INTO dictionary (value) "
+                     "SELECT symbol FROM coingecko UNION SELECT symbol FROM bybit "
+                     "UNION SELECT symbol FROM bybit_liquidations UNION SELECT side FROM bybit_liquidations "
+                     "UNION SELECT exchange FROM bybit_liquidations UNION SELECT name FROM signals")
+        counts = {}
+        for table, (ddl, _, _, copy) in _COMPACT.items():
+            before = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            conn.execute(ddl)
+            # OR REPLACE: the latest row wins for keyless coingecko/bybit
+            conn.execute(f"INSERT OR REPLACE INTO {table}_data {copy}")
+            conn.execute(f"DROP TABLE {table}")
+            _create_view(conn, table)
+            counts[table] = conn.execute(f"SELECT count(*) FROM {table}_data").fetchone()[0]
+            if counts[table] != before:
+                LOG.info("Compact: %s %d → %d rows (duplicate keys merged)", table, before, counts[table])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return counts
+
+
+def expand(conn: sqlite3.Connection) -> dict:
+    """Compact layout → row layout (new ids in ts order). Returns {table: rows}; {} if not compact."""
+    _begin(conn)
+    try:
+        if not is_compact(conn):
+            conn.rollback()
+            return {}
+        counts = {}
+        for table, (ddl, cols, indexes) in _ROWS.items():
+            conn.execute(f"ALTER TABLE {table}_data RENAME TO {table}_compact")
+            conn.execute(f"DROP VIEW {table}")  # and its trigger
+            conn.execute(ddl)
+            view = _COMPACT[table][1].replace(f"{table}_data", f"{table}_compact")
+            conn.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM ({view}) ORDER BY ts")
+            conn.execute(f"DROP TABLE {table}_compact")
+            for stmt in indexes:
+                conn.execute(stmt)
+            counts[table] = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        conn.execute("DROP TABLE dictionary")
+        conn.execute("DROP TABLE IF EXISTS table_versions")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return counts
+
+
+# -----------------------------------------------------
+# CLI
+# -----------------------------------------------------
+def main():
+    import argparse
+
+    from pipeline import db
+
+    parser = argparse.ArgumentParser(description="Compact storage layout (dictionary ids, WITHOUT ROWID)")
+    parser.add_argument("--db", default=str(db.DB_PATH), help="Fichier SQLite")
+    parser.add_argument("--expand", action="store_true", help="Revient au schéma en lignes")
+    parser.add_argument("--no-vacuum", dest="vacuum", action="store_false",
+                        help="Sans VACUUM (le fichier ne rétrécit pas)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    conn = db.get_conn(args.db)
+    try:
+        counts = expand(conn) if args.expand else compact(conn)
+        if not counts:
+            LOG.info("%s already uses the %s layout", args.db, "row" if args.expand else "compact")
+            return
+        for table, n in counts.items():
+            LOG.info("%-20s %d rows", table, n)
+        if args.vacuum:
+            conn.execute("VACUUM")
+        LOG.info("✅ %s: %s layout", args.db, "row" if args.expand else "compact")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,116 +1,181 @@
 """
 pipeline/db.py
-Database utilities: initialization, autorepair, pragmas.
-Provides helper functions for meta storage and schema compatibility.
+Database utilities: initialization, pragmas.
+Provides helper functions for meta storage; the schema itself lives in pipeline/schema.py
+(optional compact layout: pipeline/compact.py).
+- get_conn(): writer connection (WAL, synchronous=NORMAL, busy timeout, cache, mmap)
+- get_readonly_conn() / ReadPool: mode=ro readers with the same cache/mmap settings
+- ConnectionManager: one writer + reader pool + periodic PASSIVE wal_checkpoint
 """
 
 import sqlite3
 import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from pipeline import compact, schema
+from pipeline.metrics import COMMIT_SECONDS, WAL_FRAMES
+
 DB_PATH = Path("data/crypto.db")
 LOG = logging.getLogger("pipeline.db")
 
-# --- DDL definitions for autorepair ---
-_DDL = {
-    "metrics": """
-    CREATE TABLE IF NOT EXISTS metrics (
-        ts INTEGER PRIMARY KEY,
-        sopr REAL,
-        stablecoins REAL,
-        mempool_tx_count INTEGER,
-        mempool_fee_fastest REAL,
-        fng INTEGER,
-        oi_btc REAL,
-        oi_eth REAL,
-        funding_btc REAL,
-        funding_eth REAL
-    );
-    """,
-    "coingecko": """
-    CREATE TABLE IF NOT EXISTS coingecko (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        price_usd REAL NOT NULL
-    );
-    """,
-    "bybit": """
-    CREATE TABLE IF NOT EXISTS bybit (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        funding REAL,
-        open_interest REAL
-    );
-    """,
-    "sopr": """
-    CREATE TABLE IF NOT EXISTS sopr (
-        ts INTEGER PRIMARY KEY,
-        value REAL
-    );
-    """,
-    "altme": """
-    CREATE TABLE IF NOT EXISTS altme (
-        ts INTEGER PRIMARY KEY,
-        fng INTEGER
-    );
-    """,
-    "mempool": """
-    CREATE TABLE IF NOT EXISTS mempool (
-        ts INTEGER PRIMARY KEY,
-        tx_count INTEGER,
-        fee_fastest REAL,
-        fee_30m REAL
-    );
-    """,
-    "stablecoins": """
-    CREATE TABLE IF NOT EXISTS stablecoins (
-        ts INTEGER PRIMARY KEY,
-        total REAL,
-        usdt REAL,
-        usdc REAL
-    );
-    """,
-    "bybit_liquidations": """
-    CREATE TABLE IF NOT EXISTS bybit_liquidations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        side TEXT NOT NULL,
-        price REAL,
-        qty REAL,
-        qty_usd REAL,
-        raw TEXT
-    );
-    """,
-    "bybit_liquidations_hourly": """
-    CREATE TABLE IF NOT EXISTS bybit_liquidations_hourly (
-        hour_start INTEGER NOT NULL,
-        symbol TEXT NOT NULL,
-        side TEXT NOT NULL,
-        total_qty_usd REAL NOT NULL DEFAULT 0,
-        events_count INTEGER NOT NULL DEFAULT 0,
-        PRIMARY KEY (hour_start, symbol, side)
-    );
-    """,
-    "meta": """
-    CREATE TABLE IF NOT EXISTS meta (
-        key TEXT PRIMARY KEY,
-        value TEXT
-    );
-    """
-}
-
 # --- Connection factory with pragmas ---
-def get_conn(path: str | Path = DB_PATH) -> sqlite3.Connection:
+# page cache per connection (negative = KiB), memory-mapped reads, wait instead of "database is locked"
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+BUSY_TIMEOUT_MS = 5000
+# seconds between two PASSIVE checkpoints in long-running processes
+CHECKPOINT_INTERVAL = 300
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.Connection recording COMMIT durations (pipeline_sqlite_commit_seconds)."""
+
+    def commit(self):
+        t0 = time.perf_counter()
+        super().commit()
+        COMMIT_SECONDS.observe(time.perf_counter() - t0)
+
+def _tune(conn: sqlite3.Connection):
+    """Pragmas and SQL functions shared by writer and readers (per-connection settings)."""
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS};")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB};")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    # inflate()/deflate() for the compact layout views (pipeline/compact.py)
+    compact.register(conn)
+
+def get_conn(path: str | Path = DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
     """Open SQLite connection with safe pragmas."""
-    conn = sqlite3.connect(str(path), detect_types=sqlite3.PARSE_DECLTYPES)
+    conn = sqlite3.connect(str(path), detect_types=sqlite3.PARSE_DECLTYPES, factory=TimedConnection,
+                           check_same_thread=check_same_thread, timeout=BUSY_TIMEOUT_MS / 1000)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
     conn.execute("PRAGMA foreign_keys=ON;")
+    _tune(conn)
+    return conn
+
+def get_readonly_conn(path: str | Path = DB_PATH) -> sqlite3.Connection:
+    """Read-only connection (mode=ro): never takes the write lock, safe next to WAL writers."""
+    uri = f"file:{Path(path).resolve().as_posix()}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA query_only=ON;")
+    _tune(conn)
     return conn
 
+def checkpoint(conn: sqlite3.Connection, mode: str = "PASSIVE") -> tuple[int, int, int]:
+    """wal_checkpoint → (busy, wal frames, frames checkpointed); PASSIVE never blocks readers/writers."""
+    busy, log, done = conn.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+    WAL_FRAMES.set(max(log - done, 0))
+    return busy, log, done
+
+class ReadPool:
+    """
+    Fixed-size pool of read-only connections, usable from worker threads.
+    Exhaust or close cursors before releasing: a half-read cursor keeps its WAL
+    snapshot open and stops checkpoints from going past it.
+    """
+
+    def __init__(self, path: str | Path = DB_PATH, size: int = 4):
+        self.path = path
+        self._pool: queue.Queue = queue.Queue()
+        for _ in range(size):
+            self._pool.put(get_readonly_conn(path))
+
+    def acquire(self) -> sqlite3.Connection:
+        return self._pool.get()
+
+    def release(self, conn: sqlite3.Connection):
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+class ConnectionManager:
+    """
+    One writer connection + a pool of read-only connections on the same database.
+    - writer: ingestion (collectors, migrations); readers: reports, exports, API
+    - start_checkpointer(): background PASSIVE wal_checkpoint every CHECKPOINT_INTERVAL s,
+      so the WAL does not grow while readers keep old snapshots open
+    The schema must exist before readers are opened (mode=ro cannot create the file).
+    """
+
+    def __init__(self, path: str | Path = DB_PATH, readers: int = 4, check_same_thread: bool = True):
+        self.path = path
+        self.readers = readers
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.writer = get_conn(path, check_same_thread=check_same_thread)
+        self._pool = None
+        self._stop = threading.Event()
+        self._checkpointer = None
+
+    @property
+    def pool(self) -> ReadPool:
+        # opened lazily: a fresh database only exists once the writer has migrated it
+        if self._pool is None:
+            self._pool = ReadPool(self.path, size=self.readers)
+        return self._pool
+
+    def reader(self):
+        """Context manager lending a read-only connection."""
+        return self.pool.connection()
+
+    def checkpoint(self, mode: str = "PASSIVE"):
+        busy, log, done = checkpoint(self.writer, mode)
+        LOG.debug("wal_checkpoint(%s): busy=%s frames=%s checkpointed=%s", mode, busy, log, done)
+        return busy, log, done
+
+    def start_checkpointer(self, interval: float = CHECKPOINT_INTERVAL):
+        """Periodic PASSIVE checkpoints from a daemon thread (its own connection)."""
+        if self._checkpointer is not None:
+            return
+
+        def loop():
+            conn = get_conn(self.path)
+            try:
+                while not self._stop.wait(interval):
+                    try:
+                        busy, log, done = checkpoint(conn)
+                        LOG.debug("wal_checkpoint(PASSIVE): busy=%s frames=%s checkpointed=%s", busy, log, done)
+                    except sqlite3.Error:
+                        LOG.warning("wal_checkpoint failed", exc_info=True)
+            finally:
+                conn.close()
+
+        self._checkpointer = threading.Thread(target=loop, name="wal-checkpoint", daemon=True)
+        self._checkpointer.start()
+
+    def close(self):
+        self._stop.set()
+        if self._checkpointer is not None:
+            self._checkpointer.join(timeout=5)
+            self._checkpointer = None
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        try:
+            self.checkpoint()
+        except sqlite3.Error:
+            LOG.warning("final wal_checkpoint failed", exc_info=True)
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 # --- Meta helpers ---
 def get_meta(conn: sqlite3.Connection, key: str) -> str | None:
     cur = conn.cursor()
@@ -127,48 +192,15 @@ def set_meta(conn: sqlite3.Connection, key: str, value: str):
     )
     conn.commit()
 
-# --- Autorepair / init ---
+# --- Schema / init ---
 def ensure_tables(conn: sqlite3.Connection):
-    """Ensure all tables exist (idempotent)."""
-    cur = conn.cursor()
-    for name, ddl in _DDL.items():
-        cur.execute(ddl)
-        LOG.debug("Ensured table: %s", name)
-    conn.commit()
-
-def autorepair_schema(conn: sqlite3.Connection):
-    """
-    Perform schema compatibility fixes.
-    Example: rename legacy columns (funding_rate→funding, oi_value→open_interest).
-    """
-    cur = conn.cursor()
-    # Ensure 'funding' column exists
-    cur.execute("PRAGMA table_info(bybit)")
-    cols = [r[1] for r in cur.fetchall()]
-    if "funding" not in cols and "funding_rate" in cols:
-        try:
-            cur.execute("ALTER TABLE bybit RENAME COLUMN funding_rate TO funding;")
-            conn.commit()
-            LOG.info("Autorepair: renamed funding_rate → funding")
-        except Exception:
-            LOG.exception("Failed to rename funding_rate column")
-
-    # Ensure 'open_interest' column exists
-    cur.execute("PRAGMA table_info(bybit)")
-    cols = [r[1] for r in cur.fetchall()]
-    if "open_interest" not in cols and "oi_value" in cols:
-        try:
-            cur.execute("ALTER TABLE bybit RENAME COLUMN oi_value TO open_interest;")
-            conn.commit()
-            LOG.info("Autorepair: renamed oi_value → open_interest")
-        except Exception:
-            LOG.exception("Failed to rename oi_value column")
+    """Ensure the schema is current (idempotent, see pipeline/schema.py)."""
+    schema.migrate(conn)
 
 def init_db(path: str | Path = DB_PATH) -> sqlite3.Connection:
     """Ensure database and schema ready, return connection."""
     Path(path).parent.mkdir(parents=True, exist_ok=True)
     conn = get_conn(path)
     ensure_tables(conn)
-    autorepair_schema(conn)
     LOG.info("✅ Database initialized at %s", path)
     return conn
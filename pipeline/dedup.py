@@ -0,0 +1,46 @@
+"""
+pipeline/dedup.py
+Bounded "already seen" filter for streamed events (WS reconnects, file replays).
+
+    seen = RecentKeys(50_000)
+    if seen.add((ts_ms, symbol, side, price, qty)):   # True → first time
+        ...
+
+- LRU over the hash of the event key: ~100 bytes per entry whatever the key,
+  the least recently seen key is evicted beyond maxsize
+- exact within its window (a 64-bit hash collision is the only false positive);
+  older duplicates are the job of the table's unique index
+Not thread-safe: one per writer / event loop.
+"""
+
+from collections import OrderedDict
+
+MAXSIZE = 50_000
+
+
+class RecentKeys:
+    __slots__ = ("maxsize", "_keys", "hits")
+
+    def __init__(self, maxsize: int = MAXSIZE):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self.hits = 0
+
+    def add(self, key) -> bool:
+        """Remember key; False when it was already among the recent ones."""
+        h = hash(key)
+        keys = self._keys
+        if h in keys:
+            keys.move_to_end(h)
+            self.hits += 1
+            return False
+        keys[h] = None
+        if len(keys) > self.maxsize:
+            keys.popitem(last=False)
+        return True
+
+    def __contains__(self, key) -> bool:
+        return hash(key) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
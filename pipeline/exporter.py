@@ -3,13 +3,16 @@
 """
 Exporter: dump database tables to CSV.
 Standardised entrypoint: run(conn).
+pandas is imported on first export, not at module import (keeps main.py start-up light).
 """
 import sqlite3
-import pandas as pd
 import logging
 from pathlib import Path
 from datetime import datetime, timezone
 
+from pipeline import db
+from pipeline.metrics import EXPORT_SECONDS
+
 DB_PATH = Path("data/crypto.db")
 EXPORT_DIR = Path("exports")
 
@@ -34,6 +37,8 @@ TABLES = {
 
 
 def export_table(conn: sqlite3.Connection, name: str, query: str, out_dir: Path):
+    import pandas as pd
+
     df = pd.read_sql_query(query, conn)
     out_file = out_dir / f"{name}.csv"
     df.to_csv(out_file, index=False)
@@ -50,7 +55,8 @@ def run(conn: sqlite3.Connection):
 
     for name, query in TABLES.items():
         try:
-            export_table(conn, name, query, session_dir)
+            with EXPORT_SECONDS.time(table=name):
+                export_table(conn, name, query, session_dir)
         except Exception as e:
             LOG.error("Failed to export %s: %s", name, e)
 
@@ -58,7 +64,8 @@ def run(conn: sqlite3.Connection):
 
 
 def main():
-    conn = sqlite3.connect(str(DB_PATH))
+    # read-only: safe to run next to the collectors / WS writer
+    conn = db.get_readonly_conn(DB_PATH)
     run(conn)
     conn.close()
 
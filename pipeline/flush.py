@@ -0,0 +1,141 @@
+"""
+pipeline/flush.py
+Adaptive flush policy for the batched writers: meet a p99 end-to-end latency target
+(event buffered → committed) with batches as large as that target allows.
+
+    ctl = FlushController(target=2.0, max_size=5000, max_wait=5)
+    ctl.should_flush(len(buffer), oldest_age)           # size trigger, on each record
+    ctl.max_wait                                        # time trigger (writer's timer task)
+    ctl.observe_flush(n, seconds, oldest_age)           # after each flush: refit
+
+- commit cost model: seconds ≈ fixed + per_row * n (least squares over the last
+  FIT_WINDOW flushes) + p99 of the residuals → flush_p99(n)
+- arrival rate: EWMA of rows / second between flushes
+- decisions:
+    batch_limit = largest n with flush_p99(n) <= target * HEADROOM   (bounds one commit)
+    max_wait    = (budget - fixed - residual) / (1 + per_row * rate)  (oldest event's wait
+                  + the commit of everything that arrived meanwhile fits in the budget)
+  both clamped to [min_size, max_size] / [min_wait, max_wait]
+- target=None: static policy (max_size / max_wait), still timer-driven
+snapshot() returns the current decisions and model (also exported as gauges).
+"""
+
+import logging
+import math
+from collections import deque
+
+from pipeline.metrics import REGISTRY
+
+LOG = logging.getLogger("pipeline.flush")
+
+HEADROOM = 0.8
+FIT_WINDOW = 128
+RATE_ALPHA = 0.3
+MIN_WAIT = 0.05
+
+FLUSH_MAX_WAIT = REGISTRY.gauge("pipeline_writer_flush_max_wait_seconds",
+                                "Adaptive flush: max buffering time of the oldest record", ("writer",))
+FLUSH_BATCH_LIMIT = REGISTRY.gauge("pipeline_writer_flush_batch_limit",
+                                   "Adaptive flush: records that trigger a flush", ("writer",))
+ARRIVAL_RATE = REGISTRY.gauge("pipeline_writer_arrival_rate", "Records / second (EWMA)", ("writer",))
+EVENT_LATENCY = REGISTRY.histogram("pipeline_writer_event_latency_seconds",
+                                   "Oldest record of a batch: buffered → committed", ("writer",))
+
+
+class FlushController:
+    def __init__(self, target: float | None = 2.0, max_size: int = 5000, max_wait: float = 5.0,
+                 min_size: int = 1, min_wait: float = MIN_WAIT, name: str = "writer"):
+        self.target = target
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_wait = min_wait
+        self.max_wait_cap = max_wait
+        self.name = name
+
+        self._history = deque(maxlen=FIT_WINDOW)  # (rows, seconds)
+        self.flushes = 0
+        self.rate = 0.0
+        self.fixed = 0.0
+        self.per_row = 0.0
+        self.residual = 0.0
+        self.batch_limit = max_size
+        self.max_wait = max_wait if target is None else min(max_wait, target * HEADROOM)
+        self._publish()
+
+    # -----------------------------------------------------
+    # DECISIONS
+    # -----------------------------------------------------
+    def should_flush(self, size: int, oldest_age: float) -> bool:
+        return size >= self.batch_limit or oldest_age >= self.max_wait
+
+    def flush_p99(self, rows: int) -> float:
+        return self.fixed + self.per_row * rows + self.residual
+
+    def observe_flush(self, rows: int, seconds: float, oldest_age: float, since_last: float | None = None):
+        """One completed flush: `rows` committed in `seconds`; oldest record had waited oldest_age."""
+        EVENT_LATENCY.observe(oldest_age + seconds, writer=self.name)
+        if rows <= 0:
+            return
+        self.flushes += 1
+        if self.flushes == 1:
+            return  # the first flush pays one-time costs (imports, page cache): not a sample
+        self._history.append((rows, seconds))
+        if since_last and since_last > 0:
+            inst = rows / since_last
+            self.rate = inst if not self.rate else self.rate + RATE_ALPHA * (inst - self.rate)
+        if self.target is None:
+            return
+        self._fit()
+        self._decide()
+
+    def _fit(self):
+        n = len(self._history)
+        xs = [r for r, _ in self._history]
+        ys = [s for _, s in self._history]
+        mx = sum(xs) / n
+        my = sum(ys) / n
+        sxx = sum((x - mx) ** 2 for x in xs)
+        if sxx > 0:
+            per_row = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+            self.per_row = max(per_row, 0.0)
+            self.fixed = max(my - self.per_row * mx, 0.0)
+        else:  # every batch had the same size: all cost is "fixed"
+            self.per_row = 0.0
+            self.fixed = my
+        res = sorted(y - (self.fixed + self.per_row * x) for x, y in zip(xs, ys))
+        self.residual = max(res[min(n - 1, math.ceil(0.99 * n) - 1)], 0.0)
+
+    def _decide(self):
+        budget = self.target * HEADROOM
+        spare = budget - self.fixed - self.residual
+        if self.per_row > 0:
+            limit = int(spare / self.per_row) if spare > 0 else self.min_size
+        else:
+            limit = self.max_size
+        wait = spare / (1 + self.per_row * self.rate) if spare > 0 else self.min_wait
+
+        limit = min(max(limit, self.min_size), self.max_size)
+        wait = min(max(wait, self.min_wait), self.max_wait_cap)
+        if limit != self.batch_limit or abs(wait - self.max_wait) > 0.05 * self.max_wait:
+            LOG.debug("%s flush policy: batch_limit=%d max_wait=%.3fs (rate=%.1f/s, commit≈%.2fms + %.3fms/row)",
+                      self.name, limit, wait, self.rate, self.fixed * 1e3, self.per_row * 1e3)
+        self.batch_limit = limit
+        self.max_wait = wait
+        self._publish()
+
+    def _publish(self):
+        FLUSH_MAX_WAIT.set(self.max_wait, writer=self.name)
+        FLUSH_BATCH_LIMIT.set(self.batch_limit, writer=self.name)
+        ARRIVAL_RATE.set(self.rate, writer=self.name)
+
+    def snapshot(self) -> dict:
+        return {
+            "target": self.target,
+            "batch_limit": self.batch_limit,
+            "max_wait": self.max_wait,
+            "rate": self.rate,
+            "commit_fixed": self.fixed,
+            "commit_per_row": self.per_row,
+            "commit_residual_p99": self.residual,
+            "samples": len(self._history),
+        }
@@ -0,0 +1,72 @@
+"""
+pipeline/httpclient.py
+Shared HTTP access for the collectors.
+- one keep-alive httpx.Client for the process (connection reuse across runs)
+- per-source latency / bytes / error metrics (pipeline/metrics.py)
+- set_transport(): route every collector through e.g. httpx.MockTransport (benchmarks)
+"""
+
+import threading
+import time
+
+import httpx
+
+from pipeline.metrics import HTTP_BYTES, HTTP_ERRORS, HTTP_SECONDS
+
+_client = None
+_transport = None
+_lock = threading.Lock()
+
+
+def set_transport(transport: httpx.BaseTransport | None):
+    """Use `transport` for all subsequent requests (None → real network)."""
+    global _client, _transport
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _transport = transport
+
+
+def _get_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(transport=_transport, follow_redirects=True)
+    return _client
+
+
+def get(source: str, url: str, **kwargs) -> httpx.Response:
+    """httpx.get() equivalent, recorded under `source` (collector name)."""
+    t0 = time.perf_counter()
+    try:
+        r = _get_client().get(url, **kwargs)
+    except Exception:
+        HTTP_ERRORS.inc(source=source)
+        raise
+    HTTP_SECONDS.observe(time.perf_counter() - t0, source=source)
+    HTTP_BYTES.inc(len(r.content), source=source)
+    if r.status_code >= 400:
+        HTTP_ERRORS.inc(source=source)
+    return r
+
+
+def async_client(source: str, **kwargs) -> httpx.AsyncClient:
+    """AsyncClient whose requests are recorded under `source`."""
+
+    async def on_request(request):
+        request.extensions["pipeline_t0"] = time.perf_counter()
+
+    async def on_response(response):
+        await response.aread()
+        t0 = response.request.extensions.get("pipeline_t0")
+        if t0 is not None:
+            HTTP_SECONDS.observe(time.perf_counter() - t0, source=source)
+        HTTP_BYTES.inc(len(response.content), source=source)
+        if response.status_code >= 400:
+            HTTP_ERRORS.inc(source=source)
+
+    if _transport is not None and "transport" not in kwargs:
+        kwargs["transport"] = _transport
+    return httpx.AsyncClient(event_hooks={"request": [on_request], "response": [on_response]}, **kwargs)
@@ -0,0 +1,269 @@
+"""
+pipeline/leases.py
+Leases for running the pipeline on several hosts: each collector (or shard) on exactly one node.
+
+    coord = leases.Coordinator(leases.from_url("redis://host:6379/0"), ttl=30)
+    coord.want("coingecko", "bybit_oi_hist#0", "bybit_oi_hist#1", "report")
+    coord.start()                     # background renewal every ttl / 3
+    if coord.holds("coingecko"): ...  # run it here; otherwise another node does
+
+Backends (selected by PIPELINE_LEASE_URL / --coordinator):
+- memory://                 in-process; one instance shared by several Coordinators
+                            (tests, single node)
+- sqlite:////shared/leases.db  table on shared storage; one atomic upsert per acquire,
+                            expiry on each host's wall clock (clocks must be NTP-synced,
+                            and the filesystem must honour SQLite's locks)
+- redis://host:6379/0       SET PX under WATCH/MULTI; Redis expires the keys itself
+
+- nodes register as the lease "node:<id>"; the live nodes are the current holders
+- every lease has a preferred node among the live ones (rendezvous hashing: stable,
+  only the leases of a node that joins or leaves move); a node only acquires or renews
+  its preferred leases and releases the others, so the work spreads across nodes
+- holds() is a local check against the acquire time + ttl - SAFETY: a node that can no
+  longer renew (backend down, process stalled) stops running the work before the lease
+  can pass to another node
+- failover: a dead node's leases expire ttl after its last renewal and are taken on the
+  survivors' next tick, i.e. within ttl + ttl / 3
+"""
+
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+LOG = logging.getLogger("pipeline.leases")
+
+LEASE_TTL = 30.0
+# part of the ttl during which a holder stops considering the lease its own (clock skew, latency)
+SAFETY = 0.2
+NODE_PREFIX = "node:"
+KEY_PREFIX = "pipeline:lease:"
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._leases = {}  # name → (owner, expiry on the monotonic clock)
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """Take the lease if it is free, expired or already `owner`'s (then renewed)."""
+        now = time.monotonic()
+        with self._lock:
+            current = self._leases.get(name)
+            if current is not None and current[0] != owner and current[1] > now:
+                return False
+            self._leases[name] = (owner, now + ttl)
+            return True
+
+    def release(self, name: str, owner: str):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+    def holders(self, prefix: str = "") -> dict:
+        """{name: owner} of the unexpired leases starting with prefix."""
+        now = time.monotonic()
+        with self._lock:
+            return {k: o for k, (o, exp) in self._leases.items() if k.startswith(prefix) and exp > now}
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        # autocommit: every statement is its own transaction; no WAL (not over network filesystems)
+        self.conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS leases ("
+                          "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires <= ?",
+                (name, owner, now + ttl, now))
+            return cur.rowcount == 1
+
+    def release(self, name: str, owner: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def holders(self, prefix: str = "") -> dict:
+        with self._lock:
+            rows = self.conn.execute("SELECT name, owner FROM leases WHERE expires > ? AND substr(name, 1, ?) = ?",
+                                     (time.time(), len(prefix), prefix)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
+
+
+class RedisBackend:
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        from redis.exceptions import WatchError
+
+        key = KEY_PREFIX + name
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.get(key)
+                if current is not None and current.decode() != owner:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(key, owner, px=int(ttl * 1000))
+                pipe.execute()
+                return True
+            except WatchError:  # changed under us: someone else got it
+                return False
+
+    def release(self, name: str, owner: str):
+        from redis.exceptions import WatchError
+
+        key = KEY_PREFIX + name
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.get(key)
+                if current is not None and current.decode() == owner:
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+            except WatchError:
+                pass
+
+    def holders(self, prefix: str = "") -> dict:
+        keys = list(self.client.scan_iter(match=KEY_PREFIX + prefix + "*", count=500))
+        if not keys:
+            return {}
+        out = {}
+        for key, owner in zip(keys, self.client.mget(keys)):
+            if owner is not None:  # expired between SCAN and MGET
+                out[key.decode()[len(KEY_PREFIX):]] = owner.decode()
+        return out
+
+    def close(self):
+        self.client.close()
+
+
+def from_url(url: str):
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"unsupported lease backend: {url}")
+
+
+# -----------------------------------------------------
+# PLACEMENT
+# -----------------------------------------------------
+def _score(node: str, name: str) -> bytes:
+    return hashlib.blake2b(f"{node}|{name}".encode(), digest_size=8).digest()
+
+
+def preferred(name: str, nodes) -> str | None:
+    """Rendezvous hashing: the node with the highest score for `name`."""
+    return max(nodes, key=lambda n: _score(n, name), default=None)
+
+
+# -----------------------------------------------------
+# COORDINATOR (one per node)
+# -----------------------------------------------------
+class Coordinator:
+    def __init__(self, backend=None, node_id: str | None = None, ttl: float = LEASE_TTL):
+        if backend is None:
+            backend = from_url(os.environ.get("PIPELINE_LEASE_URL", "memory://"))
+        self.backend = backend
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = float(ttl)
+        self.wanted: set = set()
+        self._held = {}  # name → local deadline (monotonic)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def want(self, *names: str):
+        """Compete for these leases (collectors, "group#i" shards, ...)."""
+        with self._lock:
+            self.wanted.update(names)
+
+    def holds(self, name: str) -> bool:
+        deadline = self._held.get(name)
+        return deadline is not None and time.monotonic() < deadline
+
+    def held(self) -> set:
+        now = time.monotonic()
+        return {n for n, d in list(self._held.items()) if d > now}
+
+    def nodes(self) -> list:
+        return sorted(self.backend.holders(NODE_PREFIX).values())
+
+    def tick(self):
+        """Register this node, then acquire/renew its preferred leases and release the others."""
+        t0 = time.monotonic()
+        deadline = t0 + self.ttl * (1 - SAFETY)
+        self.backend.acquire(NODE_PREFIX + self.node_id, self.node_id, self.ttl)
+        live = self.nodes()
+        if self.node_id not in live:
+            live.append(self.node_id)
+        with self._lock:
+            wanted = sorted(self.wanted)
+        for name in wanted:
+            if preferred(name, live) == self.node_id:
+                if self.backend.acquire(name, self.node_id, self.ttl):
+                    if name not in self._held:
+                        LOG.info("lease %s acquired by %s", name, self.node_id)
+                    self._held[name] = deadline
+                    continue
+            elif name in self._held:
+                self.backend.release(name, self.node_id)
+                LOG.info("lease %s handed over (%d nodes)", name, len(live))
+            self._held.pop(name, None)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                # keep the local deadlines: holds() turns False by itself before the leases expire
+                LOG.warning("lease renewal failed", exc_info=True)
+            self._stop.wait(self.ttl / 3)
+
+    def start(self):
+        self.tick()
+        self._thread = threading.Thread(target=self._loop, name="leases", daemon=True)
+        self._thread.start()
+        LOG.info("node %s coordinating %d leases (ttl %gs)", self.node_id, len(self.wanted), self.ttl)
+
+    def stop(self):
+        """Release everything held, so the other nodes take over on their next tick."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for name in list(self._held):
+            self._held.pop(name, None)
+            try:
+                self.backend.release(name, self.node_id)
+            except Exception:
+                LOG.warning("lease %s not released", name, exc_info=True)
+        try:
+            self.backend.release(NODE_PREFIX + self.node_id, self.node_id)
+        except Exception:
+            pass
@@ -0,0 +1,208 @@
+"""
+pipeline/metrics.py
+In-process metrics registry (counters, gauges, histograms with labels).
+
+- REGISTRY.counter/gauge/histogram(name, help, labels) → get-or-create
+- render_prometheus(): Prometheus text format (served by serve(port) on /metrics)
+- to_dict() / dump_json(path): snapshot, written at the end of a main.py run
+
+Stdlib only: importing it costs nothing at start-up.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+LOG = logging.getLogger("pipeline.metrics")
+
+# seconds; covers HTTP calls, commits and flushes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(k, "")) for k in self.labelnames)
+
+    def _fmt_labels(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._fmt_labels(k), v) for k, v in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return {",".join(k): v for k, v in self._values.items()}
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                st = self._values[key] = [[0] * len(self.buckets), 0, 0.0, 0.0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    st[0][i] += 1
+            st[1] += 1
+            st[2] += value
+            st[3] = max(st[3], value)
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for k, (counts, n, total, _) in self._values.items():
+                for b, c in zip(self.buckets, counts):
+                    out.append((f"{self.name}_bucket", self._fmt_labels(k, f'le="{b}"'), c))
+                out.append((f"{self.name}_bucket", self._fmt_labels(k, 'le="+Inf"'), n))
+                out.append((f"{self.name}_sum", self._fmt_labels(k), total))
+                out.append((f"{self.name}_count", self._fmt_labels(k), n))
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                ",".join(k): {"count": n, "sum": total, "max": mx,
+                              "mean": total / n if n else math.nan}
+                for k, (_, n, total, mx) in self._values.items()
+            }
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, help, labels, **kw)
+            return m
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels=()) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, value in m.samples():
+                lines.append(f"{name}{labels} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: {"type": m.kind, "labels": list(m.labelnames), "values": m.snapshot()}
+                for m in metrics}
+
+    def dump_json(self, path: str | Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2, default=str))
+        LOG.info("Metrics written to %s", path)
+
+
+REGISTRY = Registry()
+
+
+def serve(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Expose /metrics (Prometheus text format) from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    LOG.info("Metrics exposed on http://%s:%d/metrics", host, server.server_address[1])
+    return server
+
+
+# --- Pipeline metrics (shared names, so every module records into the same series) ---
+HTTP_SECONDS = REGISTRY.histogram("pipeline_http_request_seconds", "HTTP request latency", ("source",))
+HTTP_BYTES = REGISTRY.counter("pipeline_http_response_bytes_total", "HTTP response body bytes", ("source",))
+HTTP_ERRORS = REGISTRY.counter("pipeline_http_errors_total", "HTTP requests failed or non-2xx", ("source",))
+STAGE_SECONDS = REGISTRY.histogram("pipeline_stage_seconds", "Duration of a pipeline stage", ("stage",))
+ROWS_WRITTEN = REGISTRY.counter("pipeline_rows_written_total", "Rows inserted/updated", ("source",))
+COMMIT_SECONDS = REGISTRY.histogram("pipeline_sqlite_commit_seconds", "SQLite COMMIT duration")
+WAL_FRAMES = REGISTRY.gauge("pipeline_sqlite_wal_pending_frames", "WAL frames not yet checkpointed")
+WRITER_BUFFER = REGISTRY.gauge("pipeline_writer_buffer_size", "Records waiting in a writer buffer", ("writer",))
+WRITER_FLUSH_SECONDS = REGISTRY.histogram("pipeline_writer_flush_seconds", "Writer flush duration", ("writer",))
+WRITER_FLUSHED = REGISTRY.counter("pipeline_writer_flushed_records_total", "Records flushed", ("writer",))
+DUPLICATES = REGISTRY.counter("pipeline_duplicate_events_total", "Duplicate events dropped",
+                              ("writer", "stage"))
+WS_MESSAGES = REGISTRY.counter("pipeline_ws_messages_total", "WebSocket messages received", ("service",))
+WS_RECONNECTS = REGISTRY.counter("pipeline_ws_reconnects_total", "WebSocket reconnections", ("service",))
+EXPORT_SECONDS = REGISTRY.histogram("pipeline_export_table_seconds", "CSV export time per table", ("table",))
@@ -0,0 +1,179 @@
+"""
+pipeline/profiling.py
+Opt-in per-stage profiling: cProfile (time) and/or tracemalloc (allocations).
+
+- off by default; stage(name) then returns a shared no-op context (one global lookup)
+- switch: PIPELINE_PROFILE=cpu|mem|cpu,mem  or  --profile on main.py / bybit_ws
+- PIPELINE_PROFILE_DIR (default exports/profiles), PIPELINE_PROFILE_EVERY=N → profile
+  one run in N of each stage (for hot stages of long-running services, e.g. writer.flush)
+- per profiled run: <dir>/<stage>_<timestamp>.prof (pstats / snakeviz)
+  + <stage>_<timestamp>.txt: top functions (cumulative, own time) and top allocation sites
+
+tracemalloc is process-wide: with the threaded scheduler, allocation diffs also
+include what other threads allocated during the stage. Snapshot diffs are costly
+(seconds once pandas/pyarrow are loaded): they are computed and written by a
+background thread, and mem mode is best combined with PIPELINE_PROFILE_EVERY.
+"""
+
+import contextlib
+import io
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+LOG = logging.getLogger("pipeline.profiling")
+
+DEFAULT_DIR = Path("exports/profiles")
+MODES = ("cpu", "mem")
+TOP = 30
+
+_NOOP = contextlib.nullcontext()
+_profiler = None
+
+
+class Profiler:
+    def __init__(self, out_dir: str | Path = DEFAULT_DIR, cpu: bool = True, mem: bool = False,
+                 every: int = 1, top: int = TOP, nframes: int = 1):
+        self.out_dir = Path(out_dir)
+        self.cpu = cpu
+        self.mem = mem
+        self.every = max(1, int(every))
+        self.top = top
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # profiles are summarised off the profiled thread (the WS event loop must not stall)
+        from concurrent.futures import ThreadPoolExecutor
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if mem:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(nframes)
+
+    def _sampled(self, name: str) -> bool:
+        with self._lock:
+            n = self._counts.get(name, 0)
+            self._counts[name] = n + 1
+        return n % self.every == 0
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        # nested stages are covered by the enclosing profile (one cProfile per thread)
+        if getattr(self._local, "active", False) or not self._sampled(name):
+            yield
+            return
+
+        import cProfile
+        import tracemalloc
+
+        self._local.active = True
+        prof = cProfile.Profile() if self.cpu else None
+        snap0 = None
+        if self.mem:
+            snap0 = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        if prof is not None:
+            prof.enable()
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+            elapsed = time.perf_counter() - t0
+            peak = snap1 = None
+            if self.mem:
+                peak = tracemalloc.get_traced_memory()[1]
+                snap1 = tracemalloc.take_snapshot()
+            self._local.active = False
+            self._writer.submit(self._write, name, elapsed, prof, snap0, snap1, peak)
+
+    # -----------------------------------------------------
+    # OUTPUT
+    # -----------------------------------------------------
+    def _write(self, name, elapsed, prof, snap0, snap1, peak):
+        try:
+            self._write_files(name, elapsed, prof, snap0, snap1, peak)
+        except Exception:
+            LOG.exception("could not write profile for %s", name)
+
+    def _write_files(self, name, elapsed, prof, snap0, snap1, peak):
+        import cProfile
+        import pstats
+        import tracemalloc
+
+        stem = self.out_dir / f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        out = io.StringIO()
+        out.write(f"stage: {name}\nwall: {elapsed:.3f}s\n")
+
+        if prof is not None:
+            prof.dump_stats(f"{stem}.prof")
+            for key in ("cumulative", "tottime"):
+                out.write(f"\n=== top {self.top} functions by {key} ===\n")
+                stats = pstats.Stats(prof, stream=out)
+                stats.strip_dirs().sort_stats(key).print_stats(self.top)
+
+        if snap1 is not None:
+            # filtered on the result: Snapshot.filter_traces() costs as much as the diff itself;
+            # the profiler's own files go too (this thread may be summarising another stage)
+            own = {tracemalloc.__file__, pstats.__file__, cProfile.__file__, __file__}
+            diff = [st for st in snap1.compare_to(snap0, "lineno")
+                    if st.traceback[0].filename not in own
+                    and not st.traceback[0].filename.startswith("<frozen importlib")]
+            out.write(f"\n=== top {self.top} allocation sites (net, peak traced {peak / 1e6:.1f} MB) ===\n")
+            for st in diff[:self.top]:
+                out.write(f"{st}\n")
+
+        Path(f"{stem}.txt").write_text(out.getvalue())
+        LOG.info("Profile %s: %.3fs → %s.txt", name, elapsed, stem)
+
+
+# -----------------------------------------------------
+# MODULE API
+# -----------------------------------------------------
+def stage(name: str):
+    """Context manager around one pipeline stage; no-op unless profiling is configured."""
+    if _profiler is None:
+        return _NOOP
+    return _profiler.stage(name)
+
+
+def configure(mode: str | None, out_dir: str | Path | None = None, every: int | None = None):
+    """mode: "cpu", "mem", "cpu,mem" (or "all"); None/""/"off" disables profiling."""
+    global _profiler
+    kinds = set()
+    if mode and mode != "off":
+        kinds = set(MODES) if mode == "all" else {m.strip() for m in mode.split(",") if m.strip()}
+    unknown = kinds - set(MODES)
+    if unknown:
+        raise ValueError(f"unknown profiling mode(s): {', '.join(sorted(unknown))}")
+    if not kinds:
+        _profiler = None
+        return None
+    _profiler = Profiler(
+        out_dir or os.environ.get("PIPELINE_PROFILE_DIR") or DEFAULT_DIR,
+        cpu="cpu" in kinds,
+        mem="mem" in kinds,
+        every=every or int(os.environ.get("PIPELINE_PROFILE_EVERY", "1")),
+    )
+    LOG.info("Profiling enabled (%s) → %s, 1 run in %d",
+             ",".join(sorted(kinds)), _profiler.out_dir, _profiler.every)
+    return _profiler
+
+
+def add_arguments(parser):
+    """--profile / --profile-dir / --profile-every (shared by main.py and bybit_ws)."""
+    parser.add_argument("--profile", default=os.environ.get("PIPELINE_PROFILE"),
+                        help="Profilage par étape : cpu, mem ou cpu,mem (défaut $PIPELINE_PROFILE)")
+    parser.add_argument("--profile-dir", help=f"Dossier des profils (défaut {DEFAULT_DIR})")
+    parser.add_argument("--profile-every", type=int,
+                        help="Ne profile qu'une exécution sur N de chaque étape")
+
+
+def configure_from_args(args):
+    return configure(args.profile, args.profile_dir, args.profile_every)
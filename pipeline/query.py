@@ -0,0 +1,376 @@
+"""
+pipeline/query.py
+Columnar time-range reads: SQLite → NumPy arrays / Arrow table.
+
+    from pipeline import query
+    cols = query.range("bybit", ["funding", "open_interest"], start, end, symbol="BTCUSDT")
+    cols["ts"], cols["funding"]                     # numpy arrays
+    tbl = query.range("coingecko", ["price_usd"], start, end, resample=3600, output="arrow")
+
+- rows are decoded CHUNK_ROWS at a time straight into typed NumPy columns
+  (one np.array() call per chunk, no per-row Python loop, no DataFrame); the
+  tuples of a chunk are dropped as soon as it is converted, so the peak is the
+  result arrays + one chunk. Arrow output wraps the same buffers.
+- range scans use the (symbol, ts) / ts indexes of schema v4
+- resample=N: server-side bucketing, ts / N * N with GROUP BY (per symbol when
+  no symbol is given), aggregated with agg= mean|sum|min|max|count|first|last
+- INTEGER columns with NULLs come back as float64 with NaN
+
+liquidations(): same contract for liquidation events, whichever store holds them:
+- hot part  : SQLite bybit_liquidations, from the cutoff onwards
+- cold part : pyarrow.dataset scan of the Parquet archive (ARCHIVE_DIR) for ts < cutoff,
+              with column projection and ts/symbol/side predicates pushed down
+- cutoff    : now - hot_window (HOT_WINDOW, 7 days), so older ranges never touch the live
+              DB; never later than the newest archive file (- ARCHIVE_SKEW), nor earlier
+              than SQLite's oldest event; hot_window=None or no archive: SQLite's oldest event
+  the two parts are disjoint by construction (the writer fills both stores, SQLite wins),
+  so the result is stitched with a plain concatenation, already ordered by ts
+
+numpy/pyarrow are imported on first call.
+"""
+
+import os
+import re
+import sqlite3
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pipeline import compact, db
+
+LOG = logging.getLogger("pipeline.query")
+
+# table → (time column, symbol column or None)
+TABLES = {
+    "metrics": ("ts", None),
+    "coingecko": ("ts", "symbol"),
+    "bybit": ("ts", "symbol"),
+    "bybit_oi_hist": ("ts", "symbol"),
+    "bybit_funding_hist": ("ts", "symbol"),
+    "sopr": ("ts", None),
+    "altme": ("ts", None),
+    "mempool": ("ts", None),
+    "stablecoins": ("ts", None),
+    "hashrate_btc": ("ts", None),
+    "txcount_btc": ("ts", None),
+    "bybit_liquidations": ("ts", "symbol"),
+    "bybit_liquidations_hourly": ("hour_start", "symbol"),
+    "bybit_liquidations_minute": ("minute_start", "symbol"),
+    "signals": ("ts", "name"),
+}
+
+AGGREGATES = {"mean": "avg", "sum": "sum", "min": "min", "max": "max", "count": "count",
+              "first": None, "last": None}
+
+CHUNK_ROWS = 65_536
+
+ARCHIVE_DIR = Path("data/bybit_liquidations")
+# columns common to every archive generation (raw/ts_iso differ from file to file)
+LIQ_COLUMNS = {"ts": "int", "symbol": "text", "side": "text", "price": "float", "qty": "float",
+               "qty_usd": "float"}
+# archive file names carry their (UTC) write time; events are never newer than the file
+# (+ clock skew), so files written before start - ARCHIVE_SKEW are skipped unopened
+_FILE_TIME = re.compile(r"(\d{8})_(\d{6})")
+ARCHIVE_SKEW = 3600
+# events younger than this are read from SQLite, older ones from the archive
+HOT_WINDOW = 7 * 86400
+
+
+def watermark_sql(table: str, compact_layout: bool = False) -> str:
+    """
+    SQL of a cheap change marker for `table` (one row): MAX(rowid) for append-only tables;
+    for the hourly rollup (rows updated in place) the totals of the last two hours;
+    for the compact layout views (no rowid) the table_versions counter, bumped by every write.
+    """
+    if table == "bybit_liquidations_hourly":
+        return ("SELECT MAX(hour_start), SUM(events_count), SUM(total_qty_usd) "
+                "FROM bybit_liquidations_hourly WHERE hour_start >= "
+                "(SELECT MAX(hour_start) FROM bybit_liquidations_hourly) - 3600")
+    if compact_layout and table in compact.TABLES:
+        return f"SELECT COALESCE((SELECT version FROM table_versions WHERE name = '{table}'), 0)"
+    return f"SELECT MAX(rowid) FROM {table}"
+
+
+def watermark(conn: sqlite3.Connection, table: str) -> str:
+    """Change marker of `table` (see watermark_sql), as a string."""
+    row = conn.execute(watermark_sql(table, compact.is_compact(conn))).fetchone()
+    return ":".join(str(v) for v in row)
+
+
+def _kind(decl_type: str) -> str:
+    """SQLite type affinity → "int" | "float" | "text" (https://sqlite.org/datatype3.html)."""
+    t = (decl_type or "").upper()
+    if "INT" in t:
+        return "int"
+    if "CHAR" in t or "CLOB" in t or "TEXT" in t:
+        return "text"
+    return "float"
+
+
+def _table_kinds(conn: sqlite3.Connection, table: str) -> dict:
+    rows = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not rows:
+        raise ValueError(f"table {table} does not exist")
+    # compact layout views: expression columns have no declared type
+    view_types = compact.VIEW_TYPES.get(table, {})
+    return {r[1]: _kind(r[2] or view_types.get(r[1])) for r in rows}
+
+
+def _select(table, ts_col, sym_col, kinds, columns, symbol, resample, agg):
+    """Inner SELECT → (sql, [(name, kind)])."""
+    where = f"{ts_col} >= ? AND {ts_col} < ?"
+    if symbol is not None:
+        where += f" AND {sym_col} = ?"
+
+    if not resample:
+        out = [(ts_col, kinds[ts_col])] + [(c, kinds[c]) for c in columns]
+        cols = ", ".join(name for name, _ in out)
+        return f"SELECT {cols} FROM {table} WHERE {where} ORDER BY {ts_col}", out
+
+    bucket = int(resample)
+    if bucket <= 0:
+        raise ValueError("resample must be a positive number of seconds")
+    if agg not in AGGREGATES:
+        raise ValueError(f"agg must be one of {', '.join(AGGREGATES)}")
+
+    group = [f"{ts_col} / {bucket} * {bucket} AS {ts_col}"]
+    out = [(ts_col, "int")]
+    if sym_col is not None and symbol is None:
+        group.append(sym_col)
+        out.append((sym_col, "text"))
+    # (range() is shadowed in this module)
+    keys = ", ".join(str(i) for i, _ in enumerate(group, 1))
+
+    exprs = []
+    for c in columns:
+        kind = kinds[c]
+        if agg in ("first", "last"):
+            exprs.append(c)
+        elif kind == "text":
+            raise ValueError(f"cannot aggregate text column {c} with {agg}")
+        else:
+            exprs.append(f"{AGGREGATES[agg]}({c}) AS {c}")
+            kind = "float" if agg == "mean" else "int" if agg == "count" else kind
+        out.append((c, kind))
+    if agg in ("first", "last"):
+        # SQLite: with a single min()/max() aggregate, bare columns come from that row
+        # (selected last: extra trailing column, not part of the result)
+        exprs.append(f"{'max' if agg == 'last' else 'min'}({ts_col}) AS _pick")
+
+    sql = (f"SELECT {', '.join(group + exprs)} FROM {table} WHERE {where} "
+           f"GROUP BY {keys} ORDER BY {keys}")
+    return sql, out
+
+
+def range(table: str, columns=None, start: int = 0, end: int = 2**62, symbol: str | None = None,
+          resample: int | None = None, agg: str = "last", output: str = "numpy",
+          conn: sqlite3.Connection | None = None, db_path: str | Path = db.DB_PATH):
+    """
+    Rows of `table` with start <= ts < end (ts = the table's time column), ordered by ts.
+
+    columns: list of column names (default: every column); the time column always comes first
+    output: "numpy" → {column: np.ndarray}, "arrow" → pyarrow.Table
+    conn: connection to use (default: a read-only connection on db_path, closed afterwards)
+    """
+    if table not in TABLES:
+        raise ValueError(f"unknown table {table}")
+    if output not in ("numpy", "arrow"):
+        raise ValueError("output must be numpy or arrow")
+    ts_col, sym_col = TABLES[table]
+    if symbol is not None and sym_col is None:
+        raise ValueError(f"{table} has no symbol column")
+
+    own_conn = conn is None
+    if own_conn:
+        conn = db.get_readonly_conn(db_path)
+    try:
+        kinds = _table_kinds(conn, table)
+        if columns is None:
+            columns = [c for c in kinds if c != ts_col]
+        unknown = [c for c in columns if c not in kinds]
+        if unknown:
+            raise ValueError(f"unknown column(s) for {table}: {', '.join(unknown)}")
+        columns = [c for c in columns if c != ts_col and not (resample and c == sym_col and symbol is None)]
+
+        sql, out = _select(table, ts_col, sym_col, kinds, columns, symbol, resample, agg)
+        params = [int(start), int(end)] + ([symbol] if symbol is not None else [])
+        cols = _fetch_columns(conn.execute(sql, params), out)
+    finally:
+        if own_conn:
+            conn.close()
+    LOG.debug("query %s [%s, %s) → %d rows", table, start, end, len(cols[ts_col]))
+
+    if output == "arrow":
+        import pyarrow as pa
+        # from_pandas: NaN → null, as in the database
+        return pa.table({name: pa.array(cols[name], type=pa.string() if kind == "text" else None,
+                                        from_pandas=True)
+                         for name, kind in out})
+    return cols
+
+
+def _fetch_columns(cur: sqlite3.Cursor, out) -> dict:
+    """Cursor → {name: ndarray}, CHUNK_ROWS rows per conversion."""
+    import numpy as np
+
+    numeric = all(kind != "text" for _, kind in out)
+    parts = [[] for _ in out]
+    while True:
+        rows = cur.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        # all-numeric: one C-level conversion (None → NaN); otherwise object, then per column
+        block = np.array(rows, dtype=np.float64 if numeric else object)
+        del rows
+        for i, (_, kind) in enumerate(out):
+            col = block[:, i]
+            if kind != "text" and not numeric:
+                col = np.array(col.tolist(), dtype=np.float64)
+            parts[i].append(col)
+    cur.close()
+
+    cols = {}
+    for (name, kind), chunks in zip(out, parts):
+        if kind == "text":
+            arr = np.concatenate(chunks) if chunks else np.empty(0, dtype=object)
+        else:
+            arr = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64)
+            if kind == "int" and not np.isnan(arr).any():
+                arr = arr.astype(np.int64)
+        cols[name] = arr
+    return cols
+
+
+# -----------------------------------------------------
+# LIQUIDATIONS: SQLite (hot) + Parquet archive (cold)
+# -----------------------------------------------------
+def liquidations(start: int = 0, end: int = 2**62, symbol: str | None = None, side: str | None = None,
+                 columns=None, output: str = "numpy", conn: sqlite3.Connection | None = None,
+                 db_path: str | Path = db.DB_PATH, archive_dir: str | Path = ARCHIVE_DIR,
+                 hot_window: float | None = HOT_WINDOW):
+    """
+    Liquidation events with start <= ts < end, ordered by ts, from SQLite and/or the archive.
+
+    columns: subset of LIQ_COLUMNS (default: all); ts always comes first
+    side: "BUY" / "SELL" (case-insensitive; archive values are normalised to upper case)
+    hot_window: seconds served from SQLite (see the module docstring), None: all of SQLite
+    output / conn / db_path: as for range()
+    """
+    if output not in ("numpy", "arrow"):
+        raise ValueError("output must be numpy or arrow")
+    columns = [c for c in (columns or LIQ_COLUMNS) if c != "ts"]
+    unknown = [c for c in columns if c not in LIQ_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown column(s) for liquidations: {', '.join(unknown)}")
+    out = [("ts", "int")] + [(c, LIQ_COLUMNS[c]) for c in columns]
+    symbol = symbol.upper() if symbol is not None else None
+    side = side.upper() if side is not None else None
+    start, end = int(start), int(end)
+
+    import pyarrow as pa
+
+    own_conn = conn is None
+    if own_conn:
+        conn = db.get_readonly_conn(db_path)
+    try:
+        # idx_bybit_liquidations_ts: one index probe
+        cutoff = conn.execute("SELECT min(ts) FROM bybit_liquidations").fetchone()[0]
+        if cutoff is not None and hot_window is not None:
+            archived = _archive_until(Path(archive_dir))
+            if archived is not None:
+                cutoff = max(cutoff, min(int(time.time() - hot_window), archived - ARCHIVE_SKEW))
+        parts = []
+        if cutoff is None or start < cutoff:
+            cold_end = end if cutoff is None else min(end, cutoff)
+            parts.append(_archive_scan(Path(archive_dir), out, start, cold_end, symbol, side))
+        if cutoff is not None and end > cutoff:
+            parts.append(_sqlite_scan(conn, out, max(start, cutoff), end, symbol, side))
+    finally:
+        if own_conn:
+            conn.close()
+
+    tbl = pa.concat_tables(parts) if len(parts) > 1 else parts[0]
+    LOG.debug("liquidations [%s, %s) cutoff=%s → %d rows (%s)", start, end, cutoff, tbl.num_rows,
+              " + ".join(str(p.num_rows) for p in parts))
+    if output == "arrow":
+        return tbl
+    return {name: tbl.column(name).to_numpy() for name, _ in out}
+
+
+def _arrow_type(kind: str):
+    import pyarrow as pa
+    return {"int": pa.int64(), "float": pa.float64(), "text": pa.string()}[kind]
+
+
+def _sqlite_scan(conn: sqlite3.Connection, out, start: int, end: int, symbol, side):
+    import pyarrow as pa
+
+    where, params = "ts >= ? AND ts < ?", [start, end]
+    if symbol is not None:
+        where += " AND symbol = ?"
+        params.append(symbol)
+    if side is not None:
+        where += " AND side = ?"
+        params.append(side)
+    cols = ", ".join(name for name, _ in out)
+    data = _fetch_columns(conn.execute(f"SELECT {cols} FROM bybit_liquidations WHERE {where} ORDER BY ts",
+                                       params), out)
+    return pa.table({name: pa.array(data[name], type=_arrow_type(kind), from_pandas=True) for name, kind in out})
+
+
+def _archive_files(archive_dir: Path, start: int) -> list:
+    """Non-empty archive files that may hold events >= start (by the write time in their name)."""
+    if not archive_dir.is_dir():
+        return []
+    files = []
+    for f in sorted(archive_dir.glob("*.parquet")):
+        try:
+            if f.stat().st_size == 0:  # interrupted writes
+                continue
+        except OSError:
+            continue
+        m = _FILE_TIME.search(f.name)
+        if m and start > 0 and _file_time(m) < start - ARCHIVE_SKEW:
+            continue
+        files.append(os.fspath(f))
+    return files
+
+
+def _file_time(m: re.Match) -> int:
+    written = datetime.strptime("".join(m.groups()), "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    return int(written.timestamp())
+
+
+def _archive_until(archive_dir: Path) -> int | None:
+    """Write time of the newest archive file: the archive holds the events up to about then."""
+    times = [_file_time(m) for f in _archive_files(archive_dir, 0)
+             if (m := _FILE_TIME.search(os.path.basename(f)))]
+    return max(times, default=None)
+
+
+def _archive_scan(archive_dir: Path, out, start: int, end: int, symbol, side):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    schema = pa.schema([(name, _arrow_type(kind)) for name, kind in LIQ_COLUMNS.items()])
+    names = [name for name, _ in out]
+    files = _archive_files(archive_dir, start)
+    if not files or start >= end:
+        return schema.empty_table().select(names)
+
+    # explicit schema: extra/divergent columns of older files (raw struct, ts_iso) are never read
+    dataset = ds.dataset(files, format="parquet", schema=schema)
+    # ts bounds prune row groups on Parquet statistics; symbol/side are filtered during the scan
+    expr = (ds.field("ts") >= start) & (ds.field("ts") < end)
+    if symbol is not None:
+        expr &= ds.field("symbol") == symbol
+    if side is not None:
+        expr &= pc.utf8_upper(ds.field("side")) == side
+    tbl = dataset.to_table(columns=names, filter=expr)
+    if "side" in names:
+        # older archives stored Bybit's "Buy"/"Sell", the writer stores upper case
+        tbl = tbl.set_column(names.index("side"), "side", pc.utf8_upper(tbl.column("side")))
+    # files are written in flush order, not strictly in event order
+    return tbl.sort_by("ts")
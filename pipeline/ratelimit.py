@@ -0,0 +1,35 @@
+"""
+pipeline/ratelimit.py
+Async token bucket shared by the concurrent HTTP collectors.
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, bursts up to `capacity`.
+    Waiters are served in arrival order (the lock is held while sleeping).
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
@@ -7,6 +7,8 @@ import sqlite3
 import logging
 from datetime import datetime, timezone
 
+from pipeline import db
+
 logger = logging.getLogger("pipeline.reporter")
 
 
@@ -24,7 +26,7 @@ def run(conn: sqlite3.Connection):
 
 
 def main():
-    conn = sqlite3.connect("data/crypto.db")
+    conn = db.get_readonly_conn(db.DB_PATH)
     run(conn)
     conn.close()
 
@@ -0,0 +1,225 @@
+"""
+pipeline/scheduler.py
+Resident scheduler: keeps the pipeline loaded and runs each collector on its own cadence.
+- Each collector module declares INTERVAL (seconds) and JITTER (seconds)
+- A fixed pool of worker threads runs due jobs; a collector never overlaps itself
+- Reporter + exporter are triggered when collectors actually wrote new rows, then the
+  chart worker process is kicked (pipeline/charts.py: renders off the collection path)
+- Workers write through their own connection (SQLite serialises writers, busy timeout);
+  the report stage reads from a mode=ro pool, and the WAL is checkpointed periodically
+- Several nodes (coordinator=, pipeline/leases.py): a job only runs on the node holding
+  its lease; collectors declaring SHARDS = n become n jobs "name#i" (collect(conn,
+  shard=(i, n))) spread over the nodes; the report runs on one node, on any commit
+  (PRAGMA data_version), whichever node wrote
+Usage: python main.py --daemon
+"""
+
+import logging
+import functools
+import random
+import signal
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pipeline import db, profiling
+from pipeline.metrics import ROWS_WRITTEN, STAGE_SECONDS
+
+LOG = logging.getLogger("pipeline.scheduler")
+
+DEFAULT_INTERVAL = 300
+DEFAULT_JITTER = 30
+# minimum delay between two report/export runs (a burst of collectors → one export)
+REPORT_DEBOUNCE = 60
+
+
+class Job:
+    """One periodic task: a collector module (collect(conn)) or the report stage."""
+
+    def __init__(self, name, func, interval, jitter):
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.jitter = float(jitter)
+        self.running = False
+        # spread the first runs so that all collectors don't fire at t=0
+        self.next_run = time.monotonic() + random.uniform(0, self.jitter)
+
+    def reschedule(self, now: float):
+        """Next run is counted from the end of the previous one (no back-to-back catch-up)."""
+        self.next_run = now + self.interval + random.uniform(0, self.jitter)
+
+
+class Scheduler:
+    def __init__(self, collectors, db_path: str | Path = db.DB_PATH, workers: int = 4,
+                 report: bool = True, report_debounce: float = REPORT_DEBOUNCE, charts: bool = True,
+                 coordinator=None):
+        self.db_path = db_path
+        self.workers = workers
+        self.report = report
+        self.charts = charts
+        self.chart_worker = None
+        self.report_debounce = report_debounce
+
+        self.coordinator = coordinator
+
+        self.jobs = []
+        for m in collectors:
+            name = m.__name__.rsplit(".", 1)[-1]
+            interval = getattr(m, "INTERVAL", DEFAULT_INTERVAL)
+            jitter = getattr(m, "JITTER", DEFAULT_JITTER)
+            shards = getattr(m, "SHARDS", 1) if coordinator is not None else 1
+            if shards > 1:
+                self.jobs += [Job(f"{name}#{i}", functools.partial(m.collect, shard=(i, shards)), interval, jitter)
+                              for i in range(shards)]
+            else:
+                self.jobs.append(Job(name, m.collect, interval, jitter))
+        self.report_job = Job("report", self._report, report_debounce, 0)
+
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._local = threading.local()
+        self._conns = []  # every worker's connection, closed once the pool is shut down
+        self.dbm = None
+
+    # -----------------------------------------------------
+    # CONNECTIONS (one per worker thread, opened once)
+    # -----------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # only its worker uses it; check_same_thread=False so that run() can close it
+            conn = db.get_conn(self.db_path, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _close_conns(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                LOG.warning("worker connection not closed", exc_info=True)
+
+    # -----------------------------------------------------
+    # JOBS
+    # -----------------------------------------------------
+    def _run_job(self, job: Job):
+        conn = self._conn()
+        before = conn.total_changes
+        t0 = time.monotonic()
+        try:
+            if job is self.report_job:
+                job.func(conn)
+            else:
+                with profiling.stage(f"collect.{job.name}"):
+                    job.func(conn)
+        except Exception:
+            LOG.exception("job %s failed", job.name)
+        finally:
+            changed = conn.total_changes - before
+            now = time.monotonic()
+            STAGE_SECONDS.observe(now - t0, stage=job.name)
+            ROWS_WRITTEN.inc(changed, source=job.name)
+            with self._lock:
+                job.running = False
+                job.reschedule(now)
+                if changed and job is not self.report_job:
+                    self._dirty = True
+            LOG.debug("job %s done in %.2fs (%d rows changed)", job.name, now - t0, changed)
+
+    def _report(self, conn: sqlite3.Connection):
+        # imported here: only the daemon pays for the reporting stack, and only once
+        from pipeline import reporter, exporter
+        # reads go to the read-only pool, not the worker's writer connection
+        with self.dbm.reader() as rconn:
+            with profiling.stage("reporter.run"):
+                reporter.run(rconn)
+            with profiling.stage("exporter.run"):
+                exporter.run(rconn)
+        if self.chart_worker is not None:
+            self.chart_worker.kick()
+
+    def _leased(self, job: Job, now: float) -> bool:
+        """Without a coordinator every job runs here; with one, only those whose lease this node holds."""
+        if self.coordinator is None or self.coordinator.holds(job.name):
+            return True
+        job.next_run = now + self.coordinator.ttl / 3  # another node's, re-checked after the next lease tick
+        return False
+
+    def _due_jobs(self, now: float):
+        due = [j for j in self.jobs if not j.running and j.next_run <= now and self._leased(j, now)]
+        rj = self.report_job
+        if self.report and self._dirty and not rj.running and rj.next_run <= now and self._leased(rj, now):
+            self._dirty = False
+            due.append(rj)
+        for j in due:
+            j.running = True
+        return due
+
+    def _next_wakeup(self, now: float) -> float:
+        pending = [j.next_run for j in self.jobs if not j.running]
+        if self.report and self._dirty and not self.report_job.running:
+            pending.append(self.report_job.next_run)
+        if not pending:
+            return 1.0
+        return min(max(min(pending) - now, 0.05), 5.0)
+
+    # -----------------------------------------------------
+    # MAIN LOOP
+    # -----------------------------------------------------
+    def run(self):
+        LOG.info(
+            "Scheduler started (workers=%d): %s", self.workers,
+            ", ".join(f"{j.name}={j.interval:.0f}s±{j.jitter:.0f}" for j in self.jobs),
+        )
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: self.stop_event.set())
+
+        self.dbm = db.ConnectionManager(self.db_path, readers=2, check_same_thread=False)
+        self.dbm.start_checkpointer()
+        if self.report and self.charts:
+            from pipeline.charts import ChartWorker
+            self.chart_worker = ChartWorker(self.db_path)  # process started on the first kick
+        watch = version = None
+        if self.coordinator is not None:
+            self.coordinator.want(*(j.name for j in self.jobs), self.report_job.name)
+            self.coordinator.start()
+            # rows written by the other nodes bump data_version too
+            watch = db.get_readonly_conn(self.db_path)
+            version = watch.execute("PRAGMA data_version").fetchone()[0]
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="collector") as pool:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                if watch is not None:
+                    current = watch.execute("PRAGMA data_version").fetchone()[0]
+                    if current != version:
+                        version = current
+                        self._dirty = True
+                with self._lock:
+                    due = self._due_jobs(now)
+                    wait = self._next_wakeup(now)
+                for job in due:
+                    pool.submit(self._run_job, job)
+                self.stop_event.wait(wait)
+            LOG.info("Scheduler stopping, waiting for running jobs…")
+        self._close_conns()
+
+        if self.chart_worker is not None:
+            self.chart_worker.stop()
+        if self.coordinator is not None:
+            watch.close()
+            self.coordinator.stop()
+        self.dbm.close()
+        LOG.info("🏁 Scheduler stopped.")
+
+    def stop(self):
+        self.stop_event.set()
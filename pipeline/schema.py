@@ -0,0 +1,343 @@
+"""
+pipeline/schema.py
+Single source of truth for the SQLite schema.
+
+- MIGRATIONS is an ordered list of (version, description, step); a step is a
+  list of SQL statements or a callable(conn)
+- The applied version is stored in `PRAGMA user_version`
+- migrate(conn): one pragma read when the schema is current, otherwise all
+  pending steps run in ONE transaction (all or nothing)
+
+To change the schema: append a new migration, never edit an applied one.
+coingecko, bybit, signals and bybit_liquidations may be views over the optional
+compact layout (pipeline/compact.py): a migration altering them must handle both.
+"""
+
+import logging
+import sqlite3
+
+LOG = logging.getLogger("pipeline.schema")
+
+# signals: one row per (ts, name), see pipeline/signals.py
+_SIGNALS_DDL = """
+    CREATE TABLE IF NOT EXISTS signals (
+        ts INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        value REAL,
+        classification TEXT,
+        PRIMARY KEY (ts, name)
+    )
+    """
+
+# --- v1: baseline tables ---
+_BASELINE = [
+    """
+    CREATE TABLE IF NOT EXISTS metrics (
+        ts INTEGER PRIMARY KEY,
+        sopr REAL,
+        stablecoins REAL,
+        mempool_tx_count INTEGER,
+        mempool_fee_fastest REAL,
+        fng INTEGER,
+        oi_btc REAL,
+        oi_eth REAL,
+        funding_btc REAL,
+        funding_eth REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS coingecko (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        symbol TEXT NOT NULL,
+        price_usd REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bybit (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        symbol TEXT NOT NULL,
+        funding REAL,
+        open_interest REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sopr (
+        ts INTEGER PRIMARY KEY,
+        value REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS altme (
+        ts INTEGER PRIMARY KEY,
+        fng INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS mempool (
+        ts INTEGER PRIMARY KEY,
+        tx_count INTEGER,
+        fee_fastest REAL,
+        fee_30m REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stablecoins (
+        ts INTEGER PRIMARY KEY,
+        total REAL,
+        usdt REAL,
+        usdc REAL
+    )
+    """,
+    # raw liquidations events (detailed)
+    """
+    CREATE TABLE IF NOT EXISTS bybit_liquidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,               -- epoch seconds UTC
+        symbol TEXT NOT NULL,
+        side TEXT NOT NULL,
+        price REAL,
+        qty REAL,
+        qty_usd REAL,
+        raw TEXT
+    )
+    """,
+    # hourly aggregates for fast reporting
+    """
+    CREATE TABLE IF NOT EXISTS bybit_liquidations_hourly (
+        hour_start INTEGER NOT NULL,  -- epoch seconds aligned to hour (UTC)
+        symbol TEXT NOT NULL,
+        side TEXT NOT NULL,
+        total_qty_usd REAL NOT NULL DEFAULT 0,
+        events_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour_start, symbol, side)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """,
+    _SIGNALS_DDL,
+    """
+    CREATE TABLE IF NOT EXISTS hashrate_btc (
+        ts INTEGER PRIMARY KEY,
+        hashrate REAL NOT NULL          -- EH/s
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS txcount_btc (
+        ts INTEGER PRIMARY KEY,
+        tx_count INTEGER NOT NULL
+    )
+    """,
+]
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# --- v2: legacy layouts from the old per-script DDL ---
+def _repair_legacy_layouts(conn: sqlite3.Connection):
+    """
+    - signals created by the old main.migrate (id, ts, name, value, extra)
+      → rebuilt as (ts, name) PK with classification
+    - bybit legacy columns funding_rate / oi_value → funding / open_interest
+    """
+    cols = _columns(conn, "signals")
+    if "classification" not in cols:
+        conn.execute("ALTER TABLE signals RENAME TO signals_legacy")
+        conn.execute(_SIGNALS_DDL)
+        conn.execute(
+            "INSERT OR REPLACE INTO signals (ts, name, value) "
+            "SELECT ts, name, value FROM signals_legacy ORDER BY ts"
+        )
+        conn.execute("DROP TABLE signals_legacy")
+        LOG.info("Migration: signals rebuilt with (ts, name) primary key")
+
+    cols = _columns(conn, "bybit")
+    if "funding" not in cols and "funding_rate" in cols:
+        conn.execute("ALTER TABLE bybit RENAME COLUMN funding_rate TO funding")
+        LOG.info("Migration: renamed funding_rate → funding")
+    if "open_interest" not in cols and "oi_value" in cols:
+        conn.execute("ALTER TABLE bybit RENAME COLUMN oi_value TO open_interest")
+        LOG.info("Migration: renamed oi_value → open_interest")
+
+
+# --- v3: Bybit OI / funding history (pipeline/collectors/bybit_oi_hist.py) ---
+_BYBIT_HISTORY = [
+    """
+    CREATE TABLE IF NOT EXISTS bybit_oi_hist (
+        symbol TEXT NOT NULL,
+        ts INTEGER NOT NULL,            -- epoch seconds UTC
+        open_interest REAL,
+        PRIMARY KEY (symbol, ts)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bybit_funding_hist (
+        symbol TEXT NOT NULL,
+        ts INTEGER NOT NULL,            -- epoch seconds UTC
+        funding REAL,
+        PRIMARY KEY (symbol, ts)
+    )
+    """,
+]
+
+
+# --- v4: indexes for time-range scans (pipeline/query.py, pipeline/api.py) ---
+# coingecko/bybit rows are a few numbers: their (symbol, ts) indexes carry the values
+# too (covering), so a per-symbol scan never goes back to the table
+_RANGE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_coingecko_ts ON coingecko (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_coingecko_symbol_ts ON coingecko (symbol, ts, price_usd)",
+    "CREATE INDEX IF NOT EXISTS idx_bybit_ts ON bybit (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_bybit_symbol_ts ON bybit (symbol, ts, funding, open_interest)",
+    "CREATE INDEX IF NOT EXISTS idx_bybit_liquidations_ts ON bybit_liquidations (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_bybit_liquidations_symbol_ts ON bybit_liquidations (symbol, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_bybit_liquidations_hourly_symbol ON bybit_liquidations_hourly (symbol, hour_start)",
+    "CREATE INDEX IF NOT EXISTS idx_signals_name_ts ON signals (name, ts)",
+]
+
+
+# --- v5: minute rollup + traded qty (VWAP) for the in-memory aggregates (pipeline/aggregates.py) ---
+def _liquidation_rollups(conn: sqlite3.Connection):
+    if "total_qty" not in _columns(conn, "bybit_liquidations_hourly"):
+        conn.execute("ALTER TABLE bybit_liquidations_hourly ADD COLUMN total_qty REAL NOT NULL DEFAULT 0")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bybit_liquidations_minute (
+        minute_start INTEGER NOT NULL,  -- epoch seconds aligned to minute (UTC)
+        symbol TEXT NOT NULL,
+        side TEXT NOT NULL,
+        total_qty_usd REAL NOT NULL DEFAULT 0,
+        total_qty REAL NOT NULL DEFAULT 0,
+        events_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (minute_start, symbol, side)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bybit_liquidations_minute_symbol "
+                 "ON bybit_liquidations_minute (symbol, minute_start)")
+
+
+# --- v6: idempotent liquidation ingestion (pipeline/dedup.py + unique event key) ---
+def _liquidation_event_key(conn: sqlite3.Connection):
+    """
+    ts_ms (exchange timestamp, ms) backfilled from raw, duplicates removed (and taken
+    back out of the rollups), then UNIQUE (ts_ms, symbol, side, price, qty).
+    """
+    if "ts_ms" not in _columns(conn, "bybit_liquidations"):
+        conn.execute("ALTER TABLE bybit_liquidations ADD COLUMN ts_ms INTEGER")
+    conn.execute("""
+    UPDATE bybit_liquidations SET ts_ms = COALESCE(
+        CASE WHEN json_valid(raw) THEN CAST(COALESCE(json_extract(raw, '$.ts'), json_extract(raw, '$.updatedTime'),
+                                                     json_extract(raw, '$.T')) AS INTEGER) END,
+        ts * 1000)
+    WHERE ts_ms IS NULL
+    """)
+    conn.execute("""
+    CREATE TEMP TABLE liq_dupes AS
+    SELECT id, ts, symbol, side, qty, qty_usd FROM bybit_liquidations
+    WHERE id NOT IN (SELECT min(id) FROM bybit_liquidations GROUP BY ts_ms, symbol, side, price, qty)
+    """)
+    dupes = conn.execute("SELECT count(*) FROM liq_dupes").fetchone()[0]
+    if dupes:
+        for table, col, size in (("bybit_liquidations_hourly", "hour_start", 3600),
+                                  ("bybit_liquidations_minute", "minute_start", 60)):
+            conn.execute(f"""
+            WITH d AS (SELECT ts / {size} * {size} AS b, symbol, side, count(*) AS n,
+                              sum(qty_usd) AS usd, sum(qty) AS qty
+                       FROM liq_dupes GROUP BY 1, 2, 3)
+            UPDATE {table} SET
+                events_count = max(events_count - d.n, 0),
+                total_qty_usd = max(total_qty_usd - d.usd, 0),
+                total_qty = max(total_qty - d.qty, 0)
+            FROM d WHERE {table}.{col} = d.b AND {table}.symbol = d.symbol AND {table}.side = d.side
+            """)
+        conn.execute("DELETE FROM bybit_liquidations WHERE id IN (SELECT id FROM liq_dupes)")
+        LOG.info("Migration: %d duplicate liquidation events removed", dupes)
+    conn.execute("DROP TABLE liq_dupes")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bybit_liquidations_event "
+                 "ON bybit_liquidations (ts_ms, symbol, side, price, qty)")
+
+
+# --- v7: several exchanges feed bybit_liquidations (pipeline/collectors/liquidation_feeds.py) ---
+def _liquidation_exchange(conn: sqlite3.Connection):
+    """exchange column (existing rows: bybit), part of the unique event key."""
+    from pipeline import compact
+
+    if compact.is_compact(conn):
+        bybit = compact.Dictionary(conn).id("bybit")
+        compact.rebuild(conn, "bybit_liquidations",
+                        f"SELECT symbol_id, ts, ms, side_id, price, qty, qty_usd, raw, {bybit} "
+                        "FROM bybit_liquidations_old")
+        return
+    if "exchange" not in _columns(conn, "bybit_liquidations"):
+        conn.execute("ALTER TABLE bybit_liquidations ADD COLUMN exchange TEXT NOT NULL DEFAULT 'bybit'")
+    conn.execute("DROP INDEX IF EXISTS idx_bybit_liquidations_event")
+    conn.execute("CREATE UNIQUE INDEX idx_bybit_liquidations_event "
+                 "ON bybit_liquidations (ts_ms, symbol, side, price, qty, exchange)")
+
+
+# --- v8: change counters of the compact layout tables (pipeline/compact.py, query.watermark_sql) ---
+def _compact_counters(conn: sqlite3.Connection):
+    from pipeline import compact
+
+    if compact.is_compact(conn):
+        compact.create_counters(conn)
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _BASELINE),
+    (2, "repair legacy signals/bybit layouts", _repair_legacy_layouts),
+    (3, "bybit OI/funding history tables", _BYBIT_HISTORY),
+    (4, "time-range indexes", _RANGE_INDEXES),
+    (5, "liquidation minute rollup, hourly total_qty", _liquidation_rollups),
+    (6, "unique liquidation event key", _liquidation_event_key),
+    (7, "liquidation exchange column", _liquidation_exchange),
+    (8, "compact layout change counters", _compact_counters),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database to SCHEMA_VERSION (idempotent).
+    Returns the resulting version.
+    """
+    if get_version(conn) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    if conn.in_transaction:
+        conn.commit()
+    # IMMEDIATE: take the write lock now, so two processes starting together
+    # don't both run the same steps; re-read the version under the lock.
+    conn.execute("BEGIN IMMEDIATE")
+    current = get_version(conn)
+    try:
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for stmt in step:
+                    conn.execute(stmt)
+            LOG.info("Schema migration v%d applied: %s", version, description)
+        # PRAGMA doesn't accept bound parameters
+        conn.execute(f"PRAGMA user_version = {int(SCHEMA_VERSION)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        LOG.exception("Schema migration failed, rolled back to v%d", current)
+        raise
+
+    LOG.info("✅ Schema at v%d (was v%d)", SCHEMA_VERSION, current)
+    return SCHEMA_VERSION
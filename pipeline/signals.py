@@ -9,6 +9,7 @@ Each signal is stored with its own timestamp (ts) and name in the `signals` tabl
   - classification (TEXT, optional qualitative label)
 
 PRIMARY KEY is (ts, name), so multiple signals can coexist at the same ts.
+The latest snapshot is also kept in the state cache (key "signals", see pipeline/state.py).
 """
 
 import sqlite3
@@ -16,10 +17,28 @@ import logging
 from datetime import datetime, timezone
 from typing import Dict, Tuple, Optional
 
+from pipeline import state
+
 logger = logging.getLogger("pipeline.signals")
 
 DB_PATH = "data/crypto.db"
 
+# name → (metrics column, threshold, label when value > threshold, label otherwise)
+# (pipeline/backtest.py sweeps these thresholds over the stored history)
+RULES = {
+    "sopr": ("sopr", 1, "bullish", "bearish"),
+    "funding_btc": ("funding_btc", 0.01, "high", "low"),
+    "funding_eth": ("funding_eth", 0.01, "high", "low"),
+    "mempool": ("mempool_tx_count", 50000, "congested", "normal"),
+}
+
+
+def classify(name: str, value: float, threshold: Optional[float] = None) -> str:
+    """Classification of `value` for signal `name` (threshold defaults to the rule's)."""
+    _, default, above, below = RULES[name]
+    return above if value > (default if threshold is None else threshold) else below
+
+
 def compute_signals(conn: sqlite3.Connection) -> Dict[str, Tuple[Optional[float], Optional[str]]]:
     """
     Compute trading/market signals based on latest metrics.
@@ -44,34 +63,31 @@ def compute_signals(conn: sqlite3.Connection) -> Dict[str, Tuple[Optional[float]
     metrics = dict(zip(colnames, row))
 
     signals: Dict[str, Tuple[Optional[float], Optional[str]]] = {}
-
-    # Example signal: SOPR threshold
-    if metrics.get("sopr") is not None:
-        val = metrics["sopr"]
-        classification = "bullish" if val > 1 else "bearish"
-        signals["sopr"] = (val, classification)
-
-    # Example: funding BTC
-    if metrics.get("funding_btc") is not None:
-        val = metrics["funding_btc"]
-        classification = "high" if val > 0.01 else "low"
-        signals["funding_btc"] = (val, classification)
-
-    # Example: funding ETH
-    if metrics.get("funding_eth") is not None:
-        val = metrics["funding_eth"]
-        classification = "high" if val > 0.01 else "low"
-        signals["funding_eth"] = (val, classification)
-
-    # Example: mempool congestion
-    if metrics.get("mempool_tx_count") is not None:
-        val = metrics["mempool_tx_count"]
-        classification = "congested" if val > 50000 else "normal"
-        signals["mempool"] = (val, classification)
+    for name, (column, _, _, _) in RULES.items():
+        if metrics.get(column) is not None:
+            val = metrics[column]
+            signals[name] = (val, classify(name, val))
 
     return signals
 
 
+def _cached_signals() -> Optional[dict]:
+    try:
+        return state.get_state().get("signals")
+    except Exception:
+        return None
+
+
+def _cache_signals(ts: int, signals: Dict[str, Tuple[Optional[float], Optional[str]]]):
+    """Keep the cached snapshot equal to the DB's max-ts snapshot (merge same ts, ignore older)."""
+    cached = _cached_signals()
+    if cached and cached["ts"] > ts:
+        return
+    merged = dict(cached["signals"]) if cached and cached["ts"] == ts else {}
+    merged.update({name: list(v) for name, v in signals.items()})
+    state.publish("signals", {"ts": ts, "signals": merged})
+
+
 def store_signals(conn: sqlite3.Connection, signals: Dict[str, Tuple[Optional[float], Optional[str]]], ts: Optional[int] = None):
     """
     Store computed signals into the DB.
@@ -99,25 +115,36 @@ def store_signals(conn: sqlite3.Connection, signals: Dict[str, Tuple[Optional[fl
         except Exception:
             logger.exception("Failed to insert signal %s=%s", name, val)
     conn.commit()
+    _cache_signals(ts, signals)
     logger.info("Stored %d signals at ts=%s", len(signals), ts)
 
 
 def latest_signals(conn: sqlite3.Connection) -> Dict[str, Tuple[Optional[float], Optional[str]]]:
     """
     Fetch the latest signals snapshot (max ts).
+    Served from the state cache when it holds that same snapshot (max ts and row count,
+    one lookup on conn: another process or database may have newer rows), otherwise from
+    the DB (and the cache is warmed when it was behind).
     Returns {name: (value, classification)}.
     """
     cur = conn.cursor()
     try:
-        cur.execute("SELECT MAX(ts) FROM signals")
+        cur.execute("SELECT ts, COUNT(*) FROM signals WHERE ts = (SELECT MAX(ts) FROM signals)")
         r = cur.fetchone()
         if not r or r[0] is None:
             return {}
-        latest_ts = r[0]
+        latest_ts, count = r
+
+        cached = _cached_signals()
+        if cached and cached["ts"] == latest_ts and len(cached["signals"]) == count:
+            return {name: tuple(v) for name, v in cached["signals"].items()}
 
         cur.execute("SELECT name, value, classification FROM signals WHERE ts=?", (latest_ts,))
         rows = cur.fetchall()
-        return {name: (val, cls) for name, val, cls in rows}
+        snapshot = {name: (val, cls) for name, val, cls in rows}
+        if not cached or cached["ts"] < latest_ts:
+            state.publish("signals", {"ts": latest_ts, "signals": {k: list(v) for k, v in snapshot.items()}})
+        return snapshot
     except sqlite3.OperationalError:
         logger.warning("signals table not found")
         return {}
@@ -0,0 +1,266 @@
+"""
+pipeline/spill.py
+Disk spill queue: batches that could not be written to SQLite (locked, disk I/O,
+read-only, outage) are appended to local segment files and replayed later.
+
+    q = SpillQueue("data/spill/bybit_liquidations")
+    q.append({"rows": batch})                  # the write failed
+    q.drain(handler)                           # DB back: handler(record) per batch, oldest first
+    q.drain(handler, budget=REPLAY_BUDGET)     # event loop: at most ~0.1s, the rest on the next call
+
+- segments: <dir>/<seq>.seg, one JSON line per batch, fsync'ed; a new segment every
+  SEGMENT_BYTES. Memory holds the open file only, whatever the outage length.
+- progress: <seq>.ack holds the byte offset already replayed (atomic replace after
+  each batch), the segment is deleted once fully replayed; after a crash the replay
+  resumes from the ack (a batch may be replayed twice: handlers must be idempotent,
+  e.g. unique keys / INSERT OR REPLACE)
+- drain() stops at the first sqlite3.OperationalError (still unavailable); other
+  errors mean the batch itself is bad: it goes to <dir>/rejected.jsonl
+- budget: drain() returns once that many seconds are spent (checked between batches),
+  so a writer on an event loop replays a long backlog over several flushes
+- if the spill file cannot be written either (disk full), batches are kept in a
+  bounded in-memory overflow (MEMORY_BATCHES), the oldest dropped beyond it
+
+Collectors: store(conn, source, sql, rows) = executemany + commit, or spill.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from pipeline.metrics import REGISTRY
+
+LOG = logging.getLogger("pipeline.spill")
+
+SPILL_DIR = Path("data/spill")
+SEGMENT_BYTES = 16 * 1024 * 1024
+MEMORY_BATCHES = 64
+RETRY_MIN = 1.0
+RETRY_MAX = 60.0
+# replay time per drain() for writers running on an event loop (reads and heartbeats wait meanwhile)
+REPLAY_BUDGET = 0.1
+
+SPILL_BYTES = REGISTRY.gauge("pipeline_spill_bytes", "Bytes waiting in the spill segments", ("queue",))
+SPILLED = REGISTRY.counter("pipeline_spill_batches_total", "Batches spilled after a failed write", ("queue",))
+REPLAYED = REGISTRY.counter("pipeline_spill_replayed_total", "Spilled batches written back", ("queue",))
+SPILL_DROPPED = REGISTRY.counter("pipeline_spill_dropped_total", "Batches lost (spill and memory full)", ("queue",))
+
+
+class SpillQueue:
+    def __init__(self, directory: str | Path, segment_bytes: int = SEGMENT_BYTES,
+                 memory_batches: int = MEMORY_BATCHES):
+        self.dir = Path(directory)  # created on the first spill
+        self.name = self.dir.name
+        self.segment_bytes = segment_bytes
+        self._overflow = deque()
+        self._memory_batches = memory_batches
+        self._lock = threading.Lock()        # appends
+        self._drain_lock = threading.Lock()  # one replay at a time
+        self._fh = None
+        self._fh_size = 0
+        segs = self._segments()
+        self._seq = int(segs[-1].stem) if segs else 0
+        self._bytes = sum(p.stat().st_size - self._acked(p) for p in segs)
+        self._retry_at = 0.0
+        self._retry_delay = RETRY_MIN
+        if segs:
+            LOG.warning("Spill queue %s: %d segment(s), %.1f MB to replay", self.name, len(segs), self._bytes / 1e6)
+        SPILL_BYTES.set(self._bytes, queue=self.name)
+
+    @staticmethod
+    def _acked(seg: Path) -> int:
+        ack = seg.with_suffix(".ack")
+        return int(ack.read_text() or 0) if ack.exists() else 0
+
+    def _segments(self) -> list:
+        return sorted(self.dir.glob("*.seg")) if self.dir.is_dir() else []
+
+    def __bool__(self) -> bool:
+        return bool(self._bytes or self._overflow)
+
+    def pending_bytes(self) -> int:
+        return self._bytes
+
+    # -----------------------------------------------------
+    # APPEND
+    # -----------------------------------------------------
+    def append(self, record: dict):
+        line = (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode()
+        with self._lock:
+            SPILLED.inc(queue=self.name)
+            try:
+                if self._fh is None or self._fh_size + len(line) > self.segment_bytes:
+                    self._rotate()
+                self._fh.write(line)
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+                self._fh_size += len(line)
+                self._bytes += len(line)
+                SPILL_BYTES.set(self._bytes, queue=self.name)
+            except OSError as e:
+                LOG.error("Spill queue %s: cannot write segment (%s), keeping the batch in memory", self.name, e)
+                if len(self._overflow) >= self._memory_batches:
+                    self._overflow.popleft()
+                    SPILL_DROPPED.inc(queue=self.name)
+                self._overflow.append(record)
+
+    def _rotate(self):
+        if self._fh is not None:
+            self._fh.close()
+        self._seq += 1
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.dir / f"{self._seq:010d}.seg", "ab")
+        self._fh_size = 0
+
+    # -----------------------------------------------------
+    # REPLAY
+    # -----------------------------------------------------
+    def due(self) -> bool:
+        """Something to replay and the retry backoff has elapsed."""
+        return bool(self) and time.monotonic() >= self._retry_at
+
+    def drain(self, handler, budget: float | None = None) -> int:
+        """
+        handler(record) for every spilled batch, oldest first (until `budget` seconds are
+        spent, if given). Returns the batches replayed; stops (and backs off) at the first
+        sqlite3.OperationalError, which is re-raised.
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+        deadline = None if budget is None else time.monotonic() + budget
+        try:
+            with self._lock:
+                # the open segment becomes replayable; later appends start a new one
+                if self._fh is not None:
+                    self._fh.close()
+                    self._fh = None
+                segs = self._segments()
+                overflow = list(self._overflow)
+                self._overflow.clear()
+            done = 0
+            try:
+                while overflow and not _spent(deadline):
+                    self._replay(handler, overflow[0])
+                    overflow.pop(0)
+                    done += 1
+                for seg in segs:
+                    if _spent(deadline):
+                        break
+                    done += self._drain_segment(seg, handler, deadline)
+            except sqlite3.OperationalError as e:
+                with self._lock:
+                    self._overflow.extendleft(reversed(overflow))
+                self._retry_at = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, RETRY_MAX)
+                LOG.warning("Spill queue %s: replay stopped after %d batch(es): %s (retry in %.0fs)",
+                            self.name, done, e, self._retry_at - time.monotonic())
+                raise
+            with self._lock:
+                self._overflow.extendleft(reversed(overflow))  # left over by the budget
+            self._retry_delay = RETRY_MIN
+            if done:
+                LOG.info("Spill queue %s: %d batch(es) replayed%s", self.name, done,
+                         ", more left" if self else "")
+            return done
+        finally:
+            self._drain_lock.release()
+
+    def _replay(self, handler, record: dict):
+        try:
+            handler(record)
+        except sqlite3.OperationalError:
+            raise
+        except Exception:
+            LOG.exception("Spill queue %s: batch rejected", self.name)
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.dir / "rejected.jsonl", "a") as f:
+                f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        REPLAYED.inc(queue=self.name)
+
+    def _drain_segment(self, seg: Path, handler, deadline: float | None = None) -> int:
+        ack = seg.with_suffix(".ack")
+        offset = self._acked(seg)
+        done = 0
+        with open(seg, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if done and _spent(deadline):
+                    return done  # resumed from the ack on the next drain()
+                if not line.endswith(b"\n"):
+                    break  # torn write (crash while spilling): the batch was never acknowledged
+                self._replay(handler, json.loads(line))
+                offset += len(line)
+                done += 1
+                tmp = ack.with_suffix(".ack.tmp")
+                tmp.write_text(str(offset))
+                os.replace(tmp, ack)
+                with self._lock:
+                    self._bytes -= len(line)
+                    SPILL_BYTES.set(self._bytes, queue=self.name)
+        with self._lock:
+            self._bytes -= seg.stat().st_size - offset  # torn tail
+            SPILL_BYTES.set(self._bytes, queue=self.name)
+        seg.unlink()
+        ack.unlink(missing_ok=True)
+        return done
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def _spent(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+# -----------------------------------------------------
+# COLLECTORS
+# -----------------------------------------------------
+_collectors = None
+_collectors_lock = threading.Lock()
+
+
+def collectors_queue() -> SpillQueue:
+    global _collectors
+    if _collectors is None:
+        with _collectors_lock:
+            if _collectors is None:
+                _collectors = SpillQueue(SPILL_DIR / "collectors")
+    return _collectors
+
+
+def _execute(conn: sqlite3.Connection, sql: str, rows):
+    try:
+        conn.executemany(sql, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def store(conn: sqlite3.Connection, source: str, sql: str, rows, replay_budget: float | None = None) -> bool:
+    """
+    executemany(sql, rows) + commit; on sqlite3.OperationalError the rows are spilled
+    (replayed by a later store() once the database accepts writes, at most replay_budget
+    seconds of it per call when given). False when spilled.
+    """
+    q = collectors_queue()
+    if q.due():
+        try:
+            q.drain(lambda rec: _execute(conn, rec["sql"], rec["rows"]), replay_budget)
+        except sqlite3.OperationalError:
+            pass
+    try:
+        _execute(conn, sql, rows)
+        return True
+    except sqlite3.OperationalError as e:
+        LOG.warning("%s: write failed (%s), %d row(s) spilled to %s", source, e, len(rows), q.dir)
+        q.append({"source": source, "sql": sql, "rows": [list(r) for r in rows]})
+        return False
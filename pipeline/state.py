@@ -0,0 +1,167 @@
+"""
+pipeline/state.py
+Hot "latest state" cache with change notifications.
+
+Collectors and writers call publish(key, value) right after their commit;
+readers call get()/snapshot() instead of a MAX(ts) query, and subscribers
+are pushed every change.
+
+Backends (selected by PIPELINE_STATE_URL):
+- memory://            in-process dict (default)
+- redis://host:6379/0  Redis hash + pub/sub, shared between processes
+  (tests: set_state(RedisBackend(client=fakeredis.FakeRedis())) or a local redis-server)
+
+Keys: "<table>" or "<table>:<symbol>", e.g. "altme", "coingecko:btc", "signals".
+Values: JSON-serialisable dicts.
+"""
+
+import json
+import logging
+import os
+import threading
+
+LOG = logging.getLogger("pipeline.state")
+
+HASH_KEY = "pipeline:state"
+CHANNEL = "pipeline:state"
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def set(self, key: str, value: dict):
+        self.set_many({key: value})
+
+    def set_many(self, items: dict):
+        with self._lock:
+            self._data.update(items)
+            subscribers = list(self._subscribers)
+        for key, value in items.items():
+            for cb in subscribers:
+                try:
+                    cb(key, value)
+                except Exception:
+                    LOG.exception("state subscriber failed for %s", key)
+
+    def get(self, key: str) -> dict | None:
+        return self._data.get(key)
+
+    def snapshot(self, prefix: str = "") -> dict:
+        with self._lock:
+            return {k: v for k, v in self._data.items() if k.startswith(prefix)}
+
+    def subscribe(self, callback):
+        """callback(key, value) on every change; returns an unsubscribe function."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def close(self):
+        pass
+
+
+class RedisBackend:
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self._threads = []
+
+    def set(self, key: str, value: dict):
+        self.set_many({key: value})
+
+    def set_many(self, items: dict):
+        """One round trip for the whole batch."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(HASH_KEY, mapping={k: json.dumps(v, default=str) for k, v in items.items()})
+        for key, value in items.items():
+            pipe.publish(CHANNEL, json.dumps({"key": key, "value": value}, default=str))
+        pipe.execute()
+
+    def get(self, key: str) -> dict | None:
+        raw = self.client.hget(HASH_KEY, key)
+        return json.loads(raw) if raw is not None else None
+
+    def snapshot(self, prefix: str = "") -> dict:
+        raw = self.client.hgetall(HASH_KEY)
+        out = {}
+        for k, v in raw.items():
+            k = k.decode() if isinstance(k, bytes) else k
+            if k.startswith(prefix):
+                out[k] = json.loads(v)
+        return out
+
+    def subscribe(self, callback):
+        """callback(key, value) from a background thread; returns an unsubscribe function."""
+        def handler(message):
+            try:
+                event = json.loads(message["data"])
+                callback(event["key"], event["value"])
+            except Exception:
+                LOG.exception("state subscriber failed")
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{CHANNEL: handler})
+        thread = pubsub.run_in_thread(sleep_time=0.01, daemon=True)
+        self._threads.append(thread)
+
+        def unsubscribe():
+            thread.stop()
+            pubsub.close()
+        return unsubscribe
+
+    def close(self):
+        for t in self._threads:
+            t.stop()
+        self._threads.clear()
+
+
+def from_url(url: str):
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"unsupported state backend: {url}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_state():
+    """Process-wide backend, built from PIPELINE_STATE_URL on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = from_url(os.environ.get("PIPELINE_STATE_URL", "memory://"))
+    return _backend
+
+
+def set_state(backend):
+    """Replace the process-wide backend (tests, embedding)."""
+    global _backend
+    _backend = backend
+
+
+def publish(key: str, value: dict):
+    """Update the cache after a DB write. Never raises: the DB remains the source of truth."""
+    publish_many({key: value})
+
+
+def publish_many(items: dict):
+    if not items:
+        return
+    try:
+        get_state().set_many(items)
+    except Exception:
+        LOG.warning("state publish failed for %s", ", ".join(items), exc_info=True)